@@ -0,0 +1,365 @@
+"""Control de admisión para las peticiones de valuación.
+
+Los endpoints síncronos comparten el threadpool del worker; un cliente que
+manda lotes enormes o tablas DCF de miles de años puede ocuparlo entero y
+con él se frenan todas las demás rutas. ``AdmissionMiddleware`` decide
+antes de llegar al endpoint:
+
+1. Estima el costo de la petición en unidades (1 = una valuación
+   simple): años de la tabla DCF, tamaño del cuerpo en los lotes, sorteos
+   de Monte Carlo, celdas de la grilla de sensibilidad.
+2. Descuenta ese costo del token bucket del cliente. Si no alcanza,
+   responde 429 con ``Retry-After``.
+3. Cada clase de ruta (``valuation``, ``batch``, ``simulation``) tiene un
+   límite de unidades en curso. Si no hay lugar la petición espera en una
+   cola corta; si la cola está llena o la espera supera
+   ``ADMISSION_QUEUE_TIMEOUT`` responde 503 con ``Retry-After``.
+
+``/status``, ``/diagnostico`` y ``/metrics`` no pasan por el control, y las
+clases suman menos unidades que el threadpool (40 hilos) para que siempre
+queden hilos libres. Los límites son por worker. Los rechazos se cuentan
+en ``valuation_admission_rejected_total`` y el estado actual aparece en
+``/diagnostico``.
+
+Configuración por variables de entorno:
+
+- ADMISSION_LIMITS: unidades en curso por clase ("valuation=24,batch=8,simulation=4")
+- ADMISSION_QUEUES: peticiones en espera por clase ("valuation=128,batch=16,simulation=8")
+- ADMISSION_QUEUE_TIMEOUT: segundos máximos de espera en la cola (2)
+- RATE_LIMIT_PER_SECOND: unidades por segundo por cliente (0 desactiva el límite)
+- RATE_LIMIT_BURST: capacidad del bucket (2 x RATE_LIMIT_PER_SECOND)
+- RATE_LIMIT_CLIENT_HEADER: encabezado que identifica al cliente, p. ej.
+  "x-forwarded-for" detrás de un proxy (por defecto, la IP de la conexión)
+- ADMISSION_EXEMPT: rutas sin control ("/status,/diagnostico,/metrics")
+"""
+import asyncio
+import collections
+import math
+import os
+import time
+
+import metrics
+import serialization
+
+DEFAULT_LIMITS = "valuation=24,batch=8,simulation=4"
+DEFAULT_QUEUES = "valuation=128,batch=16,simulation=8"
+DEFAULT_EXEMPT = "/status,/diagnostico,/metrics"
+
+# Cuerpos más grandes no se decodifican para estimar el costo
+MAX_INSPECT_BYTES = 65536
+# Unidades de costo: bytes de un lote, años de tabla DCF, sorteos y celdas
+BATCH_BYTES_PER_UNIT = 65536
+SCHEDULE_YEARS_PER_UNIT = 100
+DRAWS_PER_UNIT = 100000
+GRID_CELLS_PER_UNIT = 10000
+# Costo de un lote enviado por streaming, sin Content-Length
+UNKNOWN_SIZE_COST = 4
+# Buckets guardados antes de descartar los de clientes inactivos
+MAX_CLIENTS = 10000
+
+
+def _parse_pairs(text):
+    return {key.strip(): int(value) for key, value in (item.split("=") for item in text.split(",") if item.strip())}
+
+
+def _int(value, default=0):
+    return value if isinstance(value, int) and not isinstance(value, bool) else default
+
+
+def _schedule_cost(data):
+    if data.get("include_schedule") is True:
+        return _int(data.get("projection_years"), 5) // SCHEDULE_YEARS_PER_UNIT
+    return 0
+
+
+def _draws_cost(data):
+    return _int(data.get("draws"), DRAWS_PER_UNIT) // DRAWS_PER_UNIT
+
+
+def _axis_points(axis):
+    if not isinstance(axis, dict):
+        return 1
+    if isinstance(axis.get("values"), list):
+        return len(axis["values"])
+    return max(1, _int(axis.get("steps"), 11))
+
+
+def valuation_cost(data):
+    return 1 + _schedule_cost(data)
+
+
+def all_methods_cost(data):
+    cost = len(data.get("methods") or ()) or 4
+    if isinstance(data.get("monte_carlo"), dict):
+        cost += 1 + _draws_cost(data["monte_carlo"])
+    return cost + _schedule_cost(data)
+
+
+def monte_carlo_cost(data):
+    return 1 + _draws_cost(data)
+
+
+def sensitivity_cost(data):
+    return 1 + _axis_points(data.get("x")) * _axis_points(data.get("y")) // GRID_CELLS_PER_UNIT
+
+
+# Ruta -> (clase, estimador sobre el cuerpo decodificado o None para usar el tamaño)
+ROUTES = {
+    **{path: ("valuation", valuation_cost) for path in (
+        "/valuate/vc_method/", "/valuate/vc-method/", "/valuate/dcf/", "/valuate/dcf-method/",
+        "/valuate/berkus/", "/valuate/berkus-method/", "/valuate/first_chicago/", "/valuate/first-chicago/",
+    )},
+    "/valuate/all/": ("valuation", all_methods_cost),
+    "/valuate/batch/": ("batch", None),
+    "/valuate/bulk/": ("batch", None),
+    "/valuate/solve/": ("batch", None),
+    "/valuate/monte-carlo/": ("simulation", monte_carlo_cost),
+    "/valuate/monte_carlo/": ("simulation", monte_carlo_cost),
+    "/valuate/sensitivity/": ("simulation", sensitivity_cost),
+}
+
+
+def size_cost(content_length):
+    if content_length is None:
+        return UNKNOWN_SIZE_COST
+    return 1 + content_length // BATCH_BYTES_PER_UNIT
+
+
+class Rejected(Exception):
+    def __init__(self, status, reason, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.message = message
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """Unidades de costo en curso de una clase de ruta, con una cola FIFO corta.
+
+    Solo se usa desde el event loop, así que no necesita locks.
+    """
+
+    def __init__(self, name, limit, queue_size, timeout):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.in_use = 0
+        self._waiters = collections.deque()
+
+    async def acquire(self, cost):
+        # Una petición más cara que el límite corre sola
+        cost = min(cost, self.limit)
+        if not self._waiters and self.in_use + cost <= self.limit:
+            self.in_use += cost
+            return cost
+        if len(self._waiters) >= self.queue_size:
+            raise Rejected(503, "queue_full", "Servidor ocupado: la cola de espera está llena", self.timeout)
+        metrics.inc("valuation_admission_queued_total", (("route_class", self.name),))
+        waiter = (cost, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter[1]), self.timeout)
+        except asyncio.TimeoutError:
+            if waiter[1].done():
+                # Se liberó lugar justo al vencer la espera
+                metrics.observe("valuation_admission_wait_seconds", (("route_class", self.name),), time.perf_counter() - start)
+                return cost
+            self._waiters.remove(waiter)
+            self._wake()
+            raise Rejected(503, "queue_timeout", "Servidor ocupado: se agotó la espera en la cola", self.timeout)
+        except asyncio.CancelledError:
+            if waiter[1].done():
+                self.release(cost)
+            else:
+                self._waiters.remove(waiter)
+                self._wake()
+            raise
+        metrics.observe("valuation_admission_wait_seconds", (("route_class", self.name),), time.perf_counter() - start)
+        return cost
+
+    def release(self, cost):
+        self.in_use -= cost
+        self._wake()
+
+    def _wake(self):
+        # En orden de llegada, mientras el primero de la cola quepa
+        while self._waiters and self.in_use + self._waiters[0][0] <= self.limit:
+            cost, future = self._waiters.popleft()
+            self.in_use += cost
+            future.set_result(None)
+
+    def stats(self):
+        return {"limit": self.limit, "in_use": self.in_use, "waiting": len(self._waiters), "queue": self.queue_size}
+
+
+class RateLimiter:
+    """Token bucket por cliente: ``rate`` unidades por segundo, hasta ``burst``."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+
+    def take(self, client, cost):
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        # Una petición más cara que el bucket completo se admite con el bucket lleno
+        cost = min(cost, self.burst)
+        if tokens < cost:
+            self._buckets[client] = (tokens, now)
+            retry_after = (cost - tokens) / self.rate
+            raise Rejected(429, "rate_limited", "Demasiadas peticiones: límite de uso del cliente excedido", retry_after)
+        self._buckets[client] = (tokens - cost, now)
+        if len(self._buckets) > MAX_CLIENTS:
+            self._evict(now)
+
+    def _evict(self, now):
+        # Un bucket que ya se habría vuelto a llenar equivale a no tenerlo
+        full = [client for client, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * self.rate >= self.burst]
+        for client in full:
+            del self._buckets[client]
+
+    def stats(self):
+        return {"rate": self.rate, "burst": self.burst, "clients": len(self._buckets)}
+
+
+class AdmissionController:
+    def __init__(self, limits, queues, timeout=2.0, rate=0.0, burst=None, client_header=None, exempt=()):
+        self.limiters = {
+            name: ConcurrencyLimiter(name, limit, queues.get(name, 0), timeout) for name, limit in limits.items()
+        }
+        self.rate_limiter = RateLimiter(rate, burst or 2 * rate) if rate > 0 else None
+        self.client_header = client_header.lower().encode("latin-1") if client_header else None
+        self.exempt = frozenset(exempt)
+
+    def client_id(self, scope):
+        if self.client_header is not None:
+            for key, value in scope["headers"]:
+                if key == self.client_header:
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def stats(self):
+        return {
+            "classes": {name: limiter.stats() for name, limiter in self.limiters.items()},
+            "rate_limit": self.rate_limiter.stats() if self.rate_limiter is not None else None,
+        }
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            return None, message
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks), None
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI que aplica ``AdmissionController`` a las peticiones HTTP."""
+
+    def __init__(self, app, controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        controller = self.controller
+        # Las preflight de CORS tampoco cuentan para el límite del cliente
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] in controller.exempt:
+            await self.app(scope, receive, send)
+            return
+
+        route_class, estimator = ROUTES.get(scope["path"], (None, None)) if scope["method"] == "POST" else (None, None)
+        content_length = None
+        content_type = b""
+        for key, value in scope["headers"]:
+            if key == b"content-length":
+                content_length = int(value) if value.isdigit() else None
+            elif key == b"content-type":
+                content_type = value
+
+        cost = 1
+        if route_class is not None:
+            cost = size_cost(content_length)
+            codec = serialization.CODECS.get(content_type.decode("latin-1").partition(";")[0].strip().lower())
+            if estimator is not None and codec is not None and content_length is not None and content_length <= MAX_INSPECT_BYTES:
+                # Cuerpo chico: se decodifica para estimar y se entrega igual al endpoint
+                body, pending = await _read_body(receive)
+                if body is None:
+                    await self.app(scope, _replay(b"", pending, receive), send)
+                    return
+                try:
+                    data = codec.loads(body)
+                    cost = estimator(data) if isinstance(data, dict) else 1
+                except Exception:
+                    cost = 1
+                receive = _replay(body, None, receive)
+
+        try:
+            if controller.rate_limiter is not None:
+                controller.rate_limiter.take(controller.client_id(scope), cost)
+            limiter = controller.limiters.get(route_class)
+            if limiter is None:
+                await self.app(scope, receive, send)
+                return
+            acquired = await limiter.acquire(cost)
+        except Rejected as e:
+            metrics.inc("valuation_admission_rejected_total", (("route_class", route_class or "other"), ("reason", e.reason)))
+            await _reject(e, send)
+            return
+        metrics.inc("valuation_admission_cost_total", (("route_class", route_class),), cost)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(acquired)
+
+
+def _replay(body, pending, receive):
+    """``receive`` que primero entrega el cuerpo ya leído."""
+    sent = False
+
+    async def wrapped():
+        nonlocal sent
+        if not sent:
+            sent = True
+            if pending is not None:
+                return pending
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return wrapped
+
+
+async def _reject(error, send):
+    body = serialization.DEFAULT_CODEC.dumps({"error": error.message})
+    await send({
+        "type": "http.response.start",
+        "status": error.status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(max(1, math.ceil(error.retry_after))).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def from_env():
+    rate = float(os.environ.get("RATE_LIMIT_PER_SECOND", 0))
+    return AdmissionController(
+        limits=_parse_pairs(os.environ.get("ADMISSION_LIMITS", DEFAULT_LIMITS)),
+        queues=_parse_pairs(os.environ.get("ADMISSION_QUEUES", DEFAULT_QUEUES)),
+        timeout=float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 2)),
+        rate=rate,
+        burst=float(os.environ.get("RATE_LIMIT_BURST", 0)) or None,
+        client_header=os.environ.get("RATE_LIMIT_CLIENT_HEADER") or None,
+        exempt=[path.strip() for path in os.environ.get("ADMISSION_EXEMPT", DEFAULT_EXEMPT).split(",") if path.strip()],
+    )
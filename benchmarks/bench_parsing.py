@@ -0,0 +1,113 @@
+"""Costo por petición de convertir el cuerpo en un modelo, antes y después.
+
+"Antes" reproduce la cadena de try/except que tenían los endpoints (y la
+validación previa del cuerpo contra ``dict | VCData | StartupData |
+DCFData`` que hacía FastAPI); "después" es ``schemas.parse_input`` con el
+cuerpo declarado como ``dict``.
+
+Uso: python -m benchmarks.bench_parsing [--number N]
+"""
+import argparse
+import timeit
+
+from pydantic import TypeAdapter
+
+import schemas
+from benchmarks.payloads import PAYLOADS
+from schemas import StartupData, DCFData, VCData
+
+# Validación del cuerpo que FastAPI hacía con la firma anterior de los endpoints
+_OLD_BODY = TypeAdapter(dict | VCData | StartupData | DCFData)
+_NEW_BODY = TypeAdapter(dict)
+
+
+def legacy_vc(data):
+    try:
+        return StartupData(**data)
+    except Exception:
+        try:
+            return DCFData(**data)
+        except Exception:
+            return VCData(**data)
+
+
+def legacy_dcf(data):
+    data = dict(data)
+    try:
+        if 'initial_cash_flow' in data:
+            data.setdefault('terminal_growth_rate', 0.03)
+            data.setdefault('discount_rate', 0.15)
+            data.setdefault('projection_years', 5)
+            return DCFData(**data)
+        return StartupData(**data)
+    except Exception:
+        try:
+            return StartupData(**data)
+        except Exception:
+            default_data = {
+                'initial_cash_flow': 100000,
+                'growth_rate': 0.2,
+                'discount_rate': 0.15,
+                'terminal_growth_rate': 0.03,
+                'projection_years': 5
+            }
+            for key, value in data.items():
+                if key in default_data:
+                    default_data[key] = value
+            return DCFData(**default_data)
+
+
+def legacy_berkus(data):
+    try:
+        return StartupData(**data)
+    except Exception:
+        try:
+            if 'initial_cash_flow' in data:
+                dcf_data = {}
+                for key in ['initial_cash_flow', 'growth_rate', 'discount_rate', 'terminal_growth_rate', 'projection_years']:
+                    if key in data:
+                        dcf_data[key] = data[key]
+                return DCFData(**dcf_data)
+            startup_data = {
+                'name': 'Startup X',
+                'revenue': 1000000,
+                'growth_rate': 0.2,
+                'investment_required': 500000
+            }
+            for key, value in data.items():
+                if key in startup_data:
+                    startup_data[key] = value
+            return StartupData(**startup_data)
+        except Exception:
+            return StartupData(name="Startup X", revenue=1000000, growth_rate=0.2, investment_required=500000)
+
+
+LEGACY = {"vc_method": legacy_vc, "dcf": legacy_dcf, "berkus": legacy_berkus}
+
+
+def _safe(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        pass
+
+
+def measure(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'método':<10} {'payload':<20} {'antes (µs)':>11} {'después (µs)':>13} {'mejora':>7}")
+    for method, legacy in LEGACY.items():
+        for shape, payload in PAYLOADS.items():
+            before = measure(lambda: (_OLD_BODY.validate_python(payload), _safe(legacy, payload)), args.number)
+            after = measure(lambda: (_NEW_BODY.validate_python(payload), _safe(schemas.parse_input, method, payload)), args.number)
+            print(f"{method:<10} {shape:<20} {before:>11.2f} {after:>13.2f} {before / after:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Costo de serializar resultados grandes de /valuate/batch/ y tamaño del cuerpo.
+
+Compara el camino anterior de FastAPI (``jsonable_encoder`` + JSONResponse)
+con los codecs de ``serialization``: JSON estándar, orjson y MessagePack.
+
+Uso: python -m benchmarks.bench_serialization [--rows 1000,10000,100000]
+"""
+import argparse
+import os
+import timeit
+
+os.environ.setdefault("LOG_FILE", os.devnull)
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import main  # noqa: E402
+import serialization  # noqa: E402
+from benchmarks.payloads import batch_payload  # noqa: E402
+
+
+def encoders():
+    result = {"fastapi": lambda content: JSONResponse(jsonable_encoder(content)).body}
+    result["json"] = serialization.JsonCodec().dumps
+    if serialization.orjson is not None:
+        result["orjson"] = serialization.OrjsonCodec().dumps
+    if serialization.msgpack is not None:
+        result["msgpack"] = serialization.MsgpackCodec().dumps
+    return result
+
+
+def measure(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1000
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="1000,10000,100000")
+    args = parser.parse_args()
+
+    print(f"{'filas':>7} {'codec':<8} {'ms':>9} {'bytes':>11} {'vs fastapi':>11}")
+    for rows in (int(r) for r in args.rows.split(",")):
+        content = main.batch_method(main.BatchData(**batch_payload(rows)))
+        number = max(1, 20000 // rows)
+        baseline = None
+        for name, encode in encoders().items():
+            elapsed = measure(lambda: encode(content), number)
+            size = len(encode(content))
+            baseline = baseline or elapsed
+            print(f"{rows:>7} {name:<8} {elapsed:>9.3f} {size:>11} {baseline / elapsed:>10.1f}x")
+
+
+if __name__ == "__main__":
+    run()
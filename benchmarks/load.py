@@ -0,0 +1,76 @@
+"""Prueba de carga en proceso contra la app ASGI.
+
+Las peticiones pasan por ``httpx.ASGITransport`` (sin red), así que se
+mide todo el stack de la app: middlewares, parseo, cálculo y
+serialización. Reporta req/s y percentiles de latencia por endpoint.
+"""
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+import cache
+import main
+from benchmarks.payloads import PAYLOADS, batch_payload
+
+SCENARIOS = {
+    "vc_method": ("POST", "/valuate/vc_method/", PAYLOADS["startup"]),
+    "dcf": ("POST", "/valuate/dcf/", PAYLOADS["dcf"]),
+    "dcf_largo": ("POST", "/valuate/dcf/", PAYLOADS["dcf_largo"]),
+    "berkus": ("POST", "/valuate/berkus/", PAYLOADS["startup"]),
+    "first_chicago": ("POST", "/valuate/first_chicago/", PAYLOADS["startup"]),
+    "batch_100": ("POST", "/valuate/batch/", batch_payload(100)),
+    "status": ("GET", "/status", None),
+}
+
+
+async def _run_scenario(client, method, url, payload, requests, concurrency):
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.request(method, url, json=payload)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400 or (payload is not None and "error" in response.json()):
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99]).tolist()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "req_per_s": round(requests / elapsed, 1),
+        "p50_ms": round(p50, 3),
+        "p95_ms": round(p95, 3),
+        "p99_ms": round(p99, 3),
+    }
+
+
+async def _run_all(requests, concurrency, scenarios):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        results = {}
+        for name in scenarios:
+            method, url, payload = SCENARIOS[name]
+            # Calentamiento: rutas, modelos y threadpool listos antes de medir
+            await _run_scenario(client, method, url, payload, min(50, requests), concurrency)
+            results[name] = await _run_scenario(client, method, url, payload, requests, concurrency)
+        return results
+
+
+def run(requests=2000, concurrency=32, scenarios=None, use_cache=False):
+    """Devuelve {escenario: {req_per_s, p50_ms, p95_ms, p99_ms, ...}}."""
+    previous = main.result_cache
+    main.result_cache = previous if use_cache else cache.NullCache()
+    try:
+        return asyncio.run(_run_all(requests, concurrency, scenarios or list(SCENARIOS)))
+    finally:
+        main.result_cache = previous
@@ -0,0 +1,33 @@
+"""Micro-benchmarks de las cuatro funciones de valuación.
+
+Las funciones se llaman directamente (sin HTTP) con cada forma de
+payload. La caché de resultados se desactiva para medir el cálculo.
+"""
+import timeit
+
+import cache
+import main
+from benchmarks.payloads import PAYLOADS
+
+FUNCTIONS = {
+    "vc_method": main.vc_method,
+    "dcf_method": main.dcf_method,
+    "berkus_method": main.berkus_method,
+    "first_chicago_method": main.first_chicago_method,
+}
+
+
+def run(number=5000, repeat=5, use_cache=False):
+    """Devuelve {"función/payload": µs por llamada} (mínimo de ``repeat`` series)."""
+    previous = main.result_cache
+    main.result_cache = previous if use_cache else cache.NullCache()
+    try:
+        results = {}
+        for name, func in FUNCTIONS.items():
+            for shape, payload in PAYLOADS.items():
+                # Los endpoints reciben un dict nuevo en cada petición
+                timings = timeit.repeat(lambda: func(dict(payload)), number=number, repeat=repeat)
+                results[f"{name}/{shape}"] = round(min(timings) / number * 1e6, 3)
+        return results
+    finally:
+        main.result_cache = previous
@@ -0,0 +1,18 @@
+"""Formas de payload representativas usadas por los benchmarks."""
+
+PAYLOADS = {
+    "startup": {"name": "Acme", "revenue": 1000000, "growth_rate": 20, "investment_required": 500000},
+    "dcf": {"initial_cash_flow": 100000, "growth_rate": 0.2, "discount_rate": 0.15},
+    "dcf_largo": {"initial_cash_flow": 100000, "growth_rate": 0.05, "discount_rate": 0.12, "projection_years": 500},
+    "vc_parcial": {"revenue": 1000000, "growth_rate": 0.3},
+    "dcf_sin_crecimiento": {"initial_cash_flow": 100000},
+    "malformado": {"name": "Acme", "revenue": "mucho", "growth_rate": 0.3, "investment_required": 1},
+}
+
+
+def batch_payload(rows):
+    """Lote de ``rows`` filas alternando las formas startup y dcf."""
+    return {"rows": [
+        dict(PAYLOADS["startup"], revenue=1000000 + i) if i % 2 == 0 else dict(PAYLOADS["dcf"], initial_cash_flow=100000 + i)
+        for i in range(rows)
+    ]}
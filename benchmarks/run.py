@@ -0,0 +1,112 @@
+"""Suite de benchmarks: micro-benchmarks de las funciones de valuación y
+prueba de carga de la app ASGI en proceso.
+
+Los resultados se guardan como JSON. Con ``--baseline`` se comparan contra
+una corrida anterior y el proceso termina con código 1 si alguna métrica
+empeora más que ``--threshold`` (fracción relativa): más µs por llamada,
+menos req/s o un p99 más alto.
+
+Uso:
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --threshold 0.25
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+# Sin logs de peticiones durante las mediciones (antes de importar main)
+os.environ.setdefault("LOG_FILE", os.devnull)
+
+from benchmarks import load, micro  # noqa: E402
+
+
+def compare(current, baseline, threshold):
+    """Lista de regresiones (texto) de ``current`` respecto a ``baseline``."""
+    regressions = []
+    for key, base in baseline.get("micro", {}).items():
+        value = current.get("micro", {}).get(key)
+        if value is not None and value > base * (1 + threshold):
+            regressions.append(f"micro {key}: {base:.3f} µs -> {value:.3f} µs")
+    for key, base in baseline.get("load", {}).items():
+        value = current.get("load", {}).get(key)
+        if value is None:
+            continue
+        if value["req_per_s"] < base["req_per_s"] * (1 - threshold):
+            regressions.append(f"load {key}: {base['req_per_s']} req/s -> {value['req_per_s']} req/s")
+        if value["p99_ms"] > base["p99_ms"] * (1 + threshold):
+            regressions.append(f"load {key}: p99 {base['p99_ms']} ms -> {value['p99_ms']} ms")
+    return regressions
+
+
+def print_results(results):
+    if "micro" in results:
+        print(f"{'función/payload':<42} {'µs/llamada':>11}")
+        for key, value in results["micro"].items():
+            print(f"{key:<42} {value:>11.3f}")
+        print()
+    if "load" in results:
+        print(f"{'escenario':<16} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errores':>8}")
+        for key, value in results["load"].items():
+            print(
+                f"{key:<16} {value['req_per_s']:>9.1f} {value['p50_ms']:>8.3f} "
+                f"{value['p95_ms']:>8.3f} {value['p99_ms']:>8.3f} {value['errors']:>8}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--skip-micro", action="store_true", help="no correr los micro-benchmarks")
+    parser.add_argument("--skip-load", action="store_true", help="no correr la prueba de carga")
+    parser.add_argument("--number", type=int, default=5000, help="llamadas por serie en los micro-benchmarks")
+    parser.add_argument("--requests", type=int, default=2000, help="peticiones por escenario de carga")
+    parser.add_argument("--concurrency", type=int, default=32, help="peticiones simultáneas")
+    parser.add_argument("--scenario", action="append", choices=list(load.SCENARIOS), help="escenarios de carga (todos por defecto)")
+    parser.add_argument("--with-cache", action="store_true", help="medir con la caché de resultados activa")
+    parser.add_argument("--output", help="guardar los resultados en este archivo JSON")
+    parser.add_argument("--save-baseline", help="guardar los resultados como línea base")
+    parser.add_argument("--baseline", help="comparar contra esta línea base")
+    parser.add_argument("--threshold", type=float, default=0.25, help="regresión relativa tolerada (0.25)")
+    args = parser.parse_args(argv)
+
+    results = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cache": args.with_cache,
+        }
+    }
+    if not args.skip_micro:
+        results["micro"] = micro.run(number=args.number, use_cache=args.with_cache)
+    if not args.skip_load:
+        results["load"] = load.run(
+            requests=args.requests,
+            concurrency=args.concurrency,
+            scenarios=args.scenario,
+            use_cache=args.with_cache,
+        )
+    print_results(results)
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegresiones mayores a {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nSin regresiones mayores a {args.threshold:.0%} respecto a {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""Valuación masiva en streaming de carteras CSV o NDJSON.
+
+El cuerpo de la petición se lee a medida que llega, se corta en líneas y
+se agrupa en bloques de ``chunk_size`` filas. Cada bloque pasa por los
+kernels vectorizados (en el threadpool, para no bloquear el event loop) y
+sus resultados se emiten de inmediato. Como el siguiente bloque solo se
+lee cuando el anterior ya se envió, un cliente lento frena la lectura en
+lugar de acumular la salida en memoria: el uso de memoria depende del
+tamaño del bloque, no del archivo.
+
+CSV: la primera línea es el encabezado y cada fila ocupa una línea.
+NDJSON: un objeto JSON por línea.
+
+Una línea de más de ``MAX_BULK_LINE_BYTES`` bytes (64 KiB) no se acumula:
+se descarta hasta el siguiente salto de línea y su fila se informa con
+error.
+"""
+import csv
+import io
+import json
+import os
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+
+import kernels
+
+INPUT_FORMATS = ("csv", "ndjson")
+OUTPUT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+ERROR_INVALID_ROW = "Fila inválida"
+
+MAX_LINE_BYTES = int(os.environ.get("MAX_BULK_LINE_BYTES", 65536))
+ERROR_LINE_TOO_LONG = f"La fila excede el máximo de {MAX_LINE_BYTES} bytes"
+ERROR_HEADER_TOO_LONG = f"El encabezado CSV excede el máximo de {MAX_LINE_BYTES} bytes"
+
+# Marca que reemplaza a una línea demasiado larga
+LINE_TOO_LONG = object()
+
+
+class BulkStreamingResponse(StreamingResponse):
+    """StreamingResponse que puede seguir leyendo el cuerpo de la petición.
+
+    Con servidores ASGI anteriores a la especificación 2.4, StreamingResponse
+    escucha ``receive`` para detectar desconexiones y consumiría los bloques
+    del cuerpo que el generador todavía necesita. Aquí solo se envía; una
+    desconexión se detecta cuando falla ``send``.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def detect_format(content_type):
+    content_type = (content_type or "").lower()
+    if "csv" in content_type:
+        return "csv"
+    if "ndjson" in content_type or "jsonl" in content_type or "json" in content_type:
+        return "ndjson"
+    return None
+
+
+async def iter_lines(stream, max_line_bytes=MAX_LINE_BYTES):
+    """Líneas completas (bytes) de un flujo de bloques de bytes.
+
+    Las líneas de más de ``max_line_bytes`` se devuelven como ``LINE_TOO_LONG``.
+    """
+    pending = bytearray()
+    # Descartando el resto de una línea demasiado larga
+    skipping = False
+    async for block in stream:
+        if not block:
+            continue
+        if skipping:
+            end = block.find(b"\n")
+            if end < 0:
+                continue
+            block = block[end + 1:]
+            skipping = False
+        pending += block
+        if b"\n" in block:
+            *lines, tail = bytes(pending).split(b"\n")
+            pending = bytearray(tail)
+            for line in lines:
+                if len(line) > max_line_bytes:
+                    yield LINE_TOO_LONG
+                elif line.strip():
+                    yield line.rstrip(b"\r")
+        if len(pending) > max_line_bytes:
+            pending = bytearray()
+            skipping = True
+            yield LINE_TOO_LONG
+    if pending.strip():
+        yield bytes(pending).rstrip(b"\r")
+
+
+async def iter_chunks(lines, input_format, chunk_size):
+    """Agrupa las líneas en bloques de ``chunk_size`` filas (listas de bytes)."""
+    chunk = []
+    header = None
+    async for line in lines:
+        if input_format == "csv" and header is None:
+            header = line
+            continue
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield header, chunk
+            chunk = []
+    if chunk:
+        yield header, chunk
+
+
+def parse_chunk(header, lines, input_format):
+    """Convierte un bloque de líneas en columnas crudas, nombres y errores de parseo."""
+    size = len(lines)
+    invalid = {}
+    too_long = [i for i, line in enumerate(lines) if line is LINE_TOO_LONG]
+    if too_long:
+        lines = [b"" if line is LINE_TOO_LONG else line for line in lines]
+    if input_format == "csv" and header is LINE_TOO_LONG:
+        return {}, [None] * size, dict.fromkeys(range(size), ERROR_HEADER_TOO_LONG)
+    if input_format == "csv":
+        fields = next(csv.reader([header.decode("utf-8-sig")]))
+        index = {name.strip(): i for i, name in enumerate(fields)}
+        rows = list(csv.reader(line.decode("utf-8", errors="replace") for line in lines))
+        for i, row in enumerate(rows):
+            if len(row) != len(fields):
+                invalid[i] = ERROR_INVALID_ROW
+        # Una celda vacía o que falta es un campo ausente
+        raw_columns = {
+            col: [(row[index[col]] or None) if len(row) > index[col] else None for row in rows]
+            for col in kernels.FIELDS if col in index
+        }
+    else:
+        rows = []
+        for i, line in enumerate(lines):
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError
+            except ValueError:
+                row = {}
+                invalid[i] = ERROR_INVALID_ROW
+            rows.append(row)
+        raw_columns = kernels.rows_to_columns(rows)
+
+    for i in too_long:
+        invalid[i] = ERROR_LINE_TOO_LONG
+    names = [None if name is kernels.INVALID else name for name in raw_columns.get("name") or [None] * size]
+    return raw_columns, names, invalid
+
+
+def score_chunk(header, lines, input_format, methods):
+    """Valúa un bloque. Devuelve (nombres, {método: (valuations, errors)})."""
+    raw_columns, names, invalid = parse_chunk(header, lines, input_format)
+    columns = kernels.build_columns(raw_columns, len(lines))
+    results = {}
+    for method in methods:
+        valuation, errors = kernels.METHODS[method](columns)[:2]
+        for i, message in invalid.items():
+            valuation[i] = 0.0
+            errors[i] = message
+        results[method] = (valuation, errors)
+    return names, results
+
+
+def format_chunk(offset, names, results, methods, output_format):
+    """Serializa los resultados de un bloque en NDJSON o CSV."""
+    values = {method: [round(v, 2) for v in results[method][0].tolist()] for method in methods}
+    errors = {method: results[method][1] for method in methods}
+    if output_format == "ndjson":
+        out = []
+        for i, name in enumerate(names):
+            record = {"row": offset + i, "name": name}
+            for method in methods:
+                record[method] = values[method][i]
+            row_errors = {method: errors[method][i] for method in methods if errors[method][i] is not None}
+            if row_errors:
+                record["errors"] = row_errors
+            out.append(json.dumps(record, ensure_ascii=False))
+        return ("\n".join(out) + "\n").encode()
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for i, name in enumerate(names):
+        row_errors = "; ".join(
+            f"{method}: {errors[method][i]}" for method in methods if errors[method][i] is not None
+        )
+        writer.writerow([offset + i, name or ""] + [values[method][i] for method in methods] + [row_errors])
+    return buffer.getvalue().encode()
+
+
+async def score_stream(stream, input_format, output_format, methods, chunk_size):
+    """Generador asíncrono con la salida valuada, bloque por bloque."""
+    if output_format == "csv":
+        yield (",".join(["row", "name"] + list(methods) + ["errors"]) + "\n").encode()
+    offset = 0
+    async for header, lines in iter_chunks(iter_lines(stream), input_format, chunk_size):
+        names, results = await run_in_threadpool(score_chunk, header, lines, input_format, methods)
+        yield format_chunk(offset, names, results, methods, output_format)
+        offset += len(lines)
@@ -0,0 +1,130 @@
+"""Caché de resultados de valuación.
+
+Las claves son tuplas con el método y los valores de entrada ya
+normalizados (porcentajes convertidos y valores por defecto aplicados),
+de modo que ``growth_rate: 20`` y ``growth_rate: 0.2`` comparten entrada.
+
+``CacheBackend`` define la interfaz mínima; ``MemoryCache`` es la
+implementación local (LRU con TTL). Otro backend (por ejemplo uno
+compartido entre workers) puede configurarse con la variable de entorno
+``VALUATION_CACHE_BACKEND=modulo:Clase``.
+"""
+import importlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheBackend:
+    """Interfaz de un backend de caché."""
+
+    def get(self, key):
+        """Devuelve el valor guardado o None si no existe o expiró."""
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        """Contadores para /diagnostico."""
+        raise NotImplementedError
+
+
+class NullCache(CacheBackend):
+    """Backend que no guarda nada (caché desactivada)."""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {"backend": "disabled"}
+
+
+class MemoryCache(CacheBackend):
+    """Caché en memoria del proceso, acotada por tamaño (LRU) y por TTL."""
+
+    def __init__(self, max_size=10000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        # Los endpoints síncronos corren en el threadpool
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def from_env():
+    """Crea el backend configurado por variables de entorno.
+
+    - VALUATION_CACHE_SIZE: número máximo de entradas (0 desactiva la caché)
+    - VALUATION_CACHE_TTL: segundos de validez de cada entrada
+    - VALUATION_CACHE_BACKEND: "memory" o "modulo:Clase" de un CacheBackend
+    """
+    max_size = int(os.environ.get("VALUATION_CACHE_SIZE", 10000))
+    ttl = float(os.environ.get("VALUATION_CACHE_TTL", 300))
+    backend = os.environ.get("VALUATION_CACHE_BACKEND", "memory")
+
+    if max_size <= 0:
+        return NullCache()
+    if backend == "memory":
+        return MemoryCache(max_size=max_size, ttl=ttl)
+    module_name, _, class_name = backend.partition(":")
+    backend_class = getattr(importlib.import_module(module_name), class_name)
+    return backend_class(max_size=max_size, ttl=ttl)
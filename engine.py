@@ -0,0 +1,375 @@
+"""Motor de valuación sin dependencias de FastAPI.
+
+Es la única definición de las fórmulas de los cuatro métodos; las usan
+los endpoints de ``main.py``, los kernels vectorizados de ``kernels`` y
+``score.py``:
+
+- Funciones de valuación (``vc_valuation``, ``dcf_valuation``, ...):
+  aceptan escalares (los endpoints, después de elegir el modelo de
+  entrada) o arrays NumPy (los kernels y la simulación Monte Carlo). Los
+  límites usan ``min``/``max`` de Python o, con arrays, ``_array_min`` y
+  ``_array_max``, que siguen la misma regla; así un mismo dato da el
+  mismo número por cualquier camino.
+- ``score_columns``: los kernels de ``kernels`` sobre columnas NumPy, con
+  los errores como códigos enteros en vez de textos.
+- ``round2``: el mismo redondeo que ``round(v, 2)`` de las respuestas
+  HTTP, sobre arrays completos.
+"""
+import functools
+import math
+
+import numpy as np
+
+ERROR_REVENUE = "Los ingresos deben ser positivos"
+ERROR_CASH_FLOW = "El flujo de caja inicial debe ser positivo"
+ERROR_GROWTH = "growth_rate es requerido y debe ser numérico"
+ERROR_NOT_FINITE = "La valuación no es finita con los parámetros dados"
+ERROR_INPUT = "Faltan datos requeridos o hay valores inválidos para el método"
+
+# Código de error de cada mensaje (0 = sin error)
+ERROR_MESSAGES = (
+    None,
+    ERROR_REVENUE,
+    ERROR_CASH_FLOW,
+    ERROR_GROWTH,
+    ERROR_NOT_FINITE,
+    ERROR_INPUT,
+)
+ERROR_CODES = {message: code for code, message in enumerate(ERROR_MESSAGES)}
+
+
+def _array_min(a, b):
+    """``min(a, b)`` de Python elemento a elemento (un NaN en ``b`` deja ``a``)."""
+    return np.where(b < a, b, a)
+
+
+def _array_max(a, b):
+    """``max(a, b)`` de Python elemento a elemento (un NaN en ``b`` deja ``a``)."""
+    return np.where(b > a, b, a)
+
+
+def _ops(*values):
+    """(min, max) para los datos: los de Python con escalares, sus versiones sobre arrays si no."""
+    for value in values:
+        if isinstance(value, np.ndarray):
+            return _array_min, _array_max
+    return min, max
+
+
+def normalize_rate(rate):
+    """Si la tasa viene en porcentaje (20 en vez de 0.2) la convierte a decimal."""
+    if isinstance(rate, np.ndarray):
+        return np.where(rate > 1, rate / 100, rate)
+    return rate / 100 if rate > 1 else rate
+
+
+def vc_valuation(revenue, growth_rate):
+    """Método Venture Capital con el crecimiento ya normalizado."""
+    _, maximum = _ops(revenue, growth_rate)
+    # Cálculo del valor de salida considerando el crecimiento
+    multiple = maximum(5, 10 + growth_rate * 10)  # Ajusta el múltiplo según el crecimiento
+    exit_value = revenue * multiple
+
+    # El retorno esperado por inversores varía según el riesgo
+    investor_return = maximum(3, 8 - growth_rate * 5)  # Menor crecimiento = mayor retorno requerido
+
+    return exit_value / investor_return
+
+
+def dcf_startup_valuation(revenue, growth_rate):
+    """DCF del modelo StartupData: 5 años, margen del 20% y descuento ajustado al riesgo."""
+    minimum, maximum = _ops(revenue, growth_rate)
+    # Tasa de descuento ajustada al riesgo
+    base_discount_rate = 0.1  # Base del 10%
+    risk_adjustment = minimum(0.2, maximum(0.05, 0.25 - growth_rate))  # Menor crecimiento = mayor riesgo
+    discount_rate = base_discount_rate + risk_adjustment
+
+    # Proyección de flujos por 5 años
+    total_value = 0
+    annual_revenue = revenue
+
+    for year in range(1, 6):
+        annual_revenue = annual_revenue * (1 + growth_rate)
+        # Asumiendo un margen operativo del 20%
+        cash_flow = annual_revenue * 0.2
+        # Valor presente del flujo
+        total_value = total_value + cash_flow / ((1 + discount_rate) ** year)
+
+    # Valor terminal (perpetuidad)
+    terminal_growth = minimum(0.03, growth_rate / 3)  # Crecimiento terminal conservador
+    terminal_value = (annual_revenue * 0.2 * (1 + terminal_growth)) / (discount_rate - terminal_growth)
+    terminal_value_discounted = terminal_value / ((1 + discount_rate) ** 5)
+
+    return total_value + terminal_value_discounted
+
+
+def dcf_rates(growth_rate, discount_rate, terminal_growth_rate):
+    """Tasas del modelo DCFData en decimales, con el descuento mayor que el crecimiento terminal."""
+    growth_rate = normalize_rate(growth_rate)
+    discount_rate = normalize_rate(discount_rate)
+    terminal_growth_rate = normalize_rate(terminal_growth_rate)
+
+    # Evitar división por cero
+    if isinstance(discount_rate, np.ndarray) or isinstance(terminal_growth_rate, np.ndarray):
+        discount_rate = np.where(discount_rate <= terminal_growth_rate, terminal_growth_rate + 0.01, discount_rate)
+    elif discount_rate <= terminal_growth_rate:
+        discount_rate = terminal_growth_rate + 0.01
+    return growth_rate, discount_rate, terminal_growth_rate
+
+
+def dcf_closed_form(initial_cash_flow, growth_rate, discount_rate, terminal_growth_rate, projection_years):
+    """Valor DCF (flujos proyectados + valor terminal) sin iterar por año.
+
+    La suma de flujos descontados es una serie geométrica de razón
+    q = (1 + g) / (1 + r), evaluada con log1p/expm1 para que siga siendo
+    precisa cuando g ≈ r (caso en el que la suma tiende a n). El costo es
+    constante sin importar ``projection_years``. Acepta escalares o arrays.
+    """
+    if not isinstance(initial_cash_flow, np.ndarray) and not any(
+        isinstance(v, np.ndarray) for v in (growth_rate, discount_rate, terminal_growth_rate, projection_years)
+    ):
+        value = _dcf_closed_form_scalar(
+            initial_cash_flow, growth_rate, discount_rate, terminal_growth_rate, projection_years
+        )
+        if value is not None:
+            return value
+        # Casos límite: una fila por el camino de arrays (el ``**`` de NumPy
+        # sobre escalares 0-d no siempre redondea igual que sobre arrays)
+        return dcf_closed_form(*(
+            np.array([v], dtype=np.float64)
+            for v in (initial_cash_flow, growth_rate, discount_rate, terminal_growth_rate, projection_years)
+        ))[0]
+    g = np.asarray(growth_rate, dtype=np.float64)
+    r = np.asarray(discount_rate, dtype=np.float64)
+    tg = np.asarray(terminal_growth_rate, dtype=np.float64)
+    n = np.asarray(projection_years, dtype=np.float64)
+    # Con horizontes negativos no se proyecta ningún flujo (como el bucle original)
+    n_growth = np.maximum(n, 0)
+
+    with np.errstate(all="ignore"):
+        ratio = (g - r) / (1 + r)  # q - 1
+        log_q = np.log1p(ratio)
+        series = np.where(ratio == 0, n_growth, (1 + ratio) * np.expm1(n_growth * log_q) / ratio)
+        # q^n_growth / (1 + r)^min(n, 0): factor del valor terminal
+        terminal_factor = np.exp(n_growth * log_q - np.minimum(n, 0) * np.log1p(r))
+
+        # Si q <= 0 el logaritmo no existe: usar potencias directas
+        fallback = ~np.isfinite(log_q) | ~np.isfinite(terminal_factor)
+        if fallback.any():
+            q = 1 + ratio
+            series = np.where(fallback, np.where(n_growth == 0, 0.0, q * (1 - q ** n_growth) / (1 - q)), series)
+            terminal_factor = np.where(
+                fallback, (1 + g) ** n_growth / (1 + r) ** n, terminal_factor
+            )
+
+        terminal_value = terminal_factor * (1 + tg) / (r - tg)
+        return initial_cash_flow * (series + terminal_value)
+
+
+def dcf_valuation(initial_cash_flow, growth_rate, discount_rate, terminal_growth_rate, projection_years):
+    """Flujos proyectados + valor terminal con las tasas de ``dcf_rates``.
+
+    En forma cerrada: el costo no depende de ``projection_years``.
+    """
+    return float(dcf_closed_form(initial_cash_flow, growth_rate, discount_rate, terminal_growth_rate, projection_years))
+
+
+# Mayor exponente con exp() finito en float64
+_MAX_EXP = 709.0
+
+
+def _dcf_closed_form_scalar(initial_cash_flow, growth_rate, discount_rate, terminal_growth_rate, projection_years):
+    """``dcf_closed_form`` para escalares, sin crear arrays (lo usa ``dcf_valuation``).
+
+    Hace las mismas operaciones en el mismo orden: la aritmética de float
+    de Python redondea igual que NumPy, y log1p/expm1/exp son los ufuncs
+    de NumPy sobre escalares (``math`` difiere en el último bit con
+    frecuencia), así que el resultado es idéntico al de los kernels.
+    Devuelve None en los casos que usan potencias directas o que se salen
+    de rango; esos van por el camino de arrays.
+    """
+    try:
+        g = float(growth_rate)
+        r = float(discount_rate)
+        tg = float(terminal_growth_rate)
+        n = float(projection_years)
+        n_growth = max(n, 0.0)
+        ratio = (g - r) / (1 + r)  # q - 1
+        if not -1 < ratio < math.inf or not r > -1 or not math.isfinite(n):
+            return None
+        log_q = float(np.log1p(ratio))
+        exponent = n_growth * log_q
+        if n < 0:
+            exponent -= n * float(np.log1p(r))
+        if exponent > _MAX_EXP:
+            return None
+        series = n_growth if ratio == 0 else (1 + ratio) * float(np.expm1(n_growth * log_q)) / ratio
+        terminal_value = float(np.exp(exponent)) * (1 + tg) / (r - tg)
+        return initial_cash_flow * (series + terminal_value)
+    except ZeroDivisionError:
+        return None
+
+
+@functools.lru_cache(maxsize=256)
+def growth_factors(rate, horizon):
+    """Vector (1 + rate) ** t para t = 1..horizon (solo lectura, cacheado)."""
+    factors = (1 + rate) ** np.arange(1, horizon + 1, dtype=np.float64)
+    factors.setflags(write=False)
+    return factors
+
+
+@functools.lru_cache(maxsize=256)
+def discount_factors(rate, horizon):
+    """Vector 1 / (1 + rate) ** t para t = 1..horizon (solo lectura, cacheado)."""
+    factors = 1 / growth_factors(rate, horizon)
+    factors.setflags(write=False)
+    return factors
+
+
+def dcf_schedule(initial_cash_flow, growth_rate, discount_rate, projection_years):
+    """Tabla año a año de flujos y valores presentes, a partir de los vectores cacheados."""
+    horizon = max(int(projection_years), 0)
+    cash_flows = initial_cash_flow * growth_factors(growth_rate, horizon)
+    present_values = cash_flows * discount_factors(discount_rate, horizon)
+    return {
+        "year": list(range(1, horizon + 1)),
+        "cash_flow": [round(v, 2) for v in cash_flows.tolist()],
+        "present_value": [round(v, 2) for v in present_values.tolist()],
+    }
+
+
+def berkus_valuation(revenue, growth_rate, investment_required):
+    """Método Berkus: hasta 500.000 USD por cada uno de cinco aspectos más el valor base."""
+    minimum, maximum = _ops(revenue, growth_rate, investment_required)
+    # Valor base por idea/concepto
+    base_value = 500000
+
+    # Calidad del equipo de gestión (aproximada por ingresos)
+    revenue_factor = minimum(1.0, revenue / 2000000)
+    management_value = 500000 * revenue_factor
+
+    # Calidad/avance del producto
+    product_factor = minimum(1.0, maximum(0.2, revenue / 1000000))
+    product_value = 500000 * product_factor
+
+    # Tamaño/potencial del mercado
+    market_factor = minimum(1.0, maximum(0.1, growth_rate * 2))
+    market_value = 500000 * market_factor
+
+    # Reducción del riesgo por competencia
+    competition_factor = minimum(1.0, maximum(0.1, 1 - (growth_rate / 2)))
+    competition_value = 500000 * competition_factor
+
+    # Riesgo financiero (basado en inversión requerida vs ingresos)
+    financial_ratio = minimum(1.0, maximum(0.1, revenue / maximum(1, investment_required)))
+    financial_value = 500000 * financial_ratio
+
+    return base_value + management_value + product_value + market_value + competition_value + financial_value
+
+
+def first_chicago_valuation(revenue, growth_rate, investment_required, success_multiple=None, failure_probability=None):
+    """Método First Chicago. Devuelve (valuación, {escenario: (probabilidad, valuación)}).
+
+    ``success_multiple`` y ``failure_probability`` reemplazan el múltiplo
+    de salida y la probabilidad de fracaso derivados de ``growth_rate``
+    (los usa la simulación Monte Carlo).
+    """
+    minimum, maximum = _ops(revenue, growth_rate, investment_required, failure_probability)
+    # Escenario optimista (éxito)
+    success_probability = minimum(0.7, maximum(0.1, growth_rate))
+    if success_multiple is None:
+        success_multiple = 15 + (growth_rate * 10)
+    success_valuation = revenue * success_multiple
+
+    # Escenario base (lateral)
+    base_probability = minimum(0.7, maximum(0.2, 0.5 - growth_rate/2))
+    base_multiple = 5 + (growth_rate * 3)
+    base_valuation = revenue * base_multiple
+
+    # Escenario pesimista (fracaso)
+    failure_multiple = maximum(0.2, minimum(1.0, investment_required / revenue))
+    failure_valuation = revenue * failure_multiple
+
+    if failure_probability is None:
+        failure_probability = maximum(0.1, 1 - success_probability - base_probability)
+
+        # Normalización de probabilidades
+        total_probability = success_probability + base_probability + failure_probability
+        success_probability = success_probability / total_probability
+        base_probability = base_probability / total_probability
+        failure_probability = failure_probability / total_probability
+    else:
+        # Probabilidad de fracaso dada: éxito y lateral se reparten el resto
+        failure_probability = minimum(1.0, maximum(0.0, failure_probability))
+        remaining = (1 - failure_probability) / (success_probability + base_probability)
+        success_probability = success_probability * remaining
+        base_probability = base_probability * remaining
+
+    # Valoración ponderada por probabilidad
+    weighted_valuation = (
+        success_probability * success_valuation +
+        base_probability * base_valuation +
+        failure_probability * failure_valuation
+    )
+    scenarios = {
+        "success": (success_probability, success_valuation),
+        "base": (base_probability, base_valuation),
+        "failure": (failure_probability, failure_valuation),
+    }
+    return weighted_valuation, scenarios
+
+
+def round2(values):
+    """``round(v, 2)`` de Python sobre un array, sin recorrerlo en Python.
+
+    ``np.round`` multiplica por 100 y esa multiplicación puede cruzar un
+    punto medio que el redondeo decimal exacto no cruza. Esas filas (las
+    que quedan a pocos ulp de ,5 y las demasiado grandes para
+    representar los centavos) se redondean con ``round``.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(all="ignore"):
+        scaled = values * 100
+        rounded = np.rint(scaled) / 100
+        distance = np.abs(scaled - np.floor(scaled) - 0.5)
+        doubtful = (distance <= 4 * np.abs(np.spacing(scaled))) | (np.abs(scaled) >= 2.0 ** 52)
+    doubtful &= np.isfinite(values)
+    for i in np.flatnonzero(doubtful):
+        rounded[i] = round(float(values[i]), 2)
+    return rounded
+
+
+def error_codes(errors):
+    """Array de mensajes (None = sin error) a códigos de ``ERROR_MESSAGES``."""
+    codes = np.zeros(errors.shape, dtype=np.int8)
+    # Los mensajes se comparan solo en las filas con error
+    rows = np.flatnonzero(errors != None)  # noqa: E711
+    if rows.size:
+        messages = errors[rows]
+        for message, code in ERROR_CODES.items():
+            if message is not None:
+                codes[rows[messages == message]] = code
+    return codes
+
+
+def score_columns(raw_columns, size, methods=None, scenarios=False):
+    """Valúa columnas crudas (arrays o listas; NaN = ausente) con los kernels.
+
+    Devuelve {método: {"valuation": array redondeado, "error": códigos}} y,
+    con ``scenarios``, las probabilidades y valuaciones de First Chicago.
+    ``methods`` por defecto son todos los de ``kernels.METHODS``.
+    """
+    # kernels importa este módulo para las fórmulas
+    import kernels
+
+    columns = kernels.build_columns(raw_columns, size)
+    results = {}
+    for method in methods or kernels.METHODS:
+        output = kernels.METHODS[method](columns)
+        result = {"valuation": round2(output[0]), "error": error_codes(output[1])}
+        if scenarios and method == "first_chicago":
+            for name, (probability, values) in output[2].items():
+                result[f"{name}_probability"] = round2(probability)
+                result[f"{name}_valuation"] = round2(values)
+        results[method] = result
+    return results
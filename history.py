@@ -0,0 +1,304 @@
+"""Historial de valuaciones.
+
+Cada valuación exitosa de los cuatro métodos se registra con sus datos de
+entrada ya normalizados, el método, el resultado y (en First Chicago) el
+detalle de escenarios. ``record`` solo encola el registro; un hilo en
+segundo plano los inserta en lotes, así la petición no espera al disco.
+El hilo se crea con ``start`` en el arranque de cada worker (después del
+fork de server.py), no al importar la app.
+
+``HistoryBackend`` define la interfaz; ``SQLiteHistory`` es la
+implementación local. Las consultas filtran por nombre, método y rango de
+fechas usando índices, y los agregados (media, mediana, percentiles) se
+calculan en SQLite sin traer las filas.
+
+Configuración por variables de entorno:
+
+- VALUATION_HISTORY_DB: archivo SQLite (vacío desactiva el historial)
+- VALUATION_HISTORY_BACKEND: "sqlite" o "modulo:Clase" de un HistoryBackend
+- VALUATION_HISTORY_BATCH: registros por inserción (500)
+- VALUATION_HISTORY_QUEUE: registros pendientes antes de descartar (10000)
+"""
+import contextlib
+import importlib
+import json
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+_STOP = object()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS valuations (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    name TEXT,
+    method TEXT NOT NULL,
+    valuation REAL NOT NULL,
+    inputs TEXT NOT NULL,
+    scenarios TEXT
+);
+CREATE INDEX IF NOT EXISTS valuations_method_created ON valuations (method, created_at);
+CREATE INDEX IF NOT EXISTS valuations_name_created ON valuations (name, created_at);
+CREATE INDEX IF NOT EXISTS valuations_method_valuation ON valuations (method, valuation);
+"""
+
+_INSERT = "INSERT INTO valuations (created_at, name, method, valuation, inputs, scenarios) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+class HistoryBackend:
+    """Interfaz de un backend de historial."""
+
+    # Los endpoints de /history/ responden solo si el backend guarda valuaciones
+    enabled = True
+
+    def record(self, method, name, inputs, result):
+        """Registra una valuación sin bloquear."""
+        raise NotImplementedError
+
+    def query(self, name=None, method=None, since=None, until=None, limit=100, offset=0):
+        """Valuaciones que cumplen los filtros, de la más reciente a la más antigua."""
+        raise NotImplementedError
+
+    def aggregate(self, name=None, method=None, since=None, until=None, percentiles=DEFAULT_PERCENTILES):
+        """Estadísticos por método de las valuaciones que cumplen los filtros."""
+        raise NotImplementedError
+
+    def start(self):
+        """Inicia la escritura en segundo plano (en el arranque de cada worker)."""
+
+    def close(self):
+        pass
+
+    def stats(self):
+        """Contadores para /diagnostico."""
+        raise NotImplementedError
+
+
+class NullHistory(HistoryBackend):
+    """Backend que no guarda nada (historial desactivado)."""
+
+    enabled = False
+
+    def record(self, method, name, inputs, result):
+        pass
+
+    def query(self, name=None, method=None, since=None, until=None, limit=100, offset=0):
+        return []
+
+    def aggregate(self, name=None, method=None, since=None, until=None, percentiles=DEFAULT_PERCENTILES):
+        return {}
+
+    def stats(self):
+        return {"backend": "disabled"}
+
+
+def _filters(name, method, since, until):
+    clauses = []
+    params = []
+    for column, op, value in (("name", "=", name), ("method", "=", method), ("created_at", ">=", since), ("created_at", "<", until)):
+        if value is not None:
+            clauses.append(f"{column} {op} ?")
+            params.append(value)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+class SQLiteHistory(HistoryBackend):
+    """Historial en un archivo SQLite local, escrito en lotes por un hilo propio."""
+
+    def __init__(self, path, batch_size=500, queue_size=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self._reset()
+        with contextlib.closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            conn.executescript(_SCHEMA)
+        # Tras un fork el hijo necesita su propia cola y sus propias conexiones
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._local = threading.local()
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self._thread.start()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record(self, method, name, inputs, result):
+        valuation = result["valuation"]
+        # La columna es NOT NULL: un NaN o infinito no llega al hilo escritor
+        if not math.isfinite(valuation):
+            self.rejected += 1
+            return
+        try:
+            self._queue.put_nowait((time.time(), name, method, valuation, inputs, result.get("scenarios")))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                break
+            batch = [entry]
+            stop = False
+            # Vaciar lo que ya esté encolado para insertar en una sola transacción
+            while len(batch) < self.batch_size:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stop = True
+                    break
+                batch.append(entry)
+            self._flush(batch)
+            if stop:
+                break
+
+    def _flush(self, batch):
+        rows = [
+            (created_at, name, method, valuation, json.dumps(inputs),
+             None if scenarios is None else json.dumps(scenarios))
+            for created_at, name, method, valuation, inputs, scenarios in batch
+        ]
+        try:
+            with self._connect() as conn:
+                conn.executemany(_INSERT, rows)
+            self.written += len(rows)
+        except sqlite3.IntegrityError:
+            # Una fila inválida no descarta el lote: se reintenta fila por fila
+            for row in rows:
+                try:
+                    with self._connect() as conn:
+                        conn.execute(_INSERT, row)
+                    self.written += 1
+                except sqlite3.Error:
+                    self.dropped += 1
+        except sqlite3.Error:
+            self.dropped += len(rows)
+
+    def query(self, name=None, method=None, since=None, until=None, limit=100, offset=0):
+        where, params = _filters(name, method, since, until)
+        rows = self._connect().execute(
+            "SELECT id, created_at, name, method, valuation, inputs, scenarios FROM valuations"
+            f"{where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        ).fetchall()
+        items = []
+        for row_id, created_at, row_name, row_method, valuation, inputs, scenarios in rows:
+            item = {
+                "id": row_id,
+                "created_at": created_at,
+                "name": row_name,
+                "method": row_method,
+                "valuation": valuation,
+                "inputs": json.loads(inputs),
+            }
+            if scenarios is not None:
+                item["scenarios"] = json.loads(scenarios)
+            items.append(item)
+        return items
+
+    def _values_at(self, where, params, method, positions):
+        """Percentiles con interpolación lineal (igual que numpy) en una sola pasada ordenada.
+
+        ``ROW_NUMBER()`` numera las filas del método en orden y solo se leen
+        las dos vecinas de cada posición pedida.
+        """
+        needed = sorted({k for position in positions for k in (math.floor(position), math.floor(position) + 1)})
+        values = dict(self._connect().execute(
+            "SELECT k, valuation FROM ("
+            "SELECT valuation, ROW_NUMBER() OVER (ORDER BY valuation) - 1 AS k FROM valuations"
+            f"{where} {'AND' if where else 'WHERE'} method = ?"
+            f") WHERE k IN ({', '.join('?' * len(needed))})",
+            params + [method] + needed,
+        ).fetchall())
+        result = []
+        for position in positions:
+            lower = math.floor(position)
+            if position == lower or lower + 1 not in values:
+                result.append(values[lower])
+            else:
+                result.append(values[lower] + (values[lower + 1] - values[lower]) * (position - lower))
+        return result
+
+    def aggregate(self, name=None, method=None, since=None, until=None, percentiles=DEFAULT_PERCENTILES):
+        where, params = _filters(name, method, since, until)
+        conn = self._connect()
+        groups = conn.execute(
+            f"SELECT method, COUNT(*), AVG(valuation), MIN(valuation), MAX(valuation) FROM valuations{where} GROUP BY method",
+            params,
+        ).fetchall()
+        # El filtro por método ya está en la consulta; no repetirlo al pedir percentiles
+        where, params = _filters(name, None, since, until)
+        result = {}
+        for group_method, count, mean, minimum, maximum in groups:
+            # La mediana y todos los percentiles salen de la misma consulta
+            median, *values = self._values_at(
+                where, params, group_method, [(count - 1) * p / 100 for p in (50, *percentiles)]
+            )
+            result[group_method] = {
+                "count": count,
+                "mean": round(mean, 2),
+                "min": round(minimum, 2),
+                "max": round(maximum, 2),
+                "median": round(median, 2),
+                "percentiles": {f"p{p:g}": round(value, 2) for p, value in zip(percentiles, values)},
+            }
+        return result
+
+    def close(self, timeout=2.0):
+        """Escribe lo pendiente y detiene el hilo."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "written": self.written,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "pending": self._queue.qsize(),
+        }
+
+
+def from_env():
+    """Crea el backend configurado por variables de entorno (desactivado por defecto)."""
+    path = os.environ.get("VALUATION_HISTORY_DB", "")
+    backend = os.environ.get("VALUATION_HISTORY_BACKEND", "sqlite")
+    batch_size = int(os.environ.get("VALUATION_HISTORY_BATCH", 500))
+    queue_size = int(os.environ.get("VALUATION_HISTORY_QUEUE", 10000))
+
+    if not path:
+        return NullHistory()
+    if backend == "sqlite":
+        return SQLiteHistory(path, batch_size=batch_size, queue_size=queue_size)
+    module_name, _, class_name = backend.partition(":")
+    backend_class = getattr(importlib.import_module(module_name), class_name)
+    return backend_class(path, batch_size=batch_size, queue_size=queue_size)
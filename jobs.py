@@ -0,0 +1,403 @@
+"""Cola de trabajos asíncronos para valuaciones largas, persistida en SQLite.
+
+Los lotes grandes y las simulaciones no caben en un POST síncrono (Cloud
+Run corta la petición), así que se encolan como trabajos: el cliente
+recibe un ID, consulta el estado y el avance, y después pide el resultado.
+
+- El estado, el avance y el resultado de cada trabajo viven en una tabla
+  SQLite local. Cualquier proceso que comparta el archivo puede atender
+  la cola; un trabajo se reclama con una transacción ``BEGIN IMMEDIATE``
+  para que un solo worker lo tome.
+- Un número fijo de hilos worker ejecuta los trabajos. Si el proceso
+  muere con trabajos en curso, su latido deja de actualizarse y después
+  de ``stale_seconds`` vuelven a la cola (hasta ``max_attempts`` veces).
+- La cancelación es cooperativa: los trabajos en cola se cancelan de
+  inmediato y los que están corriendo se detienen en el siguiente punto
+  de control (``JobContext.check_cancelled``) o se descarta su resultado.
+- Los trabajos terminados expiran ``result_ttl`` segundos después y se
+  borran de la tabla.
+
+Configuración por variables de entorno:
+
+- JOBS_DB: archivo SQLite (jobs.db)
+- JOB_WORKERS: hilos worker por proceso (2)
+- JOB_RESULT_TTL: segundos que se conserva un trabajo terminado (3600)
+- JOB_MAX_PENDING: trabajos en cola antes de rechazar nuevos (1000)
+- JOB_STALE_SECONDS: segundos sin latido antes de reencolar un trabajo (60)
+- JOB_MAX_ATTEMPTS: veces que se reintenta un trabajo interrumpido (3)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINISHED = ("succeeded", "failed", "cancelled")
+
+ERROR_INTERRUPTED = "El trabajo se interrumpió demasiadas veces"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_expires ON jobs (expires_at);
+"""
+
+
+class JobCancelled(Exception):
+    """Se pidió cancelar el trabajo mientras corría."""
+
+
+class JobQueueFull(Exception):
+    """Hay demasiados trabajos en cola."""
+
+
+class JobStore:
+    """Acceso a la tabla de trabajos. Cada hilo usa su propia conexión."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        # Las conexiones SQLite no sirven en un proceso hijo: cada uno abre las suyas
+        os.register_at_fork(after_in_child=self._reset_connections)
+
+    def _reset_connections(self):
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(_SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def insert(self, job_id, kind, payload):
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, status, payload, created_at) VALUES (?, ?, 'queued', ?, ?)",
+            (job_id, kind, json.dumps(payload), time.time()),
+        )
+
+    def get(self, job_id):
+        return self._conn().execute(
+            "SELECT * FROM jobs WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (job_id, time.time()),
+        ).fetchone()
+
+    def list(self, status=None, limit=50):
+        query = "SELECT * FROM jobs WHERE (expires_at IS NULL OR expires_at > ?)"
+        params = [time.time()]
+        if status is not None:
+            query += " AND status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        return self._conn().execute(query, params).fetchall()
+
+    def counts(self):
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def pending(self):
+        return self._conn().execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def claim(self, worker):
+        """Marca como corriendo el trabajo más antiguo de la cola y lo devuelve."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                "started_at = ?, heartbeat_at = ?, progress = 0 WHERE id = ?",
+                (worker, now, now, row["id"]),
+            )
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+            conn.execute("COMMIT")
+            return job
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def set_progress(self, job_id, worker, progress):
+        self._conn().execute(
+            "UPDATE jobs SET progress = ?, heartbeat_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (progress, time.time(), job_id, worker),
+        )
+
+    def cancel_requested(self, job_id):
+        row = self._conn().execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is None or bool(row[0])
+
+    def finish(self, job_id, worker, status, result, error, ttl):
+        """Guarda el resultado si el trabajo sigue asignado a este worker."""
+        now = time.time()
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, progress = CASE WHEN ? = 'succeeded' THEN 1 ELSE progress END, "
+            "finished_at = ?, expires_at = ?, worker = NULL WHERE id = ? AND worker = ? AND status = 'running'",
+            (status, None if result is None else json.dumps(result), error, status, now, now + ttl, job_id, worker),
+        )
+
+    def cancel(self, job_id, ttl):
+        """Cancela un trabajo en cola o pide cancelar uno en curso. Devuelve la fila."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ?, expires_at = ? "
+            "WHERE id = ? AND status = 'queued'",
+            (now, now + ttl, job_id),
+        )
+        conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        return self.get(job_id)
+
+    def heartbeat(self, instance):
+        """Renueva el latido de los trabajos que corren en este proceso."""
+        self._conn().execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND worker LIKE ?",
+            (time.time(), instance + "-%"),
+        )
+
+    def requeue(self, instance):
+        """Devuelve a la cola los trabajos de este proceso (al apagarse)."""
+        self._conn().execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND worker LIKE ?",
+            (instance + "-%",),
+        )
+
+    def requeue_stale(self, stale_seconds, max_attempts, ttl):
+        """Reencola los trabajos sin latido; los que agotaron sus intentos fallan."""
+        conn = self._conn()
+        now = time.time()
+        limit = now - stale_seconds
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = ?, worker = NULL, finished_at = ?, expires_at = ? "
+            "WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+            (ERROR_INTERRUPTED, now, now + ttl, limit, max_attempts),
+        )
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND heartbeat_at < ?",
+            (limit,),
+        )
+
+    def purge_expired(self):
+        self._conn().execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+
+class JobContext:
+    """Lo que ve un trabajo mientras corre: avance y cancelación."""
+
+    # Intervalo mínimo entre escrituras del avance
+    PROGRESS_INTERVAL = 0.5
+
+    def __init__(self, store, job_id, worker):
+        self.store = store
+        self.job_id = job_id
+        self.worker = worker
+        self._last_write = 0.0
+
+    def progress(self, fraction):
+        now = time.monotonic()
+        if fraction >= 1.0 or now - self._last_write >= self.PROGRESS_INTERVAL:
+            self._last_write = now
+            self.store.set_progress(self.job_id, self.worker, min(max(fraction, 0.0), 1.0))
+
+    def cancelled(self):
+        return self.store.cancel_requested(self.job_id)
+
+    def check_cancelled(self):
+        if self.cancelled():
+            raise JobCancelled()
+
+
+def job_view(row, include_result=False):
+    """Representación pública de una fila de la tabla."""
+    view = {
+        "id": row["id"],
+        "kind": row["kind"],
+        "status": row["status"],
+        "progress": round(row["progress"], 4),
+        "attempts": row["attempts"],
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+        "expires_at": row["expires_at"],
+    }
+    if row["error"] is not None:
+        view["error"] = row["error"]
+    if include_result:
+        view["result"] = json.loads(row["result"]) if row["result"] is not None else None
+    return view
+
+
+class JobManager:
+    """Encola trabajos y los ejecuta con un número fijo de hilos worker.
+
+    ``runners`` mapea cada tipo de trabajo a ``runner(payload, context)``,
+    que devuelve un dict. Un dict con la clave ``"error"`` marca el
+    trabajo como fallido, igual que en los endpoints.
+    """
+
+    def __init__(self, store, runners, workers=2, result_ttl=3600, max_pending=1000,
+                 stale_seconds=60, max_attempts=3, poll_interval=1.0, log=None):
+        self.store = store
+        self.runners = runners
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.max_pending = max_pending
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.log = log
+        # Prefijo de los workers de este proceso (para el latido y el apagado);
+        # se vuelve a generar en start() porque la app puede cargarse antes del fork
+        self.instance = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def submit(self, kind, payload):
+        if kind not in self.runners:
+            raise KeyError(kind)
+        if self.store.pending() >= self.max_pending:
+            raise JobQueueFull()
+        job_id = uuid.uuid4().hex
+        self.store.insert(job_id, kind, payload)
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id, include_result=False):
+        row = self.store.get(job_id)
+        return None if row is None else job_view(row, include_result)
+
+    def list(self, status=None, limit=50):
+        return [job_view(row) for row in self.store.list(status, limit)]
+
+    def cancel(self, job_id):
+        row = self.store.cancel(job_id, self.result_ttl)
+        return None if row is None else job_view(row)
+
+    def stats(self):
+        return {"workers": self.workers, "running": bool(self._threads), "jobs": self.store.counts()}
+
+    def start(self):
+        if self._threads or self.workers <= 0:
+            return
+        self.instance = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._stop.clear()
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(f"{self.instance}-{n}",), name=f"job-worker-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        janitor = threading.Thread(target=self._janitor, name="job-janitor", daemon=True)
+        janitor.start()
+        self._threads.append(janitor)
+
+    def stop(self, timeout=5.0):
+        """Detiene los hilos; lo que quede corriendo vuelve a la cola."""
+        self._stop.set()
+        self._wake.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+        self.store.requeue(self.instance)
+
+    def _work(self, worker):
+        while not self._stop.is_set():
+            try:
+                job = self.store.claim(worker)
+            except sqlite3.Error as e:
+                self._event("error", "Error al reclamar un trabajo", error=str(e))
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._execute(job, worker)
+
+    def _execute(self, job, worker):
+        context = JobContext(self.store, job["id"], worker)
+        result = error = None
+        try:
+            context.check_cancelled()
+            result = self.runners[job["kind"]](json.loads(job["payload"]), context)
+            if context.cancelled():
+                status = "cancelled"
+                result = None
+            elif isinstance(result, dict) and "error" in result:
+                status = "failed"
+                error = str(result["error"])
+            else:
+                status = "succeeded"
+        except JobCancelled:
+            status = "cancelled"
+            result = None
+        except Exception as e:
+            self._event("error", "Error en el trabajo", job_id=job["id"], kind=job["kind"], error=str(e))
+            status = "failed"
+            result = None
+            error = f"Error al calcular: {str(e)}"
+        self.store.finish(job["id"], worker, status, result, error, self.result_ttl)
+
+    def _janitor(self):
+        interval = max(0.5, self.stale_seconds / 3)
+        while not self._stop.wait(interval):
+            try:
+                self.store.heartbeat(self.instance)
+                self.store.requeue_stale(self.stale_seconds, self.max_attempts, self.result_ttl)
+                self.store.purge_expired()
+            except sqlite3.Error as e:
+                self._event("error", "Error en el mantenimiento de trabajos", error=str(e))
+                continue
+            # Trabajos reencolados o enviados por otro proceso
+            self._wake.set()
+
+    def _event(self, level, message, **fields):
+        if self.log is not None:
+            self.log.event(level, message, **fields)
+
+
+def from_env(runners, log=None):
+    return JobManager(
+        JobStore(os.environ.get("JOBS_DB", "jobs.db")),
+        runners,
+        workers=int(os.environ.get("JOB_WORKERS", 2)),
+        result_ttl=int(os.environ.get("JOB_RESULT_TTL", 3600)),
+        max_pending=int(os.environ.get("JOB_MAX_PENDING", 1000)),
+        stale_seconds=int(os.environ.get("JOB_STALE_SECONDS", 60)),
+        max_attempts=int(os.environ.get("JOB_MAX_ATTEMPTS", 3)),
+        log=log,
+    )
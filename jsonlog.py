@@ -0,0 +1,175 @@
+"""Logging estructurado (JSON lines) con escritura en segundo plano.
+
+Los registros se encolan sin bloquear y un hilo dedicado los serializa y
+escribe, así el event loop no espera a stdout. El middleware de peticiones
+muestrea los registros, limita el tamaño del cuerpo capturado (o no lo
+captura) y copia los bytes a medida que pasan, sin volver a leer el cuerpo.
+
+Configuración por variables de entorno:
+
+- LOG_SAMPLE_RATE: fracción de peticiones exitosas que se registran (1.0)
+- LOG_ERROR_SAMPLE_RATE: fracción de respuestas >= 400 que se registran (1.0)
+- LOG_BODIES: "0" desactiva la captura del cuerpo de la petición
+- LOG_BODY_MAX_BYTES: bytes máximos del cuerpo que se registran (1024)
+- LOG_QUEUE_SIZE: registros pendientes antes de descartar (10000)
+- LOG_FILE: archivo de salida (por defecto stdout)
+"""
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+_STOP = object()
+
+
+class JsonLogWriter:
+    """Escribe registros como JSON lines desde un hilo en segundo plano."""
+
+    def __init__(self, stream=None, queue_size=10000):
+        self.stream = stream or sys.stdout
+        self.queue_size = queue_size
+        self._reset()
+        # Un proceso hijo no hereda el hilo: empieza con una cola propia
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self.written = 0
+        self.dropped = 0
+        self._thread = None
+
+    def start(self):
+        """Inicia el hilo de escritura (en el arranque de cada worker, después del fork)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="jsonlog-writer", daemon=True)
+            self._thread.start()
+
+    def write(self, record):
+        """Encola un registro; si la cola está llena se descarta."""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def event(self, level, message, **fields):
+        self.write({"ts": time.time(), "level": level, "message": message, **fields})
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is _STOP:
+                break
+            lines = [record]
+            # Vaciar lo que ya esté encolado para escribir en un solo bloque
+            while len(lines) < 256:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    self._flush(lines)
+                    return
+                lines.append(record)
+            self._flush(lines)
+
+    def _flush(self, records):
+        try:
+            self.stream.write("".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records))
+            self.stream.flush()
+            self.written += len(records)
+        except Exception:
+            self.dropped += len(records)
+
+    def close(self, timeout=2.0):
+        """Escribe lo pendiente y detiene el hilo."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {"written": self.written, "dropped": self.dropped, "pending": self._queue.qsize()}
+
+
+class RequestLogMiddleware:
+    """Middleware ASGI que registra cada petición HTTP como un evento JSON."""
+
+    def __init__(self, app, writer, sample_rate=1.0, error_sample_rate=1.0, capture_body=True, body_max_bytes=1024):
+        self.app = app
+        self.writer = writer
+        self.sample_rate = sample_rate
+        self.error_sample_rate = error_sample_rate
+        self.capture_body = capture_body
+        self.body_max_bytes = body_max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter_ns()
+        status = 500
+        body = bytearray()
+        body_size = 0
+        capture = self.capture_body and scope["method"] in ("POST", "PUT")
+
+        async def receive_wrapper():
+            nonlocal body_size
+            message = await receive()
+            if capture and message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                body_size += len(chunk)
+                remaining = self.body_max_bytes - len(body)
+                if remaining > 0:
+                    body.extend(chunk[:remaining])
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper if capture else receive, send_wrapper)
+        finally:
+            rate = self.error_sample_rate if status >= 400 else self.sample_rate
+            if rate >= 1.0 or random.random() < rate:
+                client = scope.get("client")
+                record = {
+                    "ts": time.time(),
+                    "level": "info" if status < 400 else "warning" if status < 500 else "error",
+                    "message": "request",
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": scope.get("query_string", b"").decode("latin-1"),
+                    "status": status,
+                    "duration_ms": round((time.perf_counter_ns() - start) / 1e6, 3),
+                    "client": client[0] if client else None,
+                }
+                if capture:
+                    record["body"] = body.decode("utf-8", errors="replace")
+                    record["body_bytes"] = body_size
+                    record["body_truncated"] = body_size > len(body)
+                self.writer.write(record)
+
+
+def writer_from_env():
+    log_file = os.environ.get("LOG_FILE")
+    stream = open(log_file, "a", encoding="utf-8") if log_file else None
+    return JsonLogWriter(stream=stream, queue_size=int(os.environ.get("LOG_QUEUE_SIZE", 10000)))
+
+
+def middleware_options_from_env():
+    return {
+        "sample_rate": float(os.environ.get("LOG_SAMPLE_RATE", 1.0)),
+        "error_sample_rate": float(os.environ.get("LOG_ERROR_SAMPLE_RATE", 1.0)),
+        "capture_body": os.environ.get("LOG_BODIES", "1") != "0",
+        "body_max_bytes": int(os.environ.get("LOG_BODY_MAX_BYTES", 1024)),
+    }
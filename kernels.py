@@ -0,0 +1,391 @@
+"""Kernels vectorizados (NumPy) para los cuatro métodos de valuación.
+
+Cada kernel recibe columnas (arrays) y devuelve arrays del mismo tamaño,
+replicando fila a fila los endpoints de ``main.py``:
+
+- El modelo de entrada de cada fila se elige con las mismas cadenas de
+  ``schemas`` que usan los endpoints (``schemas.select_candidate``), según
+  qué campos llegaron y cuáles no validan. De ese modelo salen los valores
+  por defecto y la prioridad entre ``revenue`` e ``initial_cash_flow``.
+- Las fórmulas son las de ``engine`` aplicadas a columnas completas.
+
+Las filas inválidas no interrumpen el cálculo: se marcan en un array de
+errores.
+"""
+import functools
+
+import numpy as np
+from pydantic import TypeAdapter, ValidationError
+
+import engine
+import schemas
+
+# Valor por defecto de investment_required cuando el modelo no tiene ese campo
+DEFAULT_INVESTMENT_REQUIRED = 500000
+
+# Columnas numéricas aceptadas por los kernels
+COLUMNS = (
+    "revenue",
+    "initial_cash_flow",
+    "growth_rate",
+    "investment_required",
+    "discount_rate",
+    "terminal_growth_rate",
+    "projection_years",
+)
+# Campos que deciden el modelo de entrada: las columnas numéricas y el nombre
+FIELDS = COLUMNS + ("name",)
+FIELD_BITS = {field: 1 << i for i, field in enumerate(FIELDS)}
+
+# Valor crudo de un campo recibido que no valida (p. ej. un null explícito)
+INVALID = object()
+
+ERROR_REVENUE = engine.ERROR_REVENUE
+ERROR_CASH_FLOW = engine.ERROR_CASH_FLOW
+ERROR_GROWTH = engine.ERROR_GROWTH
+ERROR_NOT_FINITE = engine.ERROR_NOT_FINITE
+ERROR_INPUT = engine.ERROR_INPUT
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _is_float(value):
+    # Como en Pydantic, "nan" e "inf" (y sus valores) son floats válidos
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+_INT = TypeAdapter(int)
+
+
+def _is_int(value):
+    # El validador int de Pydantic: "5" y "5.0" validan, "1e3" y "5.5" no
+    try:
+        _INT.validate_python(value)
+    except ValidationError:
+        return False
+    return True
+
+
+def _integral(values, column):
+    """Filas cuyo valor valida como ``int`` de Pydantic (modo lax).
+
+    Un float valida si es entero y cabe en 64 bits; un int de Python
+    siempre. Los demás tipos (textos) pasan por el mismo validador que el
+    endpoint, porque ``float()`` acepta formatos que un int rechaza.
+    """
+    with np.errstate(invalid="ignore"):
+        valid = np.isfinite(column) & (column == np.trunc(column)) & (np.abs(column) < 2.0**63)
+    if isinstance(values, np.ndarray):
+        return valid
+    if not isinstance(values, (list, tuple)):
+        valid[:] = _integral([values], column[:1])[0] if len(column) else True
+        return valid
+    for i, value in enumerate(values):
+        kind = type(value)
+        if kind is int or kind is bool:
+            valid[i] = True
+        elif kind is not float and value is not None:
+            valid[i] = _is_int(value)
+    return valid
+
+
+def as_column(values, size, numeric=True):
+    """Convierte una lista, un array o un escalar en columnas de tamaño fijo.
+
+    Devuelve (valores float64, presente, inválido). None es un valor
+    ausente; ``INVALID`` y los valores no numéricos están presentes pero no
+    validan; un NaN o infinito recibido en una lista valida, como en los
+    endpoints. En los arrays NumPy numéricos (columnas mapeadas en memoria)
+    los NaN son valores ausentes. Con ``numeric=False`` (el nombre) solo
+    valida un texto.
+    """
+    if values is None:
+        return np.full(size, np.nan), np.zeros(size, dtype=bool), np.zeros(size, dtype=bool)
+    if isinstance(values, np.ndarray):
+        if values.shape != (size,):
+            raise ValueError(f"Todas las columnas deben tener {size} elementos")
+        if not numeric:
+            present = values != values.dtype.type()
+            return np.full(size, np.nan), present, np.zeros(size, dtype=bool)
+        # Siempre una copia en float64
+        column = np.array(values, dtype=np.float64)
+        return column, ~np.isnan(column), np.zeros(size, dtype=bool)
+    if not isinstance(values, (list, tuple)):
+        values = [values] * size
+    elif len(values) != size:
+        raise ValueError(f"Todas las columnas deben tener {size} elementos")
+    present = np.array([v is not None for v in values], dtype=bool)
+    if not numeric:
+        invalid = present & ~np.array([isinstance(v, str) for v in values], dtype=bool)
+        return np.full(size, np.nan), present, invalid
+    column = np.array([_to_float(v) for v in values], dtype=np.float64)
+    invalid = present & np.isnan(column)
+    # Solo las filas con NaN (pocas) se revisan una por una
+    for i in np.flatnonzero(invalid).tolist():
+        invalid[i] = not _is_float(values[i])
+    return column, present, invalid
+
+
+def build_columns(raw_columns, size):
+    """Columnas para los kernels a partir de columnas crudas de ``FIELDS``.
+
+    Además de una columna float64 por campo numérico (NaN donde no hay un
+    valor válido) incluye dos máscaras de bits por fila con los campos de
+    ``FIELD_BITS`` que llegaron ("present") y los que no validan
+    ("invalid"). Los valores por defecto los pone el modelo de entrada.
+    """
+    columns = {}
+    present = np.zeros(size, dtype=np.int32)
+    invalid = np.zeros(size, dtype=np.int32)
+    for field, bit in FIELD_BITS.items():
+        column, has, bad = as_column(raw_columns.get(field), size, numeric=field != "name")
+        if field == "projection_years":
+            # Como en Pydantic, un entero no acepta decimales
+            bad |= has & ~_integral(raw_columns.get(field), column)
+        if field != "name":
+            columns[field] = column
+        present[has] |= bit
+        invalid[bad] |= bit
+    columns["present"] = present
+    columns["invalid"] = invalid
+    return columns
+
+
+def set_column(columns, field, values):
+    """Reemplaza una columna por valores válidos (grillas de sensibilidad, solver)."""
+    bit = FIELD_BITS[field]
+    columns[field] = values
+    columns["present"] = columns["present"] | bit
+    columns["invalid"] = columns["invalid"] & ~bit
+
+
+def _row_value(row, field):
+    value = row.get(field)
+    # En los endpoints un null explícito no valida como número ni como texto
+    if value is None and field in row:
+        return INVALID
+    return value
+
+
+def rows_to_columns(rows):
+    """Columnas crudas de filas con el formato de los endpoints individuales."""
+    return {field: [_row_value(row, field) for row in rows] for field in FIELDS}
+
+
+def payload_to_columns(payload):
+    """Columnas crudas (escalares) de un único cuerpo, para repetirlo en todas las filas."""
+    return {field: _row_value(payload, field) for field in FIELDS if field in payload}
+
+
+@functools.lru_cache(maxsize=1024)
+def _candidate(method, pattern):
+    keys = frozenset(field for field, bit in FIELD_BITS.items() if pattern & bit)
+    invalid = frozenset(field for field, bit in FIELD_BITS.items() if pattern >> len(FIELDS) & bit)
+    return schemas.select_candidate(method, keys, invalid)
+
+
+def _by_pattern(patterns, mapping, dtype):
+    """Array por fila con el valor que ``mapping`` asigna a la combinación de campos de la fila."""
+    if len(set(mapping.values())) == 1:
+        # Valor único: una vista de solo lectura, sin reservar memoria por fila
+        return np.broadcast_to(np.array(next(iter(mapping.values())), dtype=dtype), patterns.shape)
+    lookup = np.zeros(1 << (2 * len(FIELDS)), dtype=dtype)
+    lookup[list(mapping)] = list(mapping.values())
+    return lookup[patterns]
+
+
+def resolve_inputs(columns, method, needed=COLUMNS):
+    """Valores de entrada de cada fila en el modelo que elegiría el endpoint de ``method``.
+
+    Cada combinación de campos presentes e inválidos que aparece (suelen
+    ser pocas) toma su candidato de ``schemas.select_candidate``; las
+    decisiones se toman por combinación y solo se llevan a las filas con
+    una tabla indexada cuando las combinaciones no coinciden. Devuelve
+    (values, fields, selected) para las columnas de ``needed``:
+    ``values[col]`` es el valor del campo en el modelo (recibido o por
+    defecto; NaN si el modelo no lo tiene), ``fields[col]`` indica si el
+    modelo tiene ese campo y ``selected`` es False en las filas que ningún
+    modelo valida. Los arrays pueden ser vistas de solo lectura.
+    """
+    patterns = columns["present"] | (columns["invalid"] << len(FIELDS))
+    chosen = {
+        pattern: _candidate(method, pattern)
+        for pattern in np.flatnonzero(np.bincount(patterns)).tolist()
+    }
+    if not chosen:
+        empty = np.zeros(0)
+        return {col: empty for col in needed}, {col: empty.astype(bool) for col in needed}, empty.astype(bool)
+
+    values = {}
+    fields = {}
+    for col in needed:
+        has = {}
+        from_data = {}
+        default = {}
+        for pattern, candidate in chosen.items():
+            field = candidate and candidate[0].model_fields.get(col)
+            has[pattern] = bool(field)
+            from_data[pattern] = bool(field) and candidate[1] and bool(pattern & FIELD_BITS[col])
+            default[pattern] = field.default if field and not field.is_required() and field.default is not None else np.nan
+        fields[col] = _by_pattern(patterns, has, bool)
+        if all(from_data.values()):
+            values[col] = columns[col]
+        elif not any(from_data.values()):
+            values[col] = _by_pattern(patterns, default, np.float64)
+        else:
+            values[col] = np.where(
+                _by_pattern(patterns, from_data, bool), columns[col], _by_pattern(patterns, default, np.float64)
+            )
+    selected = _by_pattern(patterns, {pattern: candidate is not None for pattern, candidate in chosen.items()}, bool)
+    return values, fields, selected
+
+
+# Columnas que leen VC, Berkus y First Chicago
+STARTUP_COLUMNS = ("revenue", "initial_cash_flow", "growth_rate", "investment_required")
+
+
+def _startup_inputs(values, fields):
+    """Ingresos, crecimiento normalizado e inversión requerida, como ``main._startup_inputs``."""
+    # Los modelos sin revenue (DCFData) usan initial_cash_flow como ingresos
+    revenue = np.where(fields["revenue"], values["revenue"], values["initial_cash_flow"])
+    growth_rate = engine.normalize_rate(values["growth_rate"])
+    investment_required = np.where(
+        fields["investment_required"], values["investment_required"], DEFAULT_INVESTMENT_REQUIRED
+    )
+    return revenue, growth_rate, investment_required
+
+
+def _base_errors(size):
+    return np.full(size, None, dtype=object)
+
+
+def _selection_errors(columns, selected, errors):
+    """Marca las filas sin modelo de entrada válido; este error tiene prioridad sobre los demás."""
+    bit = FIELD_BITS["growth_rate"]
+    growth_ok = ((columns["present"] & bit) != 0) & ((columns["invalid"] & bit) == 0)
+    rows = ~selected
+    errors[rows] = np.where(growth_ok[rows], ERROR_INPUT, ERROR_GROWTH)
+
+
+def _not_finite_errors(errors, *results):
+    """Marca las filas sin otro error cuyo resultado no es finito, como ``main._not_finite``."""
+    finite = np.ones(errors.shape, dtype=bool)
+    for values in results:
+        finite &= np.isfinite(values)
+    errors[(errors == None) & ~finite] = ERROR_NOT_FINITE  # noqa: E711
+
+
+def vc_kernel(columns):
+    """Método VC vectorizado. Devuelve (valuation, errors)."""
+    values, fields, selected = resolve_inputs(columns, "vc_method", STARTUP_COLUMNS)
+    revenue, growth_rate, _ = _startup_inputs(values, fields)
+
+    errors = _base_errors(revenue.size)
+    errors[~(revenue > 0)] = ERROR_REVENUE
+    _selection_errors(columns, selected, errors)
+
+    with np.errstate(all="ignore"):
+        valuation = engine.vc_valuation(revenue, growth_rate)
+
+    _not_finite_errors(errors, valuation)
+    return np.where(errors == None, valuation, 0.0), errors  # noqa: E711
+
+
+def dcf_kernel(columns):
+    """Método DCF vectorizado. Devuelve (valuation, errors).
+
+    Las filas cuyo modelo es StartupData usan la tasa de descuento ajustada
+    al riesgo y 5 años de proyección; el resto (DCFData y sus valores por
+    defecto) usa el modelo DCFData con conversión de porcentajes.
+    """
+    values, fields, selected = resolve_inputs(columns, "dcf")
+    initial_cash_flow = values["initial_cash_flow"]
+    revenue = values["revenue"]
+    raw_growth = values["growth_rate"]
+    size = raw_growth.size
+    startup = selected & fields["revenue"] & ~fields["initial_cash_flow"]
+    is_dcf = selected & ~startup
+
+    errors = _base_errors(size)
+    errors[is_dcf & ~(initial_cash_flow > 0)] = ERROR_CASH_FLOW
+    errors[startup & ~(revenue > 0)] = ERROR_REVENUE
+    _selection_errors(columns, selected, errors)
+
+    valuation = np.zeros(size, dtype=np.float64)
+
+    with np.errstate(all="ignore"):
+        # Modelo StartupData (el crecimiento se usa tal cual, como en dcf_method)
+        if startup.any():
+            valuation[startup] = engine.dcf_startup_valuation(revenue[startup], raw_growth[startup])
+
+        # Modelo DCFData
+        if is_dcf.any():
+            g, discount_rate, terminal_growth_rate = engine.dcf_rates(
+                raw_growth[is_dcf], values["discount_rate"][is_dcf], values["terminal_growth_rate"][is_dcf]
+            )
+            projection_years = values["projection_years"][is_dcf].astype(np.int64)
+            valuation[is_dcf] = engine.dcf_closed_form(
+                initial_cash_flow[is_dcf], g, discount_rate, terminal_growth_rate, projection_years
+            )
+
+    _not_finite_errors(errors, valuation)
+    return np.where(errors == None, valuation, 0.0), errors  # noqa: E711
+
+
+def berkus_kernel(columns):
+    """Método Berkus vectorizado. Devuelve (valuation, errors)."""
+    values, fields, selected = resolve_inputs(columns, "berkus", STARTUP_COLUMNS)
+    revenue, growth_rate, investment_required = _startup_inputs(values, fields)
+
+    errors = _base_errors(revenue.size)
+    errors[~(revenue > 0)] = ERROR_REVENUE
+    _selection_errors(columns, selected, errors)
+
+    with np.errstate(all="ignore"):
+        valuation = engine.berkus_valuation(revenue, growth_rate, investment_required)
+
+    _not_finite_errors(errors, valuation)
+    return np.where(errors == None, valuation, 0.0), errors  # noqa: E711
+
+
+def first_chicago_kernel(columns):
+    """Método First Chicago vectorizado.
+
+    Devuelve (valuation, errors, scenarios) donde ``scenarios`` mapea
+    success/base/failure a un par (probability, valuation) de arrays.
+    """
+    values, fields, selected = resolve_inputs(columns, "first_chicago", STARTUP_COLUMNS)
+    revenue, growth_rate, investment_required = _startup_inputs(values, fields)
+
+    errors = _base_errors(revenue.size)
+    errors[~(revenue > 0)] = ERROR_REVENUE
+    _selection_errors(columns, selected, errors)
+
+    with np.errstate(all="ignore"):
+        valuation, scenarios = engine.first_chicago_valuation(revenue, growth_rate, investment_required)
+
+    _not_finite_errors(errors, valuation, *(values for pair in scenarios.values() for values in pair))
+    ok = errors == None  # noqa: E711
+    scenarios = {
+        name: (np.where(ok, probability, 0.0), np.where(ok, values, 0.0))
+        for name, (probability, values) in scenarios.items()
+    }
+    return np.where(ok, valuation, 0.0), errors, scenarios
+
+
+# Kernel de cada método; todos devuelven (valuation, errors, ...)
+METHODS = {
+    "vc_method": vc_kernel,
+    "dcf": dcf_kernel,
+    "berkus": berkus_kernel,
+    "first_chicago": first_chicago_kernel,
+}
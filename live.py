@@ -0,0 +1,149 @@
+"""Canal WebSocket de recálculo en vivo.
+
+Cada conexión es una sesión que guarda los últimos datos de entrada ya
+validados. El cliente envía solo los campos que cambiaron y recibe las
+valuaciones recalculadas de los métodos elegidos:
+
+- Solo se validan los campos recibidos (``schemas.validate_fields``); los
+  modelos se construyen con ``schemas.construct_input`` sin revalidar.
+- Las actualizaciones se aplican apenas llegan, pero el cálculo corre en
+  otra tarea: si llegan varias mientras se calcula, la siguiente vuelta
+  calcula una sola vez el estado más reciente.
+
+Mensajes del cliente (JSON):
+
+- ``{"type": "update", "seq": 3, "data": {"revenue": 1200000}}`` (un valor
+  ``null`` quita el campo)
+- ``{"type": "configure", "methods": ["dcf", "berkus"], "weights": {...}}``
+- ``{"type": "reset"}``
+
+Mensajes del servidor: ``ready`` al conectar, ``result`` con ``seq`` de
+la última actualización incluida, y ``error``.
+"""
+import asyncio
+import json
+import os
+import uuid
+
+from starlette.concurrency import run_in_threadpool
+from starlette.websockets import WebSocketDisconnect
+
+import metrics
+import schemas
+import serialization
+
+# Espera opcional antes de calcular, para juntar ráfagas de actualizaciones
+COALESCE_MS = int(os.environ.get("LIVE_COALESCE_MS", 0))
+
+
+class LiveSession:
+    def __init__(self, methods, weights):
+        self.id = uuid.uuid4().hex
+        self.values = {}
+        self.methods = list(methods)
+        self.weights = dict(weights)
+        self.seq = None
+        self.dirty = asyncio.Event()
+
+    def apply(self, changes):
+        """Valida y guarda los campos cambiados. Devuelve los errores por campo."""
+        valid, errors = schemas.validate_fields(changes)
+        for name, value in valid.items():
+            if value is None:
+                self.values.pop(name, None)
+            else:
+                self.values[name] = value
+        if valid:
+            self.dirty.set()
+        return errors
+
+    def snapshot(self):
+        return dict(self.values), list(self.methods), dict(self.weights), self.seq
+
+
+async def serve(websocket, session, compute, available_methods):
+    """Atiende una sesión hasta que el cliente se desconecta.
+
+    ``compute(values, methods, weights)`` devuelve el dict con los
+    resultados; corre en el threadpool.
+    """
+    send_lock = asyncio.Lock()
+
+    async def send(message):
+        async with send_lock:
+            await websocket.send_text(serialization.DEFAULT_CODEC.dumps(message).decode("utf-8"))
+
+    await websocket.accept()
+    metrics.inc("valuation_live_sessions_total", ())
+    await send({"type": "ready", "session": session.id, "methods": session.methods})
+    recalculate = asyncio.create_task(_recalculate(session, compute, send))
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+                if not isinstance(message, dict):
+                    raise ValueError
+            except ValueError:
+                await send({"type": "error", "error": "Mensaje inválido: se esperaba un objeto JSON"})
+                continue
+
+            kind = message.get("type", "update")
+            if kind == "update":
+                metrics.inc("valuation_live_updates_total", ())
+                data = message.get("data")
+                if not isinstance(data, dict):
+                    await send({"type": "error", "seq": message.get("seq"), "error": "data debe ser un objeto"})
+                    continue
+                session.seq = message.get("seq", session.seq)
+                errors = session.apply(data)
+                if errors:
+                    await send({"type": "error", "seq": session.seq, "errors": errors})
+            elif kind == "configure":
+                methods = message.get("methods", session.methods)
+                weights = message.get("weights") or {}
+                if not isinstance(methods, list) or not all(isinstance(m, str) for m in methods):
+                    await send({"type": "error", "error": "methods debe ser una lista de nombres de método"})
+                    continue
+                if not isinstance(weights, dict):
+                    await send({"type": "error", "error": "weights debe ser un objeto {método: peso}"})
+                    continue
+                unknown = [m for m in list(methods) + list(weights) if m not in available_methods]
+                if unknown:
+                    await send({"type": "error", "error": f"Métodos no soportados: {unknown}", "available_methods": list(available_methods)})
+                    continue
+                if not all(isinstance(w, (int, float)) and w >= 0 for w in weights.values()):
+                    await send({"type": "error", "error": "Los pesos deben ser números no negativos"})
+                    continue
+                session.methods = list(methods)
+                session.weights.update(weights)
+                session.dirty.set()
+            elif kind == "reset":
+                session.values.clear()
+                session.seq = message.get("seq")
+                session.dirty.set()
+            else:
+                await send({"type": "error", "error": f"Tipo de mensaje no soportado: {kind}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        recalculate.cancel()
+
+
+async def _recalculate(session, compute, send):
+    while True:
+        await session.dirty.wait()
+        if COALESCE_MS:
+            await asyncio.sleep(COALESCE_MS / 1000)
+        else:
+            # Dejar que se apliquen los mensajes que ya llegaron
+            await asyncio.sleep(0)
+        session.dirty.clear()
+        values, methods, weights, seq = session.snapshot()
+        metrics.inc("valuation_live_recalculations_total", ())
+        try:
+            output = await run_in_threadpool(compute, values, methods, weights)
+        except Exception as e:
+            await send({"type": "error", "seq": seq, "error": f"Error al calcular: {str(e)}"})
+            continue
+        await send({"type": "result", "seq": seq, **output})
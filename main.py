@@ -1,15 +1,49 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import uvicorn
+from pydantic import BaseModel, ValidationError
+from typing import Literal
+from datetime import datetime, timezone
+from anyio import to_thread
+import numpy as np
+import asyncio
+import platform
+import sys
+import math
 import os
 
+import admission
+import bulk
+import cache
+import engine
+import history
+import jobs
+import jsonlog
+import kernels
+import live
+import metrics
+import montecarlo
+import schemas
+import serialization
+import solver
+import static
+from schemas import StartupData, DCFData, VCData
+
 # Crear la API
 app = FastAPI(
     title="Startup Valuation API",
     description="API for valuing startups using different methods",
     version="1.0.0"
 )
+# Respuestas serializadas con orjson (o MessagePack según Accept), sin jsonable_encoder
+app.router.route_class = serialization.NegotiatedRoute
+
+# Caché de resultados compartida por los cuatro métodos de valuación
+result_cache = cache.from_env()
+
+# Historial de valuaciones (opcional, escrito en lotes en segundo plano desde el arranque)
+valuation_history = history.from_env()
 
 # Configurar CORS para permitir solicitudes desde orígenes específicos
 origins = [
@@ -24,6 +58,10 @@ origins = [
 # Dado que permitimos todos los orígenes, no podemos usar credentials
 allow_creds = False
 
+# Control de admisión: límites por clase de ruta y por cliente (antes de CORS, así los 429/503 llevan sus encabezados)
+admission_control = admission.from_env()
+app.add_middleware(admission.AdmissionMiddleware, controller=admission_control)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -33,492 +71,1032 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
-# Añadir middleware para logging de peticiones
-@app.middleware("http")
-async def log_requests(request, call_next):
-    import time
-    start_time = time.time()
-
-    # Log request details
-    print(f"Request: {request.method} {request.url}")
-    if request.method in ["POST", "PUT"]:
-        try:
-            body = await request.body()
-            print(f"Request body: {body.decode()}")
-        except Exception as e:
-            print(f"Could not log request body: {e}")
-
-    response = await call_next(request)
-
-    # Log response details
-    process_time = time.time() - start_time
-    print(f"Response status: {response.status_code}")
-    print(f"Process time: {process_time:.4f} seconds")
-
-    return response
+# Logging estructurado de peticiones (JSON lines, escrito en segundo plano)
+request_log = jsonlog.writer_from_env()
+app.add_middleware(jsonlog.RequestLogMiddleware, writer=request_log, **jsonlog.middleware_options_from_env())
+
+# Métricas Prometheus (contadores por hilo, sin locks en cada petición)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Hilos para los endpoints síncronos (AnyIO usa 40 por defecto)
+THREADPOOL_SIZE = int(os.environ.get("THREADPOOL_SIZE", 0))
+
+@app.on_event("startup")
+async def configure_threadpool():
+    if THREADPOOL_SIZE > 0:
+        to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+@app.on_event("startup")
+def start_writers():
+    # Los hilos de escritura se crean en cada worker, después del fork de server.py
+    request_log.start()
+    valuation_history.start()
+
+@app.on_event("shutdown")
+def close_request_log():
+    request_log.close()
+
+@app.on_event("shutdown")
+def close_valuation_history():
+    valuation_history.close()
+
+# Respuestas de /, /status y la parte fija de /diagnostico: se serializan una sola vez
+root_body = static.StaticBody(static.json_bytes({
+    "message": "Welcome to the Startup Valuation API",
+    "endpoints": {
+        "VC Method": "/valuate/vc_method/",
+        "DCF Method": "/valuate/dcf/",
+        "Berkus Method": "/valuate/berkus/",
+        "First Chicago Method": "/valuate/first_chicago/",
+        "Batch": "/valuate/batch/",
+        "Monte Carlo": "/valuate/monte-carlo/",
+        "Sensitivity": "/valuate/sensitivity/",
+        "Solve": "/valuate/solve/",
+        "Bulk": "/valuate/bulk/",
+        "All Methods": "/valuate/all/",
+        "Live": "/ws/valuate",
+        "History": "/history/",
+        "Jobs": "/jobs/"
+    }
+}), "application/json")
+
+status_body = static.StaticBody(static.json_bytes(
+    {"status": "online", "message": "API funcionando correctamente"}
+), "application/json")
+
+# Sin las llaves de cierre: los contadores se agregan en cada petición
+diagnostico_static = static.json_bytes({
+    "status": "online",
+    "version": app.version,
+    "python_version": sys.version,
+    "sistema_operativo": platform.system(),
+    "endpoints_disponibles": {
+        "root": "/",
+        "status": "/status",
+        "test_client": "/test",
+        "metrics": "/metrics",
+        "vc_method": ["/valuate/vc_method/", "/valuate/vc-method/"],
+        "dcf_method": ["/valuate/dcf/", "/valuate/dcf-method/"],
+        "berkus_method": ["/valuate/berkus/", "/valuate/berkus-method/"],
+        "first_chicago_method": ["/valuate/first_chicago/", "/valuate/first-chicago/"],
+        "batch": "/valuate/batch/",
+        "monte_carlo": "/valuate/monte-carlo/",
+        "sensitivity": "/valuate/sensitivity/",
+        "solve": "/valuate/solve/",
+        "bulk": "/valuate/bulk/",
+        "all_methods": "/valuate/all/",
+        "live": "/ws/valuate",
+        "history": ["/history/", "/history/aggregates"],
+        "jobs": ["/jobs/", "/jobs/{job_id}", "/jobs/{job_id}/result"]
+    },
+    "cors": {
+        "origins": origins,
+        "allow_credentials": True,
+        "allow_methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    }
+})[1:-1]
 
 @app.get("/")
 @app.head("/")
-def read_root():
-    return {
-        "message": "Welcome to the Startup Valuation API",
-        "endpoints": {
-            "VC Method": "/valuate/vc_method/",
-            "DCF Method": "/valuate/dcf/",
-            "Berkus Method": "/valuate/berkus/",
-            "First Chicago Method": "/valuate/first_chicago/"
-        }
-    }
+def read_root(request: Request):
+    return root_body.response(request)
 
+# Asíncrono: responde aunque el threadpool esté ocupado
 @app.get("/status")
 @app.head("/status")
-def check_status():
-    return {"status": "online", "message": "API funcionando correctamente"}
+async def check_status(request: Request):
+    return status_body.response(request)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Métricas en formato de texto de Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/diagnostico")
 def diagnostico():
     """Endpoint para verificar el estado completo de la API"""
-    import sys
-    import platform
-
-    # Información de configuración
-    cors_origins = app.user_middleware[0].options.get("allow_origins", [])
-
-    return {
-        "status": "online",
-        "version": app.version,
-        "python_version": sys.version,
-        "sistema_operativo": platform.system(),
-        "endpoints_disponibles": {
-            "root": "/",
-            "status": "/status",
-            "test_client": "/test",
-            "vc_method": ["/valuate/vc_method/", "/valuate/vc-method/"],
-            "dcf_method": ["/valuate/dcf/", "/valuate/dcf-method/"],
-            "berkus_method": ["/valuate/berkus/", "/valuate/berkus-method/"],
-            "first_chicago_method": ["/valuate/first_chicago/", "/valuate/first-chicago/"]
-        },
-        "cors": {
-            "origins": cors_origins,
-            "allow_credentials": True,
-            "allow_methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        }
-    }
-
-# Modelo de datos que ingresará el usuario
-class StartupData(BaseModel):
-    name: str
-    revenue: float
-    growth_rate: float
-    investment_required: float
-
-# Modelo específico para DCF
-class DCFData(BaseModel):
-    initial_cash_flow: float
-    growth_rate: float
-    discount_rate: float = 0.15
-    terminal_growth_rate: float = 0.03
-    projection_years: int = 5
-
-# Modelo específico para VC Method
-class VCData(BaseModel):
-    name: str = "Startup X"
-    revenue: float
-    growth_rate: float 
-    investment_required: float = 500000
-    # Campos opcionales para compatibilidad con el formato DCF
-    initial_cash_flow: float = None
-    discount_rate: float = None
-    terminal_growth_rate: float = None
-    projection_years: int = None
+    counters = static.json_bytes({
+        "admission": admission_control.stats(),
+        "cache": result_cache.stats(),
+        "history": valuation_history.stats(),
+        "jobs": job_manager.stats(),
+        "logging": request_log.stats(),
+    })
+    return Response(b"{" + diagnostico_static + b"," + counters[1:], media_type="application/json")
+
+# Límite de años para la tabla anual opcional del DCF (la valuación no tiene límite)
+MAX_SCHEDULE_YEARS = int(os.environ.get("MAX_SCHEDULE_YEARS", 1000))
+
+def _startup_inputs(data, shared=None):
+    """Ingresos, crecimiento normalizado e inversión requerida del modelo de entrada.
+
+    Los usan VC, Berkus y First Chicago; con ``shared`` (el dict de la
+    petición) se calculan una sola vez por modelo cuando /valuate/all/
+    corre varios métodos. Se guardan por clase de modelo junto con el
+    modelo mismo: solo se reutilizan para ese mismo objeto.
+    """
+    by_model = None
+    if shared is not None:
+        by_model = shared.setdefault("startup_inputs", {})
+        cached = by_model.get(type(data))
+        if cached is not None and cached[0] is data:
+            return cached[1]
+
+    revenue = getattr(data, 'revenue', None)
+    if revenue is None and hasattr(data, 'initial_cash_flow'):
+        revenue = data.initial_cash_flow
+
+    growth_rate = getattr(data, 'growth_rate', 0.2)
+    # Si el crecimiento viene en porcentaje (20 en vez de 0.2)
+    if growth_rate > 1:
+        growth_rate = growth_rate / 100
+
+    inputs = (revenue, growth_rate, getattr(data, 'investment_required', 500000))
+    if by_model is not None:
+        by_model[type(data)] = (data, inputs)
+    return inputs
+
+def _not_finite(*values):
+    """Respuesta de error si algún resultado calculado no es finito (None si todos lo son).
+
+    Un NaN o infinito no se puede escribir en JSON; los kernels marcan las
+    mismas filas con el mismo error.
+    """
+    if all(math.isfinite(value) for value in values):
+        return None
+    return {"valuation": 0, "error": engine.ERROR_NOT_FINITE}
 
 # Método de valuación Venture Capital (VC Method)
 @app.post("/valuate/vc_method/")
 @app.post("/valuate/vc-method/")  # Ruta alternativa con guión para mayor compatibilidad
-def vc_method(data: dict | VCData | StartupData | DCFData):
+@metrics.count_errors
+def vc_method(data: dict):
+    return _vc_method(data)
+
+def _vc_method(data, shared=None):
     try:
-        # Si es un diccionario, convertirlo a un objeto
-        if isinstance(data, dict):
-            try:
-                # Intentar convertir a StartupData primero
-                data = StartupData(**data)
-            except Exception as e:
-                try:
-                    # Si falla, intentar con DCFData
-                    data = DCFData(**data)
-                except Exception as e2:
-                    # Si ambos fallan, usar VCData que tiene más campos opcionales
-                    data = VCData(**data)
+        # Elegir el modelo de entrada con una sola validación
+        data = schemas.parse_input("vc_method", data, shared)
 
         # Extraer los valores necesarios del modelo de datos
-        revenue = getattr(data, "revenue", None)
-        if revenue is None and hasattr(data, "initial_cash_flow"):
-            revenue = data.initial_cash_flow
-
-        growth_rate = getattr(data, "growth_rate", 0.2)
-        # Si el crecimiento viene en porcentaje (20 en vez de 0.2)
-        if growth_rate > 1:
-            growth_rate = growth_rate / 100
-
-        # Validación de datos
-        if revenue is None or revenue <= 0:
-            return {"valuation": 0, "error": "Los ingresos deben ser positivos"}
-
-        # Cálculo del valor de salida considerando el crecimiento
-        multiple = max(5, 10 + growth_rate * 10)  # Ajusta el múltiplo según el crecimiento
-        exit_value = revenue * multiple
-
-        # El retorno esperado por inversores varía según el riesgo
-        investor_return = max(3, 8 - growth_rate * 5)  # Menor crecimiento = mayor retorno requerido
-
-        valuation = exit_value / investor_return
-        return {"valuation": round(valuation, 2)}
+        revenue, growth_rate, _ = _startup_inputs(data, shared)
+
+        # Validación de datos (un NaN no es positivo, igual que en los kernels)
+        if revenue is None or not revenue > 0:
+            return {"valuation": 0, "error": engine.ERROR_REVENUE}
+
+        cache_key = ("vc_method", revenue, growth_rate)
+        inputs = {"revenue": revenue, "growth_rate": growth_rate}
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            valuation_history.record("vc_method", getattr(data, "name", None), inputs, cached)
+            return cached
+
+        valuation = engine.vc_valuation(revenue, growth_rate)
+        error = _not_finite(valuation)
+        if error is not None:
+            return error
+        result = {"valuation": round(valuation, 2)}
+        result_cache.set(cache_key, result)
+        valuation_history.record("vc_method", getattr(data, "name", None), inputs, result)
+        return result
     except Exception as e:
-        print(f"Error en el cálculo VC Method: {e}")
+        request_log.event("error", "Error en el cálculo VC Method", error=str(e))
         return {"valuation": 0, "error": f"Error al calcular: {str(e)}"}
 
 # Método de valuación Descuento de Flujos de Caja (DCF)
 @app.post("/valuate/dcf/")
 @app.post("/valuate/dcf-method/")  # Ruta alternativa con guión para mayor compatibilidad
-def dcf_method(data: dict | DCFData | StartupData):
-    print(f"DCF Method received data: {data}")
+@metrics.count_errors
+def dcf_method(data: dict):
+    return _dcf_method(data)
+
+def _dcf_method(data, shared=None):
+    schedule = None
+    schedule_error = None
     try:
-        # Si es un diccionario, convertirlo a un objeto tipo BaseModel
-        if isinstance(data, dict):
-            try:
-                # Intentar convertir a DCFData primero
-                if 'initial_cash_flow' in data:
-                    # Asegurarse de que todos los campos requeridos existan
-                    if 'terminal_growth_rate' not in data:
-                        data['terminal_growth_rate'] = 0.03
-                    if 'discount_rate' not in data:
-                        data['discount_rate'] = 0.15
-                    if 'projection_years' not in data:
-                        data['projection_years'] = 5
-                    data = DCFData(**data)
-                else:
-                    # Si no tiene initial_cash_flow, convertir a StartupData
-                    data = StartupData(**data)
-            except Exception as e:
-                # Si falla la conversión, intentar con StartupData como fallback
-                print(f"Error al convertir datos: {e}")
-                try:
-                    data = StartupData(**data)
-                except:
-                    # Crear un objeto DCFData mínimo si todo falla
-                    default_data = {
-                        'initial_cash_flow': 100000,
-                        'growth_rate': 0.2,
-                        'discount_rate': 0.15,
-                        'terminal_growth_rate': 0.03,
-                        'projection_years': 5
-                    }
-                    # Actualizar con los datos proporcionados si existen
-                    for key, value in data.items():
-                        if key in default_data:
-                            default_data[key] = value
-                    data = DCFData(**default_data)
+        # include_schedule es una opción de la respuesta, no un dato de entrada:
+        # no participa en la elección del modelo (igual que en los lotes)
+        include_schedule = False
+        if isinstance(data, dict) and "include_schedule" in data:
+            data = dict(data)
+            include_schedule = data.pop("include_schedule") is True
+
+        # Elegir el modelo de entrada con una sola validación
+        data = schemas.parse_input("dcf", data, shared)
 
         # Compatibilidad con ambos modelos
         if hasattr(data, 'revenue') and not hasattr(data, 'initial_cash_flow'):
             # Usar el modelo StartupData
-            if data.revenue <= 0:
-                return {"valuation": 0, "error": "Los ingresos deben ser positivos"}
-
-            # Tasa de descuento ajustada al riesgo
-            base_discount_rate = 0.1  # Base del 10%
-            risk_adjustment = min(0.2, max(0.05, 0.25 - data.growth_rate))  # Menor crecimiento = mayor riesgo
-            discount_rate = base_discount_rate + risk_adjustment
-
-            # Proyección de flujos por 5 años
-            total_value = 0
-            annual_revenue = data.revenue
-
-            for year in range(1, 6):
-                annual_revenue *= (1 + data.growth_rate)
-                # Asumiendo un margen operativo del 20%
-                cash_flow = annual_revenue * 0.2
-                # Valor presente del flujo
-                total_value += cash_flow / ((1 + discount_rate) ** year)
-
-            # Valor terminal (perpetuidad)
-            terminal_growth = min(0.03, data.growth_rate / 3)  # Crecimiento terminal conservador
-            terminal_value = (annual_revenue * 0.2 * (1 + terminal_growth)) / (discount_rate - terminal_growth)
-            terminal_value_discounted = terminal_value / ((1 + discount_rate) ** 5)
-
-            valuation = total_value + terminal_value_discounted
+            if not data.revenue > 0:
+                return {"valuation": 0, "error": engine.ERROR_REVENUE}
+
+            cache_key = ("dcf", "startup", data.revenue, data.growth_rate)
+            inputs = {"revenue": data.revenue, "growth_rate": data.growth_rate}
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                valuation_history.record("dcf", data.name, inputs, cached)
+                return cached
+
+            # Tasa de descuento ajustada al riesgo y proyección de flujos por 5 años
+            valuation = engine.dcf_startup_valuation(data.revenue, data.growth_rate)
         else:
             # Usar el modelo DCFData
             # Validación
-            if getattr(data, 'initial_cash_flow', 0) <= 0:
-                return {"valuation": 0, "error": "El flujo de caja inicial debe ser positivo"}
+            if not getattr(data, 'initial_cash_flow', 0) > 0:
+                return {"valuation": 0, "error": engine.ERROR_CASH_FLOW}
 
             # Asegurarse de que todos los campos necesarios están presentes
             initial_cash_flow = getattr(data, 'initial_cash_flow', 0)
-            growth_rate = getattr(data, 'growth_rate', 0.2)
-            discount_rate = getattr(data, 'discount_rate', 0.1)
-            terminal_growth_rate = getattr(data, 'terminal_growth_rate', 0.03)
             projection_years = getattr(data, 'projection_years', 5)
 
-            # Convertir porcentajes si es necesario (si vienen como 20 en lugar de 0.2)
-            growth_rate = growth_rate / 100 if growth_rate > 1 else growth_rate
-            discount_rate = discount_rate / 100 if discount_rate > 1 else discount_rate
-            terminal_growth_rate = terminal_growth_rate / 100 if terminal_growth_rate > 1 else terminal_growth_rate
-
-            # Evitar división por cero
-            if discount_rate <= terminal_growth_rate:
-                discount_rate = terminal_growth_rate + 0.01
-
-            # Cálculo del valor presente de los flujos futuros
-            total_value = 0
-            cash_flow = initial_cash_flow
-
-            for year in range(1, projection_years + 1):
-                cash_flow *= (1 + growth_rate)
-                # Valor presente del flujo
-                total_value += cash_flow / ((1 + discount_rate) ** year)
-
-            # Valor terminal (perpetuidad)
-            terminal_value = (cash_flow * (1 + terminal_growth_rate)) / (discount_rate - terminal_growth_rate)
-            terminal_value_discounted = terminal_value / ((1 + discount_rate) ** projection_years)
-
-            valuation = total_value + terminal_value_discounted
-
-        return {"valuation": round(valuation, 2)}
+            # Porcentajes a decimales (20 en lugar de 0.2) y descuento mayor que el crecimiento terminal
+            growth_rate, discount_rate, terminal_growth_rate = engine.dcf_rates(
+                getattr(data, 'growth_rate', 0.2),
+                getattr(data, 'discount_rate', 0.1),
+                getattr(data, 'terminal_growth_rate', 0.03),
+            )
+
+            cache_key = (
+                "dcf", initial_cash_flow, growth_rate, discount_rate, terminal_growth_rate,
+                projection_years, include_schedule
+            )
+            inputs = {
+                "initial_cash_flow": initial_cash_flow, "growth_rate": growth_rate, "discount_rate": discount_rate,
+                "terminal_growth_rate": terminal_growth_rate, "projection_years": projection_years,
+            }
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                valuation_history.record("dcf", getattr(data, "name", None), inputs, cached)
+                return cached
+
+            # Valor presente de los flujos futuros + valor terminal (perpetuidad)
+            valuation = engine.dcf_valuation(
+                initial_cash_flow, growth_rate, discount_rate, terminal_growth_rate, projection_years
+            )
+
+            if include_schedule:
+                if projection_years > MAX_SCHEDULE_YEARS:
+                    schedule_error = f"La tabla anual solo está disponible hasta {MAX_SCHEDULE_YEARS} años"
+                else:
+                    schedule = engine.dcf_schedule(initial_cash_flow, growth_rate, discount_rate, projection_years)
+
+        error = _not_finite(valuation)
+        if error is not None:
+            return error
+
+        result = {"valuation": round(valuation, 2)}
+        if schedule is not None:
+            result["schedule"] = schedule
+        if schedule_error is not None:
+            result["schedule_error"] = schedule_error
+        result_cache.set(cache_key, result)
+        valuation_history.record("dcf", getattr(data, "name", None), inputs, result)
+        return result
     except Exception as e:
-        print(f"Error en el cálculo DCF: {e}")
+        request_log.event("error", "Error en el cálculo DCF", error=str(e))
         return {"valuation": 0, "error": f"Error al calcular: {str(e)}"}
 
 # Método de valuación Berkus
 @app.post("/valuate/berkus/")
 @app.post("/valuate/berkus-method/")  # Ruta alternativa con guión para mayor compatibilidad
-def berkus_method(data: dict | StartupData | DCFData):
+@metrics.count_errors
+def berkus_method(data: dict):
+    return _berkus_method(data)
+
+def _berkus_method(data, shared=None):
     try:
-        # Si es un diccionario, convertirlo a StartupData o manejar DCFData
-        if isinstance(data, dict):
-            try:
-                # Intentar convertir a StartupData primero
-                data = StartupData(**data)
-            except Exception as e:
-                # Si falla, intentar con DCFData o crear objeto compatible
-                try:
-                    # Si tiene initial_cash_flow, tratar como DCFData
-                    if 'initial_cash_flow' in data:
-                        # Crear un objeto DCFData
-                        dcf_data = {}
-                        for key in ['initial_cash_flow', 'growth_rate', 'discount_rate', 'terminal_growth_rate', 'projection_years']:
-                            if key in data:
-                                dcf_data[key] = data[key]
-                        data = DCFData(**dcf_data)
-                    else:
-                        # Crear un objeto StartupData con valores por defecto
-                        startup_data = {
-                            'name': 'Startup X',
-                            'revenue': 1000000,
-                            'growth_rate': 0.2,
-                            'investment_required': 500000
-                        }
-                        # Actualizar con los datos proporcionados
-                        for key, value in data.items():
-                            if key in startup_data:
-                                startup_data[key] = value
-                        data = StartupData(**startup_data)
-                except Exception as e2:
-                    print(f"Error al convertir datos: {e2}")
-                    # Crear un objeto mínimo si todo falla
-                    data = StartupData(
-                        name="Startup X",
-                        revenue=1000000,
-                        growth_rate=0.2,
-                        investment_required=500000
-                    )
+        # Elegir el modelo de entrada con una sola validación
+        data = schemas.parse_input("berkus", data, shared)
 
         # Asegurarse de tener campos necesarios
-        revenue = getattr(data, 'revenue', None)
-        if revenue is None and hasattr(data, 'initial_cash_flow'):
-            revenue = data.initial_cash_flow
-
-        growth_rate = getattr(data, 'growth_rate', 0.2)
-        # Si el crecimiento viene en porcentaje (20 en vez de 0.2)
-        if growth_rate > 1:
-            growth_rate = growth_rate / 100
-
-        investment_required = getattr(data, 'investment_required', 500000)
+        revenue, growth_rate, investment_required = _startup_inputs(data, shared)
 
         # Validación
-        if revenue is None or revenue <= 0:
-            return {"valuation": 0, "error": "Los ingresos deben ser positivos"}
+        if revenue is None or not revenue > 0:
+            return {"valuation": 0, "error": engine.ERROR_REVENUE}
+
+        cache_key = ("berkus", revenue, growth_rate, investment_required)
+        inputs = {"revenue": revenue, "growth_rate": growth_rate, "investment_required": investment_required}
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            valuation_history.record("berkus", getattr(data, "name", None), inputs, cached)
+            return cached
+
+        # El método Berkus asigna valor basado en 5 aspectos clave (hasta 500,000 USD cada uno)
+        total_valuation = engine.berkus_valuation(revenue, growth_rate, investment_required)
+        error = _not_finite(total_valuation)
+        if error is not None:
+            return error
+        result = {"valuation": round(total_valuation, 2)}
+        result_cache.set(cache_key, result)
+        valuation_history.record("berkus", getattr(data, "name", None), inputs, result)
+        return result
+    except Exception as e:
+        request_log.event("error", "Error en el cálculo Berkus", error=str(e))
+        return {"valuation": 0, "error": f"Error al calcular: {str(e)}"}
 
-        # El método Berkus asigna valor basado en 5 aspectos clave
-        # Cada aspecto puede valer entre 0 y 500,000 USD
+# Método de valuación First Chicago
+@app.post("/valuate/first_chicago/")
+@app.post("/valuate/first-chicago/")  # Ruta alternativa con guión para mayor compatibilidad
+@metrics.count_errors
+def first_chicago_method(data: dict):
+    return _first_chicago_method(data)
 
-        # Valor base por idea/concepto
-        base_value = 500000
+def _first_chicago_method(data, shared=None):
+    try:
+        # Elegir el modelo de entrada con una sola validación
+        data = schemas.parse_input("first_chicago", data, shared)
 
-        # Calidad del equipo de gestión (aproximada por ingresos)
-        revenue_factor = min(1.0, revenue / 2000000)
-        management_value = 500000 * revenue_factor
+        # Asegurarse de tener campos necesarios
+        revenue, growth_rate, investment_required = _startup_inputs(data, shared)
 
-        # Calidad/avance del producto
-        product_factor = min(1.0, max(0.2, revenue / 1000000))
-        product_value = 500000 * product_factor
+        # Validación
+        if revenue is None or not revenue > 0:
+            return {"valuation": 0, "error": engine.ERROR_REVENUE}
 
-        # Tamaño/potencial del mercado
-        market_factor = min(1.0, max(0.1, growth_rate * 2))
-        market_value = 500000 * market_factor
+        cache_key = ("first_chicago", revenue, growth_rate, investment_required)
+        inputs = {"revenue": revenue, "growth_rate": growth_rate, "investment_required": investment_required}
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            valuation_history.record("first_chicago", getattr(data, "name", None), inputs, cached)
+            return cached
 
-        # Reducción del riesgo por competencia
-        competition_factor = min(1.0, max(0.1, 1 - (growth_rate / 2)))
-        competition_value = 500000 * competition_factor
+        # First Chicago considera múltiples escenarios (éxito, lateral, fracaso)
+        weighted_valuation, scenario_values = engine.first_chicago_valuation(revenue, growth_rate, investment_required)
+        error = _not_finite(weighted_valuation, *(value for pair in scenario_values.values() for value in pair))
+        if error is not None:
+            return error
 
-        # Riesgo financiero (basado en inversión requerida vs ingresos)
-        financial_ratio = min(1.0, max(0.1, revenue / max(1, investment_required)))
-        financial_value = 500000 * financial_ratio
+        # Detalles de cada escenario para mayor transparencia
+        scenarios = {
+            name: {"probability": round(probability, 2), "valuation": round(value, 2)}
+            for name, (probability, value) in scenario_values.items()
+        }
 
-        total_valuation = base_value + management_value + product_value + market_value + competition_value + financial_value
-        return {"valuation": round(total_valuation, 2)}
+        result = {
+            "valuation": round(weighted_valuation, 2),
+            "scenarios": scenarios
+        }
+        result_cache.set(cache_key, result)
+        valuation_history.record("first_chicago", getattr(data, "name", None), inputs, result)
+        return result
     except Exception as e:
-        print(f"Error en el cálculo Berkus: {e}")
+        request_log.event("error", "Error en el cálculo First Chicago", error=str(e))
         return {"valuation": 0, "error": f"Error al calcular: {str(e)}"}
 
-# Método de valuación First Chicago
-@app.post("/valuate/first_chicago/")
-@app.post("/valuate/first-chicago/")  # Ruta alternativa con guión para mayor compatibilidad
-def first_chicago_method(data: dict | StartupData | DCFData):
-    try:
-        # Si es un diccionario, convertirlo a StartupData o manejar DCFData
-        if isinstance(data, dict):
-            try:
-                # Intentar convertir a StartupData primero
-                data = StartupData(**data)
-            except Exception as e:
-                # Si falla, intentar con DCFData o crear objeto compatible
-                try:
-                    # Si tiene initial_cash_flow, tratar como DCFData
-                    if 'initial_cash_flow' in data:
-                        # Crear un objeto DCFData
-                        dcf_data = {}
-                        for key in ['initial_cash_flow', 'growth_rate', 'discount_rate', 'terminal_growth_rate', 'projection_years']:
-                            if key in data:
-                                dcf_data[key] = data[key]
-                        data = DCFData(**dcf_data)
-                    else:
-                        # Crear un objeto StartupData con valores por defecto
-                        startup_data = {
-                            'name': 'Startup X',
-                            'revenue': 1000000,
-                            'growth_rate': 0.2,
-                            'investment_required': 500000
-                        }
-                        # Actualizar con los datos proporcionados
-                        for key, value in data.items():
-                            if key in startup_data:
-                                startup_data[key] = value
-                        data = StartupData(**startup_data)
-                except Exception as e2:
-                    print(f"Error al convertir datos: {e2}")
-                    # Crear un objeto mínimo si todo falla
-                    data = StartupData(
-                        name="Startup X",
-                        revenue=1000000,
-                        growth_rate=0.2,
-                        investment_required=500000
-                    )
+# Valuación por lotes: muchas startups y varios métodos en una sola petición
+BATCH_METHODS = kernels.METHODS
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 100000))
 
-        # Asegurarse de tener campos necesarios
-        revenue = getattr(data, 'revenue', None)
-        if revenue is None and hasattr(data, 'initial_cash_flow'):
-            revenue = data.initial_cash_flow
+class BatchData(BaseModel):
+    methods: list[str] = list(BATCH_METHODS)
+    # Formato por filas: [{"revenue": ..., "growth_rate": ...}, ...]
+    rows: list[dict] | None = None
+    # Formato columnar: {"revenue": [...], "growth_rate": [...]}
+    columns: dict[str, list] | None = None
 
-        growth_rate = getattr(data, 'growth_rate', 0.2)
-        # Si el crecimiento viene en porcentaje (20 en vez de 0.2)
-        if growth_rate > 1:
-            growth_rate = growth_rate / 100
+def _round_list(values):
+    return [round(v, 2) for v in values.tolist()]
 
-        investment_required = getattr(data, 'investment_required', 500000)
+def _errors_list(errors):
+    return [{"index": int(i), "error": errors[i]} for i in np.flatnonzero(errors != None)]  # noqa: E711
 
-        # Validación
+@app.post("/valuate/batch/")
+@metrics.count_errors
+def batch_method(data: BatchData):
+    try:
+        unknown = [m for m in data.methods if m not in BATCH_METHODS]
+        if unknown:
+            return {"error": f"Métodos no soportados: {unknown}", "available_methods": list(BATCH_METHODS)}
+
+        if data.columns is not None:
+            raw_columns = data.columns
+            size = len(next(iter(raw_columns.values()), []))
+        else:
+            rows = data.rows or []
+            size = len(rows)
+            raw_columns = kernels.rows_to_columns(rows)
+
+        if size > MAX_BATCH_SIZE:
+            return {"error": f"El lote excede el máximo de {MAX_BATCH_SIZE} filas"}
+
+        columns = kernels.build_columns(raw_columns, size)
+
+        results = {}
+        for method in data.methods:
+            output = BATCH_METHODS[method](columns)
+            valuation, errors = output[0], output[1]
+            result = {"valuations": _round_list(valuation), "errors": _errors_list(errors)}
+            if method == "first_chicago":
+                result["scenarios"] = {
+                    name: {"probability": _round_list(probability), "valuation": _round_list(values)}
+                    for name, (probability, values) in output[2].items()
+                }
+            results[method] = result
+
+        return {"count": size, "results": results}
+    except Exception as e:
+        request_log.event("error", "Error en el cálculo por lotes", error=str(e))
+        return {"count": 0, "results": {}, "error": f"Error al calcular: {str(e)}"}
+
+# Valuación masiva en streaming: el cuerpo es un CSV o NDJSON, no un JSON
+MAX_BULK_CHUNK_SIZE = int(os.environ.get("MAX_BULK_CHUNK_SIZE", 50000))
+
+@app.post("/valuate/bulk/")
+async def bulk_method(
+    request: Request,
+    methods: str = ",".join(BATCH_METHODS),
+    input_format: str | None = None,
+    output_format: str = "ndjson",
+    chunk_size: int = 5000,
+):
+    method_list = [m.strip() for m in methods.split(",") if m.strip()]
+    unknown = [m for m in method_list if m not in BATCH_METHODS]
+    if unknown or not method_list:
+        return {"error": f"Métodos no soportados: {unknown}", "available_methods": list(BATCH_METHODS)}
+
+    input_format = input_format or bulk.detect_format(request.headers.get("content-type"))
+    if input_format not in bulk.INPUT_FORMATS:
+        return {"error": "Formato de entrada no soportado: usar text/csv o application/x-ndjson",
+                "available_formats": list(bulk.INPUT_FORMATS)}
+    if output_format not in bulk.OUTPUT_FORMATS:
+        return {"error": f"Formato de salida no soportado: {output_format}",
+                "available_formats": list(bulk.OUTPUT_FORMATS)}
+    if not 1 <= chunk_size <= MAX_BULK_CHUNK_SIZE:
+        return {"error": f"chunk_size debe estar entre 1 y {MAX_BULK_CHUNK_SIZE}"}
+
+    return bulk.BulkStreamingResponse(
+        bulk.score_stream(request.stream(), input_format, output_format, method_list, chunk_size),
+        media_type=bulk.OUTPUT_FORMATS[output_format],
+    )
+
+# Análisis de sensibilidad: grilla 2-D de valuaciones variando dos parámetros
+SENSITIVITY_PARAMS = {
+    "dcf": {"initial_cash_flow", "revenue", "growth_rate", "discount_rate", "terminal_growth_rate", "projection_years"},
+    "vc_method": {"revenue", "initial_cash_flow", "growth_rate"},
+}
+MAX_GRID_CELLS = int(os.environ.get("MAX_GRID_CELLS", 250000))
+
+class SensitivityAxis(BaseModel):
+    param: str
+    # Valores explícitos, o bien un rango lineal start..stop con steps puntos
+    values: list[float] | None = None
+    start: float | None = None
+    stop: float | None = None
+    steps: int = 11
+
+    def points(self):
+        if self.values is not None:
+            return np.array(self.values, dtype=np.float64)
+        if self.start is None or self.stop is None:
+            raise ValueError(f"{self.param}: indicar values o start/stop")
+        return np.linspace(self.start, self.stop, max(1, self.steps))
+
+class SensitivityData(BaseModel):
+    method: Literal["dcf", "vc_method"] = "dcf"
+    # Valores base del resto de parámetros (mismo formato que los endpoints individuales)
+    base: dict = {}
+    x: SensitivityAxis
+    y: SensitivityAxis
+
+@app.post("/valuate/sensitivity/")
+@metrics.count_errors
+def sensitivity_method(data: SensitivityData):
+    try:
+        allowed = SENSITIVITY_PARAMS[data.method]
+        for axis in (data.x, data.y):
+            if axis.param not in allowed:
+                return {"error": f"Parámetro no soportado para {data.method}: {axis.param}", "available_params": sorted(allowed)}
+        if data.x.param == data.y.param:
+            return {"error": "Los dos ejes deben variar parámetros distintos"}
+
+        x_values = data.x.points()
+        y_values = data.y.points()
+        if data.x.param == "projection_years":
+            x_values = np.trunc(x_values)
+        if data.y.param == "projection_years":
+            y_values = np.trunc(y_values)
+        shape = (x_values.size, y_values.size)
+        if x_values.size * y_values.size > MAX_GRID_CELLS:
+            return {"error": f"La grilla excede el máximo de {MAX_GRID_CELLS} celdas"}
+
+        # Se evalúa la grilla completa de una vez: cada celda es una fila para el kernel
+        size = x_values.size * y_values.size
+        columns = kernels.build_columns(kernels.payload_to_columns(data.base), size)
+        grid_x, grid_y = np.meshgrid(x_values, y_values, indexing="ij")
+        kernels.set_column(columns, data.x.param, grid_x.ravel())
+        kernels.set_column(columns, data.y.param, grid_y.ravel())
+
+        valuation, errors = BATCH_METHODS[data.method](columns)[:2]
+        valuation = valuation.reshape(shape)
+        errors = errors.reshape(shape)
+
+        return {
+            "method": data.method,
+            "x": {"param": data.x.param, "values": x_values.tolist()},
+            "y": {"param": data.y.param, "values": y_values.tolist()},
+            "valuations": [_round_list(row) for row in valuation],
+            "errors": [
+                {"x_index": int(i), "y_index": int(j), "error": errors[i, j]}
+                for i, j in zip(*np.nonzero(errors != None))  # noqa: E711
+            ],
+        }
+    except Exception as e:
+        request_log.event("error", "Error en el análisis de sensibilidad", error=str(e))
+        return {"error": f"Error al calcular: {str(e)}"}
+
+# Valuación inversa: despejar un parámetro para alcanzar una valuación objetivo
+MAX_SOLVE_ROWS = int(os.environ.get("MAX_SOLVE_ROWS", 10000))
+
+class SolveData(BaseModel):
+    method: Literal["vc_method", "dcf", "berkus", "first_chicago"] = "dcf"
+    solve_for: str
+    # Un objetivo o una lista de objetivos
+    target: float | list[float]
+    # Datos fijos (mismo formato que los endpoints individuales) y, opcionalmente, una fila por empresa
+    base: dict = {}
+    rows: list[dict] | None = None
+    # [mínimo, máximo] de la búsqueda; las tasas van en decimales
+    bounds: list[float] | None = None
+    tolerance: float = 1e-9
+    max_iterations: int = 100
+
+def _solve_row(target, result, i):
+    row = {
+        "target": target,
+        "value": result["value"][i].item() if result["converged"][i] else None,
+        "valuation": round(result["valuation"][i].item(), 2) if result["converged"][i] else None,
+        "converged": bool(result["converged"][i]),
+        "iterations": int(result["iterations"][i]),
+    }
+    if result["converged"][i]:
+        row["residual"] = result["residual"][i].item()
+    if result["error"][i] is not None:
+        row["error"] = result["error"][i]
+    if result["warning"][i] is not None:
+        row["warning"] = result["warning"][i]
+    return row
+
+@app.post("/valuate/solve/")
+@metrics.count_errors
+def solve_method(data: SolveData):
+    try:
+        allowed = solver.PARAMS[data.method]
+        if data.solve_for not in allowed:
+            return {"error": f"Parámetro no soportado para {data.method}: {data.solve_for}", "available_params": list(allowed)}
+        if data.bounds is not None and len(data.bounds) != 2:
+            return {"error": "bounds debe ser [mínimo, máximo]"}
+        if data.tolerance <= 0 or not 1 <= data.max_iterations <= 1000:
+            return {"error": "tolerance debe ser positiva y max_iterations estar entre 1 y 1000"}
+
+        targets = data.target if isinstance(data.target, list) else None
+        size = len(data.rows) if data.rows is not None else len(targets) if targets is not None else 1
+        if targets is not None and len(targets) != size:
+            return {"error": "target y rows deben tener el mismo número de elementos"}
+        if size > MAX_SOLVE_ROWS:
+            return {"error": f"La solicitud excede el máximo de {MAX_SOLVE_ROWS} filas"}
+        target_array = np.asarray(targets if targets is not None else [data.target] * size, dtype=np.float64)
+
+        if data.rows is not None:
+            rows = [{**data.base, **row} for row in data.rows]
+            raw_columns = kernels.rows_to_columns(rows)
+        else:
+            raw_columns = kernels.payload_to_columns(data.base)
+        columns = kernels.build_columns(raw_columns, size)
+
+        try:
+            result = solver.solve(
+                data.method, columns, data.solve_for, target_array,
+                bounds=data.bounds, tolerance=data.tolerance, max_iterations=data.max_iterations,
+            )
+        except ValueError as e:
+            return {"error": str(e)}
+
+        results = [_solve_row(target, result, i) for i, target in enumerate(target_array.tolist())]
+        if data.rows is None and targets is None:
+            return {"method": data.method, "solve_for": data.solve_for, **results[0]}
+        return {"method": data.method, "solve_for": data.solve_for, "count": size, "results": results}
+    except Exception as e:
+        request_log.event("error", "Error en la valuación inversa", error=str(e))
+        return {"error": f"Error al calcular: {str(e)}"}
+
+# Simulación Monte Carlo: parámetros inciertos descritos como distribuciones
+class Distribution(BaseModel):
+    dist: Literal["fixed", "normal", "uniform", "triangular", "beta"] = "fixed"
+    value: float | None = None
+    mean: float | None = None
+    std: float | None = None
+    low: float | None = None
+    high: float | None = None
+    mode: float | None = None
+    alpha: float | None = None
+    beta: float | None = None
+
+class MonteCarloData(BaseModel):
+    name: str = "Startup X"
+    revenue: float | None = None
+    initial_cash_flow: float | None = None
+    investment_required: float = 500000
+    growth_rate: Distribution | float
+    discount_rate: Distribution | float = 0.15
+    terminal_growth_rate: float = 0.03
+    projection_years: int = 5
+    # Reemplaza el múltiplo del escenario de éxito de First Chicago
+    exit_multiple: Distribution | float | None = None
+    # Reemplaza la probabilidad del escenario de fracaso de First Chicago
+    failure_probability: Distribution | float | None = None
+    methods: list[str] = list(montecarlo.METHODS)
+    draws: int = 100000
+    seed: int | None = None
+    percentiles: list[float] = [5, 25, 50, 75, 95]
+    bins: int = 50
+
+def _distribution_spec(value):
+    if value is None:
+        return None
+    if isinstance(value, Distribution):
+        return value.model_dump()
+    return {"dist": "fixed", "value": value}
+
+@app.on_event("shutdown")
+def shutdown_monte_carlo_pool():
+    montecarlo.shutdown_pool()
+
+@app.post("/valuate/monte-carlo/")
+@app.post("/valuate/monte_carlo/")  # Ruta alternativa con guión bajo para mayor compatibilidad
+@metrics.count_errors
+async def monte_carlo_method(data: MonteCarloData):
+    return await _monte_carlo(data)
+
+async def _monte_carlo(data, progress=None):
+    try:
+        revenue = data.revenue if data.revenue is not None else data.initial_cash_flow
         if revenue is None or revenue <= 0:
-            return {"valuation": 0, "error": "Los ingresos deben ser positivos"}
+            return {"valuation": 0, "error": engine.ERROR_REVENUE}
+
+        unknown = [m for m in data.methods if m not in montecarlo.METHODS]
+        if unknown:
+            return {"error": f"Métodos no soportados: {unknown}", "available_methods": list(montecarlo.METHODS)}
+        if not 1 <= data.draws <= montecarlo.MAX_DRAWS:
+            return {"error": f"draws debe estar entre 1 y {montecarlo.MAX_DRAWS}"}
+        if not all(0 <= p <= 100 for p in data.percentiles) or data.bins < 1:
+            return {"error": "Los percentiles deben estar entre 0 y 100 y bins debe ser positivo"}
+
+        specs = {
+            "growth_rate": _distribution_spec(data.growth_rate),
+            "discount_rate": _distribution_spec(data.discount_rate),
+            "exit_multiple": _distribution_spec(data.exit_multiple),
+            "failure_probability": _distribution_spec(data.failure_probability),
+        }
+        for key, spec in specs.items():
+            if spec is not None:
+                error = montecarlo.validate_distribution(key, spec)
+                if error:
+                    return {"error": error}
+                # El múltiplo de salida no es una tasa: no se convierte
+                if key != "exit_multiple":
+                    specs[key] = montecarlo.normalize_distribution(spec)
+
+        terminal_growth_rate = data.terminal_growth_rate
+        if terminal_growth_rate > 1:
+            terminal_growth_rate = terminal_growth_rate / 100
+
+        params = {
+            **specs,
+            "revenue": revenue,
+            "investment_required": data.investment_required,
+            "terminal_growth_rate": terminal_growth_rate,
+            "projection_years": data.projection_years,
+            "methods": data.methods,
+        }
+        # Sin semilla se genera una y se devuelve para poder reproducir el resultado
+        seed = data.seed if data.seed is not None else int(np.random.SeedSequence().entropy % 2**63)
 
-        # First Chicago considera múltiples escenarios (éxito, lateral, fracaso)
+        results = await montecarlo.run(params, data.draws, seed, data.percentiles, data.bins, progress)
+        return {"name": data.name, "draws": data.draws, "seed": seed, "results": results}
+    except Exception as e:
+        request_log.event("error", "Error en la simulación Monte Carlo", error=str(e))
+        return {"valuation": 0, "error": f"Error al calcular: {str(e)}"}
+
+# Valuación combinada: los cuatro métodos sobre el mismo cuerpo y un promedio ponderado
+ALL_METHODS = {
+    "vc_method": _vc_method,
+    "dcf": _dcf_method,
+    "berkus": _berkus_method,
+    "first_chicago": _first_chicago_method,
+}
+# Pesos por defecto del promedio, p. ej. BLEND_WEIGHTS="vc_method=1,dcf=2,berkus=1,first_chicago=1"
+DEFAULT_BLEND_WEIGHTS = {
+    method.strip(): float(weight)
+    for method, weight in (
+        item.split("=") for item in os.environ.get("BLEND_WEIGHTS", "vc_method=1,dcf=1,berkus=1,first_chicago=1").split(",")
+        if item.strip()
+    )
+}
+# Con la tabla anual a partir de estos años el DCF corre en paralelo con el resto
+CONCURRENT_DCF_YEARS = int(os.environ.get("CONCURRENT_DCF_YEARS", 100))
+# Claves del cuerpo que configuran /valuate/all/ (el resto son los datos de la startup)
+ALL_OPTIONS = ("methods", "weights", "monte_carlo")
+
+def _blend(results, weights):
+    """Promedio ponderado de las valuaciones sin error, con los pesos renormalizados."""
+    usable = {m: w for m, w in weights.items() if m in results and "error" not in results[m] and w > 0}
+    total = sum(usable.values())
+    if total <= 0:
+        return {"valuation": 0, "error": "Ningún método con peso positivo produjo una valuación"}
+    normalized = {m: w / total for m, w in usable.items()}
+    valuation = sum(results[m]["valuation"] * w for m, w in normalized.items())
+    return {"valuation": round(valuation, 2), "weights": {m: round(w, 4) for m, w in normalized.items()}}
+
+@app.post("/valuate/all/")
+@metrics.count_errors
+async def all_methods(data: dict):
+    try:
+        data = dict(data)
+        options = {key: data.pop(key) for key in ALL_OPTIONS if key in data}
+
+        methods = options.get("methods") or list(ALL_METHODS)
+        unknown = [m for m in methods if m not in ALL_METHODS]
+        if unknown:
+            return {"error": f"Métodos no soportados: {unknown}", "available_methods": list(ALL_METHODS)}
+
+        weights = {**DEFAULT_BLEND_WEIGHTS, **(options.get("weights") or {})}
+        unknown = [m for m in weights if m not in ALL_METHODS]
+        if unknown:
+            return {"error": f"Pesos para métodos no soportados: {unknown}", "available_methods": list(ALL_METHODS)}
+        if not all(isinstance(w, (int, float)) and w >= 0 for w in weights.values()):
+            return {"error": "Los pesos deben ser números no negativos"}
+
+        # La simulación hereda los datos de la startup; sus claves los reemplazan
+        monte_carlo = None
+        if options.get("monte_carlo"):
+            if not isinstance(options["monte_carlo"], dict):
+                return {"error": "monte_carlo debe ser un objeto con los parámetros de la simulación"}
+            try:
+                monte_carlo = MonteCarloData.model_validate({**data, **options["monte_carlo"]})
+            except ValidationError as e:
+                return {"error": f"Datos inválidos para monte_carlo: {str(e)}"}
+
+        # Las validaciones de modelos y los datos normalizados se comparten entre métodos
+        shared = {}
+        years = data.get("projection_years")
+        long_dcf = (
+            "dcf" in methods and data.get("include_schedule") is True
+            and isinstance(years, (int, float)) and years >= CONCURRENT_DCF_YEARS
+        )
+        if monte_carlo is not None or long_dcf:
+            # Los métodos corren en el threadpool mientras la simulación usa sus procesos
+            tasks = [run_in_threadpool(ALL_METHODS[m], data, shared) for m in methods]
+            if monte_carlo is not None:
+                tasks.append(_monte_carlo(monte_carlo))
+            outputs = await asyncio.gather(*tasks)
+        else:
+            # Sin cálculos largos, pasar por el threadpool cuesta más que calcular
+            outputs = [ALL_METHODS[m](data, shared) for m in methods]
+
+        results = dict(zip(methods, outputs))
+        response = {"results": results, "blended": _blend(results, weights)}
+        if monte_carlo is not None:
+            response["monte_carlo"] = outputs[-1]
+        return response
+    except Exception as e:
+        request_log.event("error", "Error en la valuación combinada", error=str(e))
+        return {"valuation": 0, "error": f"Error al calcular: {str(e)}"}
 
-        # Escenario optimista (éxito)
-        success_probability = min(0.7, max(0.1, growth_rate))
-        success_multiple = 15 + (growth_rate * 10)
-        success_valuation = revenue * success_multiple
-
-        # Escenario base (lateral)
-        base_probability = min(0.7, max(0.2, 0.5 - growth_rate/2))
-        base_multiple = 5 + (growth_rate * 3)
-        base_valuation = revenue * base_multiple
-
-        # Escenario pesimista (fracaso)
-        failure_probability = max(0.1, 1 - success_probability - base_probability)
-        failure_multiple = max(0.2, min(1.0, investment_required / revenue))
-        failure_valuation = revenue * failure_multiple
-
-        # Normalización de probabilidades
-        total_probability = success_probability + base_probability + failure_probability
-        success_probability /= total_probability
-        base_probability /= total_probability
-        failure_probability /= total_probability
-
-        # Valoración ponderada por probabilidad
-        weighted_valuation = (
-            success_probability * success_valuation + 
-            base_probability * base_valuation + 
-            failure_probability * failure_valuation
+# Recálculo en vivo: la sesión guarda los campos ya validados y solo se validan los cambios
+def _live_compute(values, methods, weights):
+    shared = {}
+    results = {}
+    for method in methods:
+        try:
+            data = schemas.construct_input(method, values, shared)
+        except ValidationError as e:
+            results[method] = {"valuation": 0, "error": f"Datos inválidos: {str(e)}"}
+            continue
+        results[method] = ALL_METHODS[method](data, shared)
+    return {"results": results, "blended": _blend(results, weights)}
+
+@app.websocket("/ws/valuate")
+async def live_valuation(websocket: WebSocket):
+    """Sesión de recálculo en vivo; ?methods=dcf,berkus elige los métodos iniciales."""
+    methods = [m for m in websocket.query_params.get("methods", "").split(",") if m] or list(ALL_METHODS)
+    unknown = [m for m in methods if m not in ALL_METHODS]
+    if unknown:
+        await websocket.close(code=1008, reason=f"Métodos no soportados: {unknown}")
+        return
+    session = live.LiveSession(methods, DEFAULT_BLEND_WEIGHTS)
+    await live.serve(websocket, session, _live_compute, ALL_METHODS)
+
+# Trabajos asíncronos: lotes y simulaciones largas que no caben en una petición
+JOB_CHUNK_SIZE = int(os.environ.get("JOB_CHUNK_SIZE", 10000))
+MAX_JOB_BATCH_SIZE = int(os.environ.get("MAX_JOB_BATCH_SIZE", 1000000))
+
+class JobRequest(BaseModel):
+    kind: str
+    payload: dict = {}
+
+def _batch_job(data, job):
+    """Valúa el lote por bloques para informar el avance y poder cancelarlo."""
+    if data.columns is not None:
+        size = len(next(iter(data.columns.values()), []))
+    else:
+        size = len(data.rows or [])
+    if size > MAX_JOB_BATCH_SIZE:
+        return {"error": f"El lote excede el máximo de {MAX_JOB_BATCH_SIZE} filas"}
+
+    results = {}
+    for start in range(0, max(size, 1), JOB_CHUNK_SIZE):
+        job.check_cancelled()
+        stop = start + JOB_CHUNK_SIZE
+        chunk = BatchData(
+            methods=data.methods,
+            rows=data.rows[start:stop] if data.rows is not None else None,
+            columns={col: values[start:stop] for col, values in data.columns.items()} if data.columns is not None else None,
         )
+        output = batch_method(chunk)
+        if "error" in output:
+            return output
+        for method, result in output["results"].items():
+            merged = results.setdefault(method, {"valuations": [], "errors": []})
+            merged["valuations"].extend(result["valuations"])
+            merged["errors"].extend({"index": e["index"] + start, "error": e["error"]} for e in result["errors"])
+            for name, scenario in result.get("scenarios", {}).items():
+                target = merged.setdefault("scenarios", {}).setdefault(name, {"probability": [], "valuation": []})
+                target["probability"].extend(scenario["probability"])
+                target["valuation"].extend(scenario["valuation"])
+        job.progress(min(stop, size) / max(size, 1))
+    return {"count": size, "results": results}
+
+def _sensitivity_job(data, job):
+    return sensitivity_method(data)
+
+def _monte_carlo_job(data, job):
+    # Cada worker es un hilo sin event loop propio
+    return asyncio.run(_monte_carlo(data, job.progress))
+
+JOB_KINDS = {
+    "batch": (BatchData, _batch_job),
+    "sensitivity": (SensitivityData, _sensitivity_job),
+    "monte_carlo": (MonteCarloData, _monte_carlo_job),
+}
+
+def _job_runner(model, runner):
+    return lambda payload, job: runner(model.model_validate(payload), job)
+
+job_manager = jobs.from_env(
+    {kind: _job_runner(model, runner) for kind, (model, runner) in JOB_KINDS.items()},
+    log=request_log,
+)
 
-        # Detalles de cada escenario para mayor transparencia
-        scenarios = {
-            "success": {
-                "probability": round(success_probability, 2),
-                "valuation": round(success_valuation, 2)
-            },
-            "base": {
-                "probability": round(base_probability, 2),
-                "valuation": round(base_valuation, 2)
-            },
-            "failure": {
-                "probability": round(failure_probability, 2),
-                "valuation": round(failure_valuation, 2)
-            }
-        }
+@app.on_event("startup")
+def start_job_workers():
+    job_manager.start()
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    job_manager.stop()
 
+@app.post("/jobs/")
+@metrics.count_errors
+def submit_job(data: JobRequest):
+    try:
+        if data.kind not in JOB_KINDS:
+            return {"error": f"Tipo de trabajo no soportado: {data.kind}", "available_kinds": list(JOB_KINDS)}
+        model = JOB_KINDS[data.kind][0]
+        try:
+            payload = model.model_validate(data.payload).model_dump(mode="json")
+        except ValidationError as e:
+            return {"error": f"Datos inválidos: {str(e)}"}
+        job_id = job_manager.submit(data.kind, payload)
         return {
-            "valuation": round(weighted_valuation, 2),
-            "scenarios": scenarios
+            "id": job_id,
+            "status": "queued",
+            "status_url": f"/jobs/{job_id}",
+            "result_url": f"/jobs/{job_id}/result",
         }
+    except jobs.JobQueueFull:
+        return {"error": f"La cola de trabajos está llena ({job_manager.max_pending} pendientes)"}
     except Exception as e:
-        print(f"Error en el cálculo First Chicago: {e}")
-        return {"valuation": 0, "error": f"Error al calcular: {str(e)}"}
+        request_log.event("error", "Error al encolar el trabajo", error=str(e))
+        return {"error": f"Error al encolar: {str(e)}"}
+
+@app.get("/jobs/")
+def list_jobs(status: str | None = None, limit: int = 50):
+    if status is not None and status not in jobs.STATUSES:
+        return {"error": f"Estado no soportado: {status}", "available_statuses": list(jobs.STATUSES)}
+    return {"jobs": job_manager.list(status, max(1, min(limit, 500)))}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return {"error": "Trabajo no encontrado o expirado"}
+    return job
+
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    job = job_manager.get(job_id, include_result=True)
+    if job is None:
+        return {"error": "Trabajo no encontrado o expirado"}
+    if job["status"] not in jobs.FINISHED:
+        return {"error": "El trabajo aún no terminó", "status": job["status"], "progress": job["progress"]}
+    return job
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return {"error": "Trabajo no encontrado o expirado"}
+    return job
+
+# Historial de valuaciones: consultas filtradas y agregados por método
+MAX_HISTORY_LIMIT = int(os.environ.get("MAX_HISTORY_LIMIT", 1000))
+ERROR_HISTORY_DISABLED = "El historial está desactivado (definir VALUATION_HISTORY_DB)"
+
+def _parse_time(value):
+    """Fecha ISO 8601 (``2024-05-01`` o ``2024-05-01T12:00:00``) o segundos epoch."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+def _history_filters(name, method, since, until):
+    if method is not None and method not in ALL_METHODS:
+        raise ValueError(f"Método no soportado: {method}")
+    try:
+        return {"name": name, "method": method, "since": _parse_time(since), "until": _parse_time(until)}
+    except ValueError:
+        raise ValueError("Fecha inválida: usar ISO 8601 (2024-05-01T12:00:00) o segundos epoch")
+
+@app.get("/history/")
+@metrics.count_errors
+def history_query(
+    name: str | None = None,
+    method: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    limit: int = 100,
+    offset: int = 0,
+):
+    if not valuation_history.enabled:
+        return {"error": ERROR_HISTORY_DISABLED}
+    try:
+        filters = _history_filters(name, method, since, until)
+    except ValueError as e:
+        return {"error": str(e)}
+    try:
+        items = valuation_history.query(limit=max(1, min(limit, MAX_HISTORY_LIMIT)), offset=max(0, offset), **filters)
+        return {"count": len(items), "items": items}
+    except Exception as e:
+        request_log.event("error", "Error al consultar el historial", error=str(e))
+        return {"error": f"Error al consultar: {str(e)}"}
+
+@app.get("/history/aggregates")
+@metrics.count_errors
+def history_aggregates(
+    name: str | None = None,
+    method: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    percentiles: str = ",".join(str(p) for p in history.DEFAULT_PERCENTILES),
+):
+    if not valuation_history.enabled:
+        return {"error": ERROR_HISTORY_DISABLED}
+    try:
+        filters = _history_filters(name, method, since, until)
+    except ValueError as e:
+        return {"error": str(e)}
+    try:
+        percentile_list = [float(p) for p in percentiles.split(",") if p.strip()]
+    except ValueError:
+        percentile_list = None
+    if percentile_list is None or not all(0 <= p <= 100 for p in percentile_list):
+        return {"error": "Los percentiles deben ser números entre 0 y 100 separados por comas"}
+    try:
+        return {"methods": valuation_history.aggregate(percentiles=percentile_list, **filters)}
+    except Exception as e:
+        request_log.event("error", "Error al agregar el historial", error=str(e))
+        return {"error": f"Error al consultar: {str(e)}"}
 
-# Endpoint para servir el cliente de prueba HTML
+# Endpoint para servir el cliente de prueba HTML (en memoria, comprimido y con ETag)
 from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
-import os
+
+test_client = static.StaticFile(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_client.html"), "text/html; charset=utf-8"
+)
 
 @app.get("/test", response_class=HTMLResponse)
-async def get_test_client():
-    with open("test_client.html", "r") as f:
-        return f.read()
+def get_test_client(request: Request):
+    return test_client.response(request)
 
-# Ejecutar la API si se ejecuta el archivo
+# Ejecutar la API si se ejecuta el archivo (varios workers, ver server.py)
 if __name__ == "__main__":
-    # Usar puerto 8080 directamente
-    port = 8080
+    import server
 
-    try:
-        print(f"Iniciando servidor en puerto {port}...")
-        uvicorn.run(app, host="0.0.0.0", port=port)
-    except Exception as e:
-        print(f"Error al iniciar el servidor en puerto {port}: {e}")
-        # Intentar con puerto alternativo
-        try:
-            port = 3000
-            print(f"Intentando con puerto alternativo {port}...")
-            uvicorn.run(app, host="0.0.0.0", port=port)
-        except Exception as e:
-            print(f"Error al iniciar el servidor en puerto alternativo: {e}")
\ No newline at end of file
+    sys.exit(server.run(app))
@@ -0,0 +1,217 @@
+"""Métricas en formato de texto de Prometheus.
+
+Cada hilo (el event loop y los hilos del threadpool) acumula sus
+contadores e histogramas en su propio fragmento, así que registrar una
+métrica no toma ningún lock. Los fragmentos se suman solo cuando se
+consulta ``/metrics``.
+
+- ``MetricsMiddleware`` cuenta peticiones, errores y latencias por
+  endpoint (``method``, el nombre de la función) y por ruta (``route``,
+  la ruta declarada, para distinguir alias como ``/valuate/dcf/`` y
+  ``/valuate/dcf-method/``).
+- ``count_errors`` marca como error las respuestas 200 que llevan la
+  clave ``"error"``, que es como los endpoints de valuación informan fallos.
+- ``inc`` se usa desde ``schemas`` para contar qué modelo de entrada se
+  eligió y cuándo se aplicaron los valores por defecto.
+"""
+import bisect
+import contextvars
+import functools
+import inspect
+import threading
+import time
+
+# Límites superiores (segundos) de los buckets de latencia
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_HELP = {
+    "valuation_http_requests_total": ("counter", "Peticiones HTTP atendidas"),
+    "valuation_http_errors_total": ("counter", "Peticiones con status >= 500 o con un error de valuación"),
+    "valuation_http_request_duration_seconds": ("histogram", "Latencia de las peticiones HTTP"),
+    "valuation_input_model_total": ("counter", "Modelo de entrada elegido para cada endpoint de valuación"),
+    "valuation_fallback_defaults_total": ("counter", "Veces que se usaron los valores por defecto de respaldo"),
+    "valuation_admission_rejected_total": ("counter", "Peticiones rechazadas por el control de admisión (429/503)"),
+    "valuation_admission_queued_total": ("counter", "Peticiones que esperaron en la cola de su clase de ruta"),
+    "valuation_admission_cost_total": ("counter", "Unidades de costo estimado admitidas por clase de ruta"),
+    "valuation_admission_wait_seconds": ("histogram", "Espera en la cola del control de admisión"),
+    "valuation_live_sessions_total": ("counter", "Sesiones abiertas en /ws/valuate"),
+    "valuation_live_updates_total": ("counter", "Actualizaciones recibidas en /ws/valuate"),
+    "valuation_live_recalculations_total": ("counter", "Recálculos hechos en /ws/valuate (menos que las actualizaciones si se agruparon)"),
+}
+
+# Estado de la petición en curso, compartido entre el middleware y el endpoint
+_request_state = contextvars.ContextVar("valuation_request_state", default=None)
+
+
+class _Shard:
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+
+class Registry:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._local = threading.local()
+        self._shards = []
+        # Solo se usa al registrar el fragmento de un hilo nuevo
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name, labels, value=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        entry = histograms.get(key)
+        if entry is None:
+            # Conteo por bucket (+Inf al final), suma y total
+            entry = histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def collect(self):
+        """Suma los fragmentos de todos los hilos."""
+        counters = {}
+        histograms = {}
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, value in list(shard.counters.items()):
+                counters[key] = counters.get(key, 0) + value
+            for key, (buckets, total, count) in list(shard.histograms.items()):
+                merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+                merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+                merged[1] += total
+                merged[2] += count
+        return counters, histograms
+
+    def render(self):
+        """Texto en el formato de exposición de Prometheus."""
+        counters, histograms = self.collect()
+        by_name = {}
+        for (name, labels), value in counters.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for (name, labels), value in histograms.items():
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name in sorted(by_name):
+            kind, help_text = _HELP.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+                if kind == "histogram":
+                    bucket_counts, total, count = value
+                    cumulative = 0
+                    for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                        cumulative += bucket_count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {total}")
+                    lines.append(f"{name}_count{_labels(labels)} {count}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+REGISTRY = Registry()
+
+
+def inc(name, labels, value=1):
+    REGISTRY.inc(name, labels, value)
+
+
+def observe(name, labels, value):
+    REGISTRY.observe(name, labels, value)
+
+
+def render():
+    return REGISTRY.render()
+
+
+def mark_error():
+    """Marca la petición en curso como fallida (sin cambiar su status)."""
+    state = _request_state.get()
+    if state is not None:
+        state["error"] = True
+
+
+def count_errors(endpoint):
+    """Decorador: marca la petición como error si la respuesta trae ``"error"``."""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            result = await endpoint(*args, **kwargs)
+            if isinstance(result, dict) and "error" in result:
+                mark_error()
+            return result
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            result = endpoint(*args, **kwargs)
+            if isinstance(result, dict) and "error" in result:
+                mark_error()
+            return result
+    return wrapper
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mide cada petición HTTP."""
+
+    def __init__(self, app, registry=REGISTRY):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        state = {"status": 500, "error": False}
+        token = _request_state.set(state)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_state.reset(token)
+            # El router deja la ruta encontrada en el scope
+            route = scope.get("route")
+            labels = (
+                ("method", getattr(route, "name", None) or "none"),
+                ("route", getattr(route, "path", None) or "unmatched"),
+            )
+            status = state["status"]
+            self.registry.inc("valuation_http_requests_total", labels + (("status", str(status)),))
+            if status >= 500 or state["error"]:
+                self.registry.inc("valuation_http_errors_total", labels)
+            self.registry.observe("valuation_http_request_duration_seconds", labels, time.perf_counter() - start)
@@ -0,0 +1,192 @@
+"""Simulación Monte Carlo de valuaciones DCF y First Chicago.
+
+Los parámetros inciertos (crecimiento, tasa de descuento, múltiplo de
+salida y probabilidad de fracaso) se describen como distribuciones. Las
+muestras se generan y evalúan en bloques vectorizados con NumPy; cada
+bloque tiene su propio generador derivado de la semilla
+(``SeedSequence.spawn``), así el resultado es reproducible sin importar
+si los bloques corren en el proceso actual o en un ``ProcessPoolExecutor``.
+
+Los procesos del pool salen de un servidor ``forkserver`` y no de un fork
+del proceso de la API: ese proceso ya tiene hilos (threadpool, escritores
+de logs, historial y jobs) y un fork podría heredar un lock tomado.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import engine
+
+CHUNK_SIZE = 250000
+MAX_DRAWS = int(os.environ.get("MONTE_CARLO_MAX_DRAWS", 1000000))
+# A partir de este número de muestras los bloques se reparten entre procesos
+PARALLEL_THRESHOLD = int(os.environ.get("MONTE_CARLO_PARALLEL_THRESHOLD", 200000))
+WORKERS = int(os.environ.get("MONTE_CARLO_WORKERS", min(4, os.cpu_count() or 1)))
+
+METHODS = ("dcf", "first_chicago")
+# Parámetros obligatorios de cada distribución
+DISTRIBUTIONS = {
+    "fixed": ("value",),
+    "normal": ("mean", "std"),
+    "uniform": ("low", "high"),
+    "triangular": ("low", "mode", "high"),
+    "beta": ("alpha", "beta"),
+}
+
+_pool = None
+# Las simulaciones de /valuate/all/ y de los jobs piden el pool desde varios hilos
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                context = multiprocessing.get_context("forkserver")
+                # El servidor importa este módulo (y NumPy) una vez; los workers lo heredan ya cargado
+                context.set_forkserver_preload([__name__])
+                _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=context)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def validate_distribution(name, spec):
+    """Devuelve un mensaje de error si faltan parámetros, o None."""
+    required = DISTRIBUTIONS.get(spec["dist"])
+    if required is None:
+        return f"{name}: distribución no soportada '{spec['dist']}'"
+    missing = [key for key in required if spec.get(key) is None]
+    if missing:
+        return f"{name}: la distribución '{spec['dist']}' requiere {missing}"
+    return None
+
+
+def normalize_distribution(spec):
+    """Aplica la regla de porcentajes (20 en vez de 0.2) a toda la distribución.
+
+    Si algún parámetro de posición es mayor que 1 se asume que la
+    distribución completa viene en porcentaje.
+    """
+    location = [spec.get(key) for key in ("value", "mean", "low", "high", "mode")]
+    if any(v is not None and v > 1 for v in location):
+        return {
+            key: (value / 100 if key in ("value", "mean", "std", "low", "high", "mode") and value is not None else value)
+            for key, value in spec.items()
+        }
+    return spec
+
+
+def sample(rng, spec, size):
+    """Genera ``size`` muestras de la distribución descrita por ``spec``."""
+    dist = spec["dist"]
+    if dist == "fixed":
+        return np.full(size, spec["value"], dtype=np.float64)
+    if dist == "normal":
+        return rng.normal(spec["mean"], spec["std"], size)
+    if dist == "uniform":
+        return rng.uniform(spec["low"], spec["high"], size)
+    if dist == "triangular":
+        return rng.triangular(spec["low"], spec["mode"], spec["high"], size)
+    if dist == "beta":
+        low = spec.get("low") if spec.get("low") is not None else 0.0
+        high = spec.get("high") if spec.get("high") is not None else 1.0
+        return low + (high - low) * rng.beta(spec["alpha"], spec["beta"], size)
+    raise ValueError(f"Distribución no soportada: {dist}")
+
+
+def simulate_chunk(params, size, seed_sequence):
+    """Evalúa ``size`` muestras. Devuelve {método: array de valuaciones}.
+
+    Es una función de módulo para poder ejecutarse en otro proceso.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    # El orden de muestreo es fijo para que la semilla sea reproducible
+    growth_rate = sample(rng, params["growth_rate"], size)
+    discount_rate = sample(rng, params["discount_rate"], size)
+    exit_multiple = sample(rng, params["exit_multiple"], size) if params["exit_multiple"] else None
+    failure_probability = sample(rng, params["failure_probability"], size) if params["failure_probability"] else None
+
+    results = {}
+    if "dcf" in params["methods"]:
+        terminal_growth_rate = params["terminal_growth_rate"]
+        # Evitar división por cero (misma regla que dcf_method)
+        discount_rate = np.where(discount_rate <= terminal_growth_rate, terminal_growth_rate + 0.01, discount_rate)
+        results["dcf"] = engine.dcf_closed_form(
+            params["revenue"], growth_rate, discount_rate, terminal_growth_rate, params["projection_years"]
+        )
+    if "first_chicago" in params["methods"]:
+        with np.errstate(all="ignore"):
+            results["first_chicago"], _ = engine.first_chicago_valuation(
+                params["revenue"], growth_rate, params["investment_required"],
+                success_multiple=exit_multiple, failure_probability=failure_probability,
+            )
+    return results
+
+
+def summarize(values, percentiles, bins):
+    """Estadísticos, percentiles e histograma de las valuaciones finitas."""
+    finite = values[np.isfinite(values)]
+    summary = {"invalid_draws": int(values.size - finite.size)}
+    if finite.size == 0:
+        return summary
+    counts, edges = np.histogram(finite, bins=bins)
+    summary.update({
+        "mean": round(float(finite.mean()), 2),
+        "std": round(float(finite.std()), 2),
+        "min": round(float(finite.min()), 2),
+        "max": round(float(finite.max()), 2),
+        "percentiles": {
+            f"p{p:g}": round(v, 2) for p, v in zip(percentiles, np.percentile(finite, percentiles).tolist())
+        },
+        "histogram": {
+            "bin_edges": [round(v, 2) for v in edges.tolist()],
+            "counts": counts.tolist(),
+        },
+    })
+    return summary
+
+
+async def run(params, draws, seed, percentiles, bins, progress=None):
+    """Ejecuta la simulación sin bloquear el event loop.
+
+    ``progress``, si se indica, recibe la fracción de muestras evaluadas
+    cada vez que termina un bloque.
+    """
+    chunk_sizes = [CHUNK_SIZE] * (draws // CHUNK_SIZE)
+    if draws % CHUNK_SIZE:
+        chunk_sizes.append(draws % CHUNK_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+
+    loop = asyncio.get_running_loop()
+    # Las muestras pequeñas no justifican el costo de enviar datos a otro proceso
+    executor = _get_pool() if draws >= PARALLEL_THRESHOLD and WORKERS > 1 else None
+    futures = [
+        loop.run_in_executor(executor, simulate_chunk, params, size, seed_sequence)
+        for size, seed_sequence in zip(chunk_sizes, seeds)
+    ]
+    if progress is not None:
+        done = 0
+        for future, size in zip(futures, chunk_sizes):
+            def report(_, size=size):
+                nonlocal done
+                done += size
+                progress(done / draws)
+            future.add_done_callback(report)
+    chunks = await asyncio.gather(*futures)
+
+    return {
+        method: summarize(np.concatenate([chunk[method] for chunk in chunks]), percentiles, bins)
+        for method in params["methods"]
+    }
@@ -0,0 +1,227 @@
+"""Modelos de entrada y selección del modelo en una sola validación.
+
+Cada endpoint de valuación acepta varios formatos (StartupData, DCFData,
+VCData) y antes probaba los modelos uno tras otro dentro de try/except.
+Aquí cada endpoint tiene una cadena de candidatos en el mismo orden que
+esa lógica original; se elige el primer candidato cuyos campos
+obligatorios están presentes (una comprobación de claves, sin validar),
+y solo se valida ese modelo. Si la validación falla por tipos inválidos
+se continúa con el siguiente candidato, igual que antes, de modo que los
+valores por defecto (``Startup X``) y el mapeo de ``initial_cash_flow``
+a ingresos se conservan.
+"""
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationError
+
+import metrics
+
+
+# Modelo de datos que ingresará el usuario
+class StartupData(BaseModel):
+    name: str
+    revenue: float
+    growth_rate: float
+    investment_required: float
+
+# Modelo específico para DCF
+class DCFData(BaseModel):
+    initial_cash_flow: float
+    growth_rate: float
+    discount_rate: float = 0.15
+    terminal_growth_rate: float = 0.03
+    projection_years: int = 5
+
+# Modelo específico para VC Method
+class VCData(BaseModel):
+    name: str = "Startup X"
+    revenue: float
+    growth_rate: float
+    investment_required: float = 500000
+    # Campos opcionales para compatibilidad con el formato DCF
+    initial_cash_flow: float = None
+    discount_rate: float = None
+    terminal_growth_rate: float = None
+    projection_years: int = None
+
+# StartupData con todos los campos por defecto (respaldo de Berkus y First Chicago)
+class DefaultStartupData(StartupData):
+    model_config = ConfigDict(title="StartupData")
+    name: str = "Startup X"
+    revenue: float = 1000000
+    growth_rate: float = 0.2
+    investment_required: float = 500000
+
+# DCFData con todos los campos por defecto (respaldo del método DCF)
+class DefaultDCFData(DCFData):
+    model_config = ConfigDict(title="DCFData")
+    initial_cash_flow: float = 100000
+    growth_rate: float = 0.2
+
+
+# Modelos que completan campos faltantes con valores por defecto
+_FALLBACK_MODELS = (VCData, DefaultStartupData, DefaultDCFData)
+
+
+def _record(method, model):
+    metrics.inc("valuation_input_model_total", (("method", method), ("model", model.__name__)))
+    if model in _FALLBACK_MODELS:
+        metrics.inc("valuation_fallback_defaults_total", (("method", method), ("model", model.__name__)))
+
+
+def _required(model):
+    return frozenset(name for name, field in model.model_fields.items() if field.is_required())
+
+
+def _has_cash_flow(data):
+    return "initial_cash_flow" in data
+
+
+def _no_cash_flow(data):
+    return "initial_cash_flow" not in data
+
+
+# Cadena de candidatos por endpoint: (modelo, condición adicional, usar los datos recibidos)
+_CHAINS = {
+    "vc_method": [
+        (StartupData, None, True),
+        (DCFData, None, True),
+        (VCData, None, True),
+    ],
+    "dcf": [
+        (DCFData, _has_cash_flow, True),
+        (StartupData, None, True),
+        (DefaultDCFData, None, True),
+    ],
+    # Berkus y First Chicago comparten la misma lógica de conversión
+    "berkus": [
+        (StartupData, None, True),
+        (DCFData, _has_cash_flow, True),
+        (DefaultStartupData, _no_cash_flow, True),
+        (DefaultStartupData, None, False),
+    ],
+}
+_CHAINS["first_chicago"] = _CHAINS["berkus"]
+
+# Campos obligatorios precalculados de cada candidato
+_CHAINS = {
+    method: [(model, _required(model), condition, use_data) for model, condition, use_data in chain]
+    for method, chain in _CHAINS.items()
+}
+
+
+def _validate(model, data, use_data, shared):
+    if shared is None:
+        return model.model_validate(data if use_data else {})
+    key = (model, use_data)
+    if key not in shared:
+        try:
+            shared[key] = model.model_validate(data if use_data else {})
+        except ValidationError as e:
+            shared[key] = e
+    outcome = shared[key]
+    if isinstance(outcome, ValidationError):
+        raise outcome
+    return outcome
+
+
+def parse_input(method, data, shared=None):
+    """Convierte el cuerpo recibido en el modelo que corresponde al endpoint.
+
+    Los objetos que ya son modelos se devuelven sin cambios. Si ningún
+    candidato valida se lanza el ``ValidationError`` del último.
+    ``shared`` es un dict por petición: cuando varios métodos parsean el
+    mismo cuerpo, cada modelo se valida una sola vez.
+    """
+    if not isinstance(data, dict):
+        return data
+
+    keys = data.keys()
+    chain = _CHAINS[method]
+    for index, (model, required, condition, use_data) in enumerate(chain):
+        if not required <= keys or (condition is not None and not condition(data)):
+            continue
+        try:
+            parsed = _validate(model, data, use_data, shared)
+        except ValidationError:
+            if index == len(chain) - 1:
+                raise
+            continue
+        _record(method, model)
+        return parsed
+    # Como antes, el error reportado es el del último candidato
+    model, _, _, use_data = chain[-1]
+    parsed = _validate(model, data, use_data, shared)
+    _record(method, model)
+    return parsed
+
+
+def select_candidate(method, keys, invalid=frozenset()):
+    """Candidato que elegiría ``parse_input`` para un cuerpo, sin validarlo.
+
+    ``keys`` son los campos presentes en el cuerpo e ``invalid`` los que
+    no pasan la validación de su tipo (un campo tiene el mismo tipo en
+    todos los modelos). Recorre la misma cadena que ``parse_input``: un
+    candidato valida si no lee los datos recibidos o si ninguno de sus
+    campos es inválido. Devuelve (modelo, usar los datos recibidos), o
+    None si ningún candidato valida. Lo usan los kernels vectorizados para
+    elegir el modelo de cada fila igual que los endpoints.
+    """
+    chain = _CHAINS[method]
+    # Las condiciones solo miran qué claves están presentes
+    data = dict.fromkeys(keys)
+    for model, required, condition, use_data in chain:
+        if not required <= keys or (condition is not None and not condition(data)):
+            continue
+        if use_data and not invalid.isdisjoint(model.model_fields):
+            continue
+        return model, use_data
+    # parse_input valida el último candidato aunque no cumpla la condición
+    model, required, _, use_data = chain[-1]
+    if not use_data or (required <= keys and invalid.isdisjoint(model.model_fields)):
+        return model, use_data
+    return None
+
+
+# Validador de cada campo por separado (para actualizaciones parciales)
+FIELD_ADAPTERS = {}
+for _model in (StartupData, DCFData, VCData):
+    for _name, _field in _model.model_fields.items():
+        FIELD_ADAPTERS.setdefault(_name, TypeAdapter(_field.annotation))
+
+
+def validate_fields(changes):
+    """Valida solo los campos recibidos. Devuelve (valores válidos, errores por campo).
+
+    Un valor ``None`` significa quitar el campo.
+    """
+    valid = {}
+    errors = {}
+    for name, value in changes.items():
+        adapter = FIELD_ADAPTERS.get(name)
+        if adapter is None:
+            errors[name] = "Campo desconocido"
+        elif value is None:
+            valid[name] = None
+        else:
+            try:
+                valid[name] = adapter.validate_python(value)
+            except ValidationError as e:
+                errors[name] = e.errors()[0]["msg"]
+    return valid, errors
+
+
+def construct_input(method, values, shared=None):
+    """Como ``parse_input`` pero con valores ya validados campo por campo.
+
+    Elige el mismo candidato de la cadena y lo construye sin volver a
+    validar. Si ningún candidato tiene sus campos obligatorios se valida
+    normalmente para lanzar el mismo error que la ruta HTTP.
+    """
+    keys = values.keys()
+    for model, required, condition, use_data in _CHAINS[method]:
+        if not required <= keys or (condition is not None and not condition(values)):
+            continue
+        fields = {name: value for name, value in values.items() if name in model.model_fields} if use_data else {}
+        parsed = model.model_construct(**fields)
+        _record(method, model)
+        return parsed
+    return parse_input(method, values, shared)
@@ -0,0 +1,204 @@
+"""Valuación masiva fuera del servicio web.
+
+Lee una cartera en formato columnar (arrays NumPy ``.npy``) mapeada en
+memoria, la divide en bloques de ``--chunk-size`` filas y los valúa en un
+pool de procesos con ``engine.score_columns``. Cada worker escribe sus
+resultados directamente en los archivos de salida (también mapeados en
+memoria), así que no se crean objetos Python por fila ni se envían
+resultados entre procesos. Los números son los mismos que devuelven los
+endpoints HTTP.
+
+Entrada, una de dos formas:
+
+- un directorio con un ``<columna>.npy`` por columna (``revenue.npy``,
+  ``growth_rate.npy``, ...), todos del mismo largo;
+- un único ``.npy`` con un dtype estructurado cuyos campos son las columnas.
+
+Las columnas son las de ``kernels.COLUMNS`` y, opcionalmente, ``name``
+(texto, dtype ``<U``); las que faltan, los NaN y los nombres vacíos se
+tratan como valores ausentes. Igual que en ``/valuate/batch/``, el modelo
+de entrada de cada fila (y con él los valores por defecto) se elige con
+las mismas cadenas que los endpoints, así que cada fila da el mismo
+número que el endpoint del método con ese cuerpo.
+
+Salida, en el directorio indicado:
+
+- ``<método>.npy``: valuaciones (float64, redondeadas a 2 decimales)
+- ``<método>.error.npy``: código de error por fila (int8, 0 = sin error)
+- ``first_chicago.<escenario>_probability.npy`` / ``_valuation.npy`` con ``--scenarios``
+- ``errors.json``: mensaje de cada código de error
+
+Uso:
+    python score.py cartera/ resultados/ --methods dcf,first_chicago --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import engine
+import kernels
+
+DEFAULT_CHUNK_SIZE = 250000
+
+# Archivos ya mapeados por este proceso (cada worker los abre una vez)
+_mapped = {}
+
+
+def open_input(path):
+    """Columnas de la cartera como arrays mapeados en memoria (solo lectura)."""
+    if os.path.isdir(path):
+        columns = {}
+        for col in kernels.FIELDS:
+            file = os.path.join(path, f"{col}.npy")
+            if os.path.exists(file):
+                columns[col] = np.load(file, mmap_mode="r")
+    else:
+        array = np.load(path, mmap_mode="r")
+        if array.dtype.names is None:
+            raise ValueError(f"{path}: se esperaba un .npy con campos (dtype estructurado) o un directorio")
+        columns = {col: array[col] for col in kernels.FIELDS if col in array.dtype.names}
+    if not columns:
+        raise ValueError(f"{path}: no hay ninguna columna de {', '.join(kernels.FIELDS)}")
+    sizes = {col: array.shape for col, array in columns.items()}
+    for col, array in columns.items():
+        if col == "name" and (array.ndim != 1 or array.dtype.kind != "U"):
+            raise ValueError("name: la columna debe ser un array de texto (dtype <U) de una dimensión")
+        if col != "name" and (array.ndim != 1 or array.dtype.kind not in "biuf"):
+            raise ValueError(f"{col}: la columna debe ser un array numérico de una dimensión")
+    if len(set(sizes.values())) > 1:
+        raise ValueError(f"Todas las columnas deben tener el mismo largo: {sizes}")
+    return columns
+
+
+def output_names(methods, scenarios):
+    """Nombre de archivo y dtype de cada salida, por método."""
+    names = {}
+    for method in methods:
+        names[method] = {"valuation": (f"{method}.npy", np.float64), "error": (f"{method}.error.npy", np.int8)}
+        if scenarios and method == "first_chicago":
+            for scenario in ("success", "base", "failure"):
+                for field in ("probability", "valuation"):
+                    key = f"{scenario}_{field}"
+                    names[method][key] = (f"{method}.{key}.npy", np.float64)
+    return names
+
+
+def _mapped_file(path, mode):
+    key = (path, mode)
+    if key not in _mapped:
+        _mapped[key] = open_input(path) if mode == "input" else np.load(path, mmap_mode="r+")
+    return _mapped[key]
+
+
+def score_chunk(input_path, output_dir, start, stop, methods, scenarios):
+    """Valúa las filas [start, stop) y las escribe en los archivos de salida.
+
+    Devuelve la cantidad de filas y los errores por método.
+    """
+    columns = _mapped_file(input_path, "input")
+    raw_columns = {col: array[start:stop] for col, array in columns.items()}
+    results = engine.score_columns(raw_columns, stop - start, methods, scenarios)
+    error_counts = {}
+    for method, outputs in output_names(methods, scenarios).items():
+        for key, (name, _) in outputs.items():
+            _mapped_file(os.path.join(output_dir, name), "output")[start:stop] = results[method][key]
+        error_counts[method] = int(np.count_nonzero(results[method]["error"]))
+    return stop - start, error_counts
+
+
+def run(input_path, output_dir, methods=tuple(kernels.METHODS), workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+        scenarios=False):
+    """Valúa la cartera completa. Devuelve las estadísticas de la corrida."""
+    start_time = time.perf_counter()
+    # Los workers se crean con fork: no deben heredar mapas de una corrida anterior
+    _mapped.clear()
+    columns = open_input(input_path)
+    size = len(next(iter(columns.values())))
+    input_bytes = sum(array.nbytes for array in columns.values())
+    workers = workers or os.cpu_count() or 1
+
+    # Los archivos de salida se crean completos; cada bloque escribe su tramo
+    os.makedirs(output_dir, exist_ok=True)
+    for outputs in output_names(methods, scenarios).values():
+        for name, dtype in outputs.values():
+            np.lib.format.open_memmap(os.path.join(output_dir, name), mode="w+", dtype=dtype, shape=(size,)).flush()
+    with open(os.path.join(output_dir, "errors.json"), "w", encoding="utf-8") as f:
+        json.dump({str(code): message for code, message in enumerate(engine.ERROR_MESSAGES) if message},
+                  f, indent=2, ensure_ascii=False)
+
+    chunks = [(start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+    args = [(input_path, output_dir, start, stop, methods, scenarios) for start, stop in chunks]
+    errors = dict.fromkeys(methods, 0)
+    if workers == 1 or len(chunks) <= 1:
+        outputs = [score_chunk(*task) for task in args]
+        workers = 1
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            outputs = list(pool.map(score_chunk, *zip(*args)))
+    for _, error_counts in outputs:
+        for method, count in error_counts.items():
+            errors[method] += count
+
+    elapsed = time.perf_counter() - start_time
+    return {
+        "rows": size,
+        "methods": list(methods),
+        "chunks": len(chunks),
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(size / elapsed) if elapsed > 0 else None,
+        "valuations_per_s": round(size * len(methods) / elapsed) if elapsed > 0 else None,
+        "input_mb_per_s": round(input_bytes / 1e6 / elapsed, 1) if elapsed > 0 else None,
+        "errors": errors,
+    }
+
+
+def print_stats(stats):
+    print(f"Filas:            {stats['rows']:,}")
+    print(f"Métodos:          {', '.join(stats['methods'])}")
+    print(f"Bloques/workers:  {stats['chunks']} / {stats['workers']}")
+    print(f"Tiempo:           {stats['seconds']:.3f} s")
+    print(f"Filas/s:          {stats['rows_per_s']:,}")
+    print(f"Valuaciones/s:    {stats['valuations_per_s']:,}")
+    print(f"Entrada:          {stats['input_mb_per_s']} MB/s")
+    for method, count in stats["errors"].items():
+        print(f"Errores {method + ':':<17} {count:,}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="directorio con un .npy por columna, o un .npy estructurado")
+    parser.add_argument("output", help="directorio de salida")
+    parser.add_argument("--methods", default=",".join(kernels.METHODS), help="métodos separados por comas (todos)")
+    parser.add_argument("--workers", type=int, default=None, help="procesos (las CPUs disponibles)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help=f"filas por bloque ({DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--scenarios", action="store_true", help="escribir también los escenarios de First Chicago")
+    parser.add_argument("--stats-json", help="guardar las estadísticas de la corrida en este archivo JSON")
+    args = parser.parse_args(argv)
+
+    methods = [m.strip() for m in args.methods.split(",") if m.strip()]
+    unknown = [m for m in methods if m not in kernels.METHODS]
+    if unknown or not methods:
+        parser.error(f"Métodos no soportados: {unknown}; disponibles: {', '.join(kernels.METHODS)}")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size debe ser positivo")
+
+    try:
+        stats = run(args.input, args.output, methods, args.workers, args.chunk_size, args.scenarios)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print_stats(stats)
+    if args.stats_json:
+        with open(args.stats_json, "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""Capa de serialización de respuestas y cuerpos de petición.
+
+Los endpoints devuelven dicts; en vez de pasar por ``jsonable_encoder`` y
+``json.dumps`` (que recorren en Python cada float de un lote o una
+grilla), ``NegotiatedRoute`` serializa el resultado directamente con el
+codec elegido según el encabezado ``Accept``:
+
+- ``application/json``: orjson (con soporte de arrays y escalares NumPy);
+  si orjson no está instalado, el módulo ``json`` estándar.
+- ``application/msgpack``: MessagePack, si el paquete ``msgpack`` está
+  instalado. Los cuerpos de petición con ese Content-Type también se
+  aceptan.
+
+Los dos codecs JSON rechazan igual los floats NaN o infinitos (no son
+JSON válido): lanzan ``ValueError`` con ``NON_FINITE_ERROR``. Los
+endpoints informan esos resultados como error antes de serializar.
+
+Los codecs son enchufables: ``register`` agrega uno nuevo por media type y
+la variable de entorno ``RESPONSE_JSON_CODEC`` ("orjson" o "json") elige
+el codec JSON por defecto. Las respuestas que ya son ``Response`` (HTML,
+texto, cuerpos precalculados) pasan sin cambios.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import math
+import os
+
+import numpy as np
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa json
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack es opcional: sin él solo se responde JSON
+    msgpack = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+NON_FINITE_ERROR = "Out of range float values are not JSON compliant"
+
+
+def _default(value):
+    """Tipos que los serializadores no conocen (NumPy y similares)."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def has_non_finite(value):
+    """True si ``value`` contiene un float NaN o infinito (en dicts, listas o arrays NumPy)."""
+    if isinstance(value, float):
+        return not math.isfinite(value)
+    if isinstance(value, dict):
+        return any(has_non_finite(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(has_non_finite(item) for item in value)
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in "fc":
+            return not np.isfinite(value).all()
+        return value.dtype.kind == "O" and any(has_non_finite(item) for item in value.ravel().tolist())
+    if isinstance(value, np.floating):
+        return not np.isfinite(value)
+    return False
+
+
+class Codec:
+    """Interfaz de un codec: convierte objetos Python en bytes y viceversa."""
+
+    media_type = None
+
+    def dumps(self, content):
+        raise NotImplementedError
+
+    def loads(self, body):
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    """JSON con el módulo estándar, igual que JSONResponse de Starlette."""
+
+    media_type = "application/json"
+
+    def dumps(self, content):
+        try:
+            return json.dumps(
+                content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"), default=_default
+            ).encode("utf-8")
+        except ValueError as e:
+            if has_non_finite(content):
+                raise ValueError(NON_FINITE_ERROR) from e
+            raise
+
+    def loads(self, body):
+        return json.loads(body)
+
+
+class OrjsonCodec(Codec):
+    media_type = "application/json"
+    OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+    def dumps(self, content):
+        body = orjson.dumps(content, default=_default, option=self.OPTIONS)
+        # orjson escribe NaN e infinitos como null: solo si aparece un null se
+        # revisa el contenido, para fallar igual que JsonCodec
+        if b"null" in body and has_non_finite(content):
+            raise ValueError(NON_FINITE_ERROR)
+        return body
+
+    def loads(self, body):
+        return orjson.loads(body)
+
+
+class MsgpackCodec(Codec):
+    media_type = "application/msgpack"
+
+    def dumps(self, content):
+        return msgpack.packb(content, default=_default, use_bin_type=True)
+
+    def loads(self, body):
+        return msgpack.unpackb(body, raw=False)
+
+
+CODECS = {}
+
+
+def register(codec, *media_types):
+    """Registra ``codec`` para su media type y los alias indicados."""
+    for media_type in (codec.media_type,) + media_types:
+        CODECS[media_type] = codec
+
+
+def _json_codec():
+    name = os.environ.get("RESPONSE_JSON_CODEC", "orjson")
+    if name == "orjson" and orjson is not None:
+        return OrjsonCodec()
+    return JsonCodec()
+
+
+DEFAULT_CODEC = _json_codec()
+register(DEFAULT_CODEC)
+if msgpack is not None:
+    register(MsgpackCodec(), *MSGPACK_TYPES[1:])
+
+
+def negotiate(accept):
+    """Codec para el encabezado Accept (el JSON por defecto si nada coincide)."""
+    if not accept:
+        return DEFAULT_CODEC
+    ranges = []
+    for position, item in enumerate(accept.split(",")):
+        media_type, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            ranges.append((-quality, position, media_type.strip().lower()))
+    for _, _, media_type in sorted(ranges):
+        codec = CODECS.get(media_type)
+        if codec is not None:
+            return codec
+    return DEFAULT_CODEC
+
+
+def _content_type(headers):
+    return headers.get("content-type", "").partition(";")[0].strip().lower()
+
+
+# Codec de respuesta de la petición en curso (lo fija NegotiatedRoute)
+_response_codec = contextvars.ContextVar("response_codec", default=None)
+
+
+def render(content):
+    """Serializa el resultado de un endpoint con el codec negociado."""
+    if isinstance(content, Response):
+        return content
+    codec = _response_codec.get() or DEFAULT_CODEC
+    return Response(content=codec.dumps(content), media_type=codec.media_type, headers={"Vary": "Accept"})
+
+
+def negotiated(endpoint):
+    """Envuelve un endpoint para que devuelva una Response ya serializada."""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            return render(await endpoint(*args, **kwargs))
+    else:
+        # Los endpoints síncronos corren en el threadpool: la serialización también
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            return render(endpoint(*args, **kwargs))
+    return wrapper
+
+
+class _DecodedBodyRequest(Request):
+    """Petición cuyo cuerpo ya fue decodificado por un codec distinto de JSON."""
+
+    def __init__(self, scope, receive, codec):
+        super().__init__(scope, receive)
+        self._codec = codec
+
+    async def json(self):
+        if not hasattr(self, "_json"):
+            self._json = self._codec.loads(await self.body())
+        return self._json
+
+
+class NegotiatedRoute(APIRoute):
+    """APIRoute que negocia el formato de la respuesta y del cuerpo."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, negotiated(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request):
+            token = _response_codec.set(negotiate(request.headers.get("accept")))
+            try:
+                codec = CODECS.get(_content_type(request.headers))
+                if codec is not None and codec.media_type != "application/json":
+                    # FastAPI solo llama a request.json() si el cuerpo es JSON
+                    scope = dict(request.scope)
+                    scope["headers"] = [
+                        (key, b"application/json" if key == b"content-type" else value)
+                        for key, value in request.scope["headers"]
+                    ]
+                    request = _DecodedBodyRequest(scope, request.receive, codec)
+                return await handler(request)
+            finally:
+                _response_codec.reset(token)
+
+        return route_handler
@@ -0,0 +1,252 @@
+"""Servidor de producción con varios procesos.
+
+La app se importa una sola vez en el proceso principal y después se crean
+los workers con ``fork``, así cada uno arranca sin volver a importar
+NumPy, Pydantic ni los modelos, y comparte esas páginas de memoria. Cada
+worker corre un ``uvicorn.Server`` propio; los endpoints síncronos usan el
+threadpool del worker, así que con N workers el cálculo usa N núcleos.
+Importar la app no crea hilos: los de escritura (log, historial, trabajos)
+arrancan en el evento startup de cada worker, ya después del fork.
+
+- Con ``SO_REUSEPORT`` (por defecto en Linux) cada worker abre su propio
+  socket en el mismo puerto y el kernel reparte las conexiones entre
+  ellos. Sin él, el proceso principal abre el socket y los workers lo
+  heredan.
+- SIGTERM o SIGINT: el proceso principal reenvía SIGTERM a los workers,
+  que dejan de aceptar conexiones y terminan las peticiones en curso
+  (``GRACEFUL_TIMEOUT``). Los que no terminan a tiempo reciben SIGKILL.
+- Un worker que muere se reemplaza; si muere apenas arranca (p. ej. el
+  puerto está ocupado) se detiene todo el servidor.
+
+Las métricas de ``/metrics`` y los contadores de ``/diagnostico`` son por
+worker.
+
+Configuración por variables de entorno:
+
+- HOST (0.0.0.0) y PORT (8080)
+- WEB_CONCURRENCY: cantidad de workers (por defecto, las CPUs disponibles
+  según la afinidad y la cuota de cgroup del contenedor)
+- REUSE_PORT: "0" desactiva ``SO_REUSEPORT``
+- BACKLOG: conexiones pendientes de aceptar por socket (2048)
+- KEEP_ALIVE_TIMEOUT: segundos que se mantiene abierta una conexión ociosa (5)
+- LIMIT_CONCURRENCY: conexiones simultáneas por worker antes de responder 503
+  (sin límite)
+- GRACEFUL_TIMEOUT: segundos para terminar las peticiones al apagar (30)
+- ACCESS_LOG: "1" activa el log de accesos de uvicorn (las peticiones ya se
+  registran en JSON con ``jsonlog``)
+- THREADPOOL_SIZE: hilos para los endpoints síncronos (lo aplica ``main``)
+
+Uso: ``python server.py`` (o ``python main.py``).
+"""
+import math
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+import uvicorn
+
+# Un worker que termina antes de este tiempo se considera un error de arranque
+MIN_WORKER_UPTIME = 1.0
+
+
+def available_cpus():
+    """CPUs que este proceso puede usar: afinidad y cuota de CPU del cgroup."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        # cgroup v2: "<cuota> <período>" o "max <período>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def options_from_env():
+    cpus = available_cpus()
+    limit_concurrency = int(os.environ.get("LIMIT_CONCURRENCY", 0))
+    return {
+        "host": os.environ.get("HOST", "0.0.0.0"),
+        "port": int(os.environ.get("PORT", 8080)),
+        "workers": int(os.environ.get("WEB_CONCURRENCY", 0)) or cpus,
+        "reuse_port": hasattr(socket, "SO_REUSEPORT") and os.environ.get("REUSE_PORT", "1") != "0",
+        "backlog": int(os.environ.get("BACKLOG", 2048)),
+        "keep_alive": int(os.environ.get("KEEP_ALIVE_TIMEOUT", 5)),
+        "limit_concurrency": limit_concurrency or None,
+        "graceful_timeout": int(os.environ.get("GRACEFUL_TIMEOUT", 30)),
+        "access_log": os.environ.get("ACCESS_LOG", "0") == "1",
+        "cpus": cpus,
+    }
+
+
+def bind_socket(host, port, backlog, reuse_port):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Launcher:
+    """Proceso principal: crea los workers, los reemplaza y los detiene."""
+
+    def __init__(self, app, host="0.0.0.0", port=8080, workers=1, reuse_port=True, backlog=2048,
+                 keep_alive=5, limit_concurrency=None, graceful_timeout=30, access_log=False, cpus=None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.reuse_port = reuse_port
+        self.backlog = backlog
+        self.keep_alive = keep_alive
+        self.limit_concurrency = limit_concurrency
+        self.graceful_timeout = graceful_timeout
+        self.access_log = access_log
+        self._socket = None
+        self._children = {}
+        self._stopping = False
+        self._deadline = None
+        self.exit_code = 0
+
+    def _config(self):
+        return uvicorn.Config(
+            self.app,
+            host=self.host,
+            port=self.port,
+            backlog=self.backlog,
+            timeout_keep_alive=self.keep_alive,
+            limit_concurrency=self.limit_concurrency,
+            timeout_graceful_shutdown=self.graceful_timeout,
+            access_log=self.access_log,
+        )
+
+    def serve_worker(self):
+        """Corre un worker en el proceso actual hasta que recibe SIGTERM o SIGINT."""
+        sock = self._socket
+        if sock is None:
+            sock = bind_socket(self.host, self.port, self.backlog, self.reuse_port)
+        # uvicorn instala sus propios manejadores de señales y drena las conexiones
+        uvicorn.Server(self._config()).run(sockets=[sock])
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                self.serve_worker()
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        self._children[pid] = time.monotonic()
+
+    def _signal(self, signum, frame):
+        if not self._stopping:
+            print(f"[server] Señal {signal.Signals(signum).name}: deteniendo {len(self._children)} workers...", flush=True)
+            self._stop()
+
+    def _stop(self):
+        self._stopping = True
+        # Los workers tienen GRACEFUL_TIMEOUT para terminar; el margen cubre el apagado de la app
+        self._deadline = time.monotonic() + self.graceful_timeout + 5
+        for pid in self._children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _reap(self):
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self._children.clear()
+                return
+            if pid == 0:
+                return
+            started = self._children.pop(pid, None)
+            if started is None or self._stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if time.monotonic() - started < MIN_WORKER_UPTIME:
+                print(f"[server] El worker {pid} terminó al arrancar (código {code}); deteniendo el servidor", flush=True)
+                self.exit_code = 1
+                self._stop()
+            else:
+                print(f"[server] El worker {pid} terminó (código {code}); se reemplaza", flush=True)
+
+    def run(self):
+        if self.workers <= 1:
+            # Un solo worker: sin proceso principal aparte
+            self.serve_worker()
+            return 0
+        if not self.reuse_port:
+            self._socket = bind_socket(self.host, self.port, self.backlog, reuse_port=False)
+        mode = "SO_REUSEPORT" if self.reuse_port else "socket compartido"
+        print(f"[server] {self.workers} workers en {self.host}:{self.port} ({mode})", flush=True)
+
+        signal.signal(signal.SIGTERM, self._signal)
+        signal.signal(signal.SIGINT, self._signal)
+        for _ in range(self.workers):
+            self._spawn()
+        while True:
+            self._reap()
+            if self._stopping:
+                if not self._children:
+                    break
+                if time.monotonic() > self._deadline:
+                    for pid in self._children:
+                        try:
+                            os.kill(pid, signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+            else:
+                while len(self._children) < self.workers:
+                    self._spawn()
+            time.sleep(0.1)
+        print("[server] Servidor detenido", flush=True)
+        return self.exit_code
+
+
+def run(app, **overrides):
+    """Inicia el servidor con la configuración del entorno (y ``overrides``)."""
+    options = {**options_from_env(), **overrides}
+    if options["workers"] > 1 and "MONTE_CARLO_WORKERS" not in os.environ:
+        # Sin configuración explícita, los pools de Monte Carlo de todos los workers no superan las CPUs
+        import montecarlo
+        montecarlo.WORKERS = max(1, min(montecarlo.WORKERS, options["cpus"] // options["workers"]))
+    return Launcher(app, **options).run()
+
+
+if __name__ == "__main__":
+    from main import app
+
+    sys.exit(run(app))
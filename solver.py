@@ -0,0 +1,212 @@
+"""Valuación inversa: qué valor de un parámetro lleva a una valuación objetivo.
+
+El solver trabaja sobre los kernels vectorizados, así que resuelve muchas
+filas (varios objetivos o varias empresas) a la vez:
+
+1. Se evalúa cada fila en una grilla de ``GRID_POINTS`` valores del
+   parámetro dentro de sus límites y se toma el primer tramo donde la
+   diferencia con el objetivo cambia de signo. Si no hay cambio de signo
+   el objetivo no es alcanzable: se informa el rango alcanzable y si los
+   límites del método (``max(5, ...)``, ``min(1.0, ...)``) dejan la
+   valuación constante en ese extremo.
+2. Dentro del tramo se itera Newton (derivada por diferencias finitas)
+   protegido por bisección: si el paso de Newton sale del intervalo o no
+   es menor que la mitad del paso anterior, se bisecta. El intervalo
+   siempre contiene la raíz.
+
+Las tasas se resuelven en decimales y sus límites no pasan de 1: los
+kernels interpretan una tasa mayor que 1 como porcentaje, lo que haría la
+función discontinua.
+"""
+import numpy as np
+
+import kernels
+
+GRID_POINTS = 65
+
+# Parámetros que se pueden despejar en cada método
+PARAMS = {
+    "vc_method": ("revenue", "growth_rate"),
+    "dcf": ("initial_cash_flow", "revenue", "growth_rate", "discount_rate", "terminal_growth_rate"),
+    "berkus": ("revenue", "growth_rate", "investment_required"),
+    "first_chicago": ("revenue", "growth_rate", "investment_required"),
+}
+
+RATE_PARAMS = ("growth_rate", "discount_rate", "terminal_growth_rate")
+# Límites por defecto de la búsqueda
+DEFAULT_BOUNDS = {
+    "revenue": (1.0, 1e12),
+    "initial_cash_flow": (1.0, 1e12),
+    "investment_required": (1.0, 1e12),
+    "growth_rate": (-0.99, 1.0),
+    "discount_rate": (0.0, 1.0),
+    "terminal_growth_rate": (-0.99, 1.0),
+}
+
+ERROR_FLAT = "La valuación no depende de {param} con los demás datos de esta fila"
+ERROR_OUT_OF_RANGE = "El objetivo está fuera del rango alcanzable [{low:.2f}, {high:.2f}] con {param} entre {lo:g} y {hi:g}"
+ERROR_PLATEAU = "; los límites del método hacen la valuación constante para {param} {op} {edge:.6g}"
+WARNING_NOT_UNIQUE = "Solución no única: la valuación es constante en un tramo que alcanza el objetivo"
+WARNING_MULTIPLE = "Hay más de una solución en los límites; se devuelve la menor"
+
+
+def validate_bounds(param, bounds):
+    """Límites de búsqueda para ``param``; lanza ValueError si no son válidos."""
+    lo, hi = DEFAULT_BOUNDS[param] if bounds is None else bounds
+    if not lo < hi:
+        raise ValueError("bounds debe ser [mínimo, máximo] con mínimo < máximo")
+    if param in RATE_PARAMS and (lo < -1 or hi > 1):
+        raise ValueError(f"Los límites de {param} van en decimales, entre -1 y 1")
+    if param not in RATE_PARAMS and lo <= 0:
+        raise ValueError(f"Los límites de {param} deben ser positivos")
+    return float(lo), float(hi)
+
+
+def _grid(param, lo, hi):
+    # Los montos se recorren en escala logarítmica, las tasas en escala lineal
+    if param in RATE_PARAMS:
+        return np.linspace(lo, hi, GRID_POINTS)
+    return np.geomspace(lo, hi, GRID_POINTS)
+
+
+def _evaluate(kernel, columns, param, values):
+    """Valuación (NaN si el kernel marca error) de cada fila en los valores dados.
+
+    ``values`` tiene forma (filas, k); cada fila de ``columns`` se repite k veces.
+    """
+    rows, k = values.shape
+    tiled = {col: np.repeat(array, k) for col, array in columns.items()}
+    kernels.set_column(tiled, param, values.ravel())
+    output = kernel(tiled)
+    valuation, errors = output[0], output[1]
+    valuation = np.where(errors == None, valuation, np.nan)  # noqa: E711
+    return valuation.reshape(rows, k), errors.reshape(rows, k)
+
+
+def _plateau_edges(kernel, columns, param, plateaus):
+    """Ubica por bisección (todas las filas a la vez) dónde empieza cada tramo constante.
+
+    Cada entrada trae un punto fuera del tramo, uno dentro y el valor constante.
+    """
+    rows = np.array([p[0] for p in plateaus])
+    outside = np.array([p[1] for p in plateaus])
+    inside = np.array([p[2] for p in plateaus])
+    extreme = np.array([p[3] for p in plateaus])
+    subset = {col: array[rows] for col, array in columns.items()}
+    for _ in range(60):
+        middle = (outside + inside) / 2
+        value, _ = _evaluate(kernel, subset, param, middle[:, None])
+        on_plateau = np.abs(value[:, 0] - extreme) <= 1e-9 * np.maximum(1.0, np.abs(extreme))
+        inside = np.where(on_plateau, middle, inside)
+        outside = np.where(on_plateau, outside, middle)
+    return inside.tolist()
+
+
+def solve(method, columns, param, targets, bounds=None, tolerance=1e-9, max_iterations=100):
+    """Despeja ``param`` para que cada fila alcance su valuación objetivo.
+
+    ``columns`` son columnas de kernel (``kernels.build_columns``) y
+    ``targets`` un array del mismo largo. Devuelve un dict de arrays/listas:
+    value, valuation, converged, iterations, residual, error y warning.
+    """
+    kernel = kernels.METHODS[method]
+    lo, hi = validate_bounds(param, bounds)
+    targets = np.asarray(targets, dtype=np.float64)
+    size = targets.size
+    grid = _grid(param, lo, hi)
+
+    error = np.full(size, None, dtype=object)
+    warning = np.full(size, None, dtype=object)
+
+    # 1. Acotar la raíz con la grilla
+    values, grid_errors = _evaluate(kernel, columns, param, np.broadcast_to(grid, (size, grid.size)))
+    diff = values - targets[:, None]
+    sign = np.sign(diff)
+    crossing = (sign[:, :-1] * sign[:, 1:] <= 0) & ~np.isnan(diff[:, :-1]) & ~np.isnan(diff[:, 1:])
+    has_root = crossing.any(axis=1)
+    first = np.argmax(crossing, axis=1)
+
+    with np.errstate(all="ignore"):
+        low = np.nanmin(values, axis=1)
+        high = np.nanmax(values, axis=1)
+    plateaus = []
+    for i in np.flatnonzero(~has_root):
+        if np.isnan(values[i]).all():
+            # Todos los puntos dieron error: se informa el del kernel
+            error[i] = grid_errors[i, 0]
+        elif high[i] - low[i] <= 1e-12 * max(1.0, abs(high[i])):
+            error[i] = ERROR_FLAT.format(param=param)
+        else:
+            error[i] = ERROR_OUT_OF_RANGE.format(low=low[i], high=high[i], param=param, lo=lo, hi=hi)
+            # Extremo más cercano al objetivo: ¿la valuación se estanca ahí?
+            row = values[i]
+            extreme = high[i] if targets[i] > high[i] else low[i]
+            flat = np.flatnonzero(np.abs(row - extreme) <= 1e-9 * max(1.0, abs(extreme)))
+            if flat.size > 1 and flat.min() > 0 and flat.max() == grid.size - 1:
+                plateaus.append((i, grid[flat.min() - 1], grid[flat.min()], extreme, ">="))
+            elif flat.size > 1 and flat.min() == 0 and flat.max() < grid.size - 1:
+                plateaus.append((i, grid[flat.max() + 1], grid[flat.max()], extreme, "<="))
+    if plateaus:
+        for (i, _, _, _, op), edge in zip(plateaus, _plateau_edges(kernel, columns, param, plateaus)):
+            error[i] += ERROR_PLATEAU.format(param=param, op=op, edge=edge)
+    warning[has_root & (crossing.sum(axis=1) > 1) & ~(diff == 0).any(axis=1)] = WARNING_MULTIPLE
+
+    # 2. Newton protegido por bisección dentro del tramo [a, b]
+    index = np.arange(size)
+    a = grid[first]
+    b = grid[np.minimum(first + 1, grid.size - 1)]
+    fa = diff[index, first]
+    x = np.where(fa == 0, a, (a + b) / 2)
+    step = b - a
+    scale = np.maximum(1.0, np.abs(targets))
+    active = has_root.copy()
+    converged = np.zeros(size, dtype=bool)
+    iterations = np.zeros(size, dtype=np.int64)
+    fx = np.full(size, np.nan)
+
+    for _ in range(max_iterations):
+        if not active.any():
+            break
+        h = 1e-7 * np.maximum(1.0, np.abs(x))
+        both, _ = _evaluate(kernel, columns, param, np.stack([x, x + h], axis=1))
+        fx = np.where(active, both[:, 0] - targets, fx)
+        derivative = (both[:, 1] - both[:, 0]) / h
+        iterations[active] += 1
+
+        done = active & ((np.abs(fx) <= tolerance * scale) | (b - a <= 1e-12 * np.maximum(1.0, np.abs(x))))
+        converged |= done
+        active &= ~done
+        if not active.any():
+            break
+
+        # Actualizar el intervalo con el signo de f(x)
+        same_side = np.sign(fx) == np.sign(fa)
+        a = np.where(active & same_side, x, a)
+        fa = np.where(active & same_side, fx, fa)
+        b = np.where(active & ~same_side, x, b)
+
+        with np.errstate(all="ignore"):
+            newton = x - fx / derivative
+        use_newton = (
+            np.isfinite(newton) & (newton > a) & (newton < b) & (np.abs(newton - x) <= step / 2)
+        )
+        new_x = np.where(use_newton, newton, (a + b) / 2)
+        step = np.where(active, np.abs(new_x - x), step)
+        x = np.where(active, new_x, x)
+
+    # Raíz dentro de un tramo plano: cualquier valor del tramo sirve
+    plateau = converged & (fx == 0) & ((diff == 0).sum(axis=1) > 1)
+    warning[plateau] = WARNING_NOT_UNIQUE
+    not_converged = has_root & ~converged
+    error[not_converged] = f"No convergió en {max_iterations} iteraciones"
+
+    solved = converged | not_converged
+    return {
+        "value": np.where(solved, x, np.nan),
+        "valuation": np.where(solved, fx + targets, np.nan),
+        "converged": converged,
+        "iterations": iterations,
+        "residual": np.where(solved, fx, np.nan),
+        "error": error,
+        "warning": warning,
+    }
@@ -0,0 +1,127 @@
+"""Respuestas estáticas precalculadas.
+
+El contenido se guarda en memoria junto con sus variantes comprimidas
+(gzip y, si el paquete ``brotli`` está instalado, brotli) y un ETag fuerte
+por variante. Cada petición solo elige la variante según
+``Accept-Encoding`` y responde 304 si ``If-None-Match`` coincide.
+
+``StaticFile`` además vuelve a leer el archivo cuando cambia su mtime,
+así el cliente de prueba se puede editar sin reiniciar el servidor.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se ofrece gzip
+    brotli = None
+
+# Cuerpos más chicos no ganan nada al comprimirse
+MIN_COMPRESS_SIZE = 512
+
+
+def json_bytes(content):
+    """Serializa igual que JSONResponse de Starlette."""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _choose_encoding(accept_encoding, variants):
+    """Variante preferida (br, gzip, identity) entre las aceptadas por el cliente."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for coding in ("br", "gzip"):
+        if coding in variants and accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return "identity"
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match usa comparación débil
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class StaticBody:
+    """Cuerpo fijo con variantes comprimidas y ETag precalculados."""
+
+    def __init__(self, content, media_type, cache_control="no-cache"):
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self._variants = None
+        if content is not None:
+            self._load(content)
+
+    def _load(self, content):
+        digest = hashlib.sha256(content).hexdigest()[:32]
+        variants = {"identity": (content, f'"{digest}"')}
+        if len(content) >= MIN_COMPRESS_SIZE:
+            variants["gzip"] = (gzip.compress(content, compresslevel=9, mtime=0), f'"{digest}-gzip"')
+            if brotli is not None:
+                variants["br"] = (brotli.compress(content, quality=11), f'"{digest}-br"')
+        # Se reemplaza el dict completo: una petición concurrente ve la versión anterior o la nueva
+        self._variants = variants
+
+    def response(self, request):
+        variants = self._variants
+        encoding = _choose_encoding(request.headers.get("accept-encoding", ""), variants)
+        body, etag = variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type=self.media_type, headers=headers)
+
+
+class StaticFile(StaticBody):
+    """Archivo servido desde memoria; se recarga cuando cambia en disco.
+
+    El mtime se consulta como mucho una vez cada ``check_interval``
+    segundos. El archivo se lee en la primera petición, así que un archivo
+    faltante no impide arrancar la app.
+    """
+
+    def __init__(self, path, media_type, cache_control="no-cache", check_interval=1.0):
+        super().__init__(None, media_type, cache_control)
+        self.path = path
+        self.check_interval = check_interval
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._variants is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._variants is not None and now - self._checked_at < self.check_interval:
+                return
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature != self._signature:
+                with open(self.path, "rb") as f:
+                    self._load(f.read())
+                self._signature = signature
+            self._checked_at = now
+
+    def response(self, request):
+        self._refresh()
+        return super().response(request)
@@ -0,0 +1,8 @@
+"""Configuración común: el entorno se fija antes de que los tests importen ``main``."""
+import os
+import tempfile
+
+# La cola de trabajos de main.py no debe crear jobs.db en el repositorio
+os.environ.setdefault("JOBS_DB", os.path.join(tempfile.mkdtemp(), "jobs.db"))
+os.environ.setdefault("LOG_SAMPLE_RATE", "0")
+os.environ.setdefault("VALUATION_CACHE_SIZE", "0")
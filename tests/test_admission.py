@@ -0,0 +1,98 @@
+"""Control de admisión: 429 por cliente, 503 por clase saturada y rutas exentas."""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import admission
+import main
+
+STARTUP = {"name": "Acme", "revenue": 1000000, "growth_rate": 0.2, "investment_required": 500000}
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def saturated(monkeypatch):
+    # La clase valuation sin lugar libre y sin cola: la siguiente petición se rechaza
+    limiter = main.admission_control.limiters["valuation"]
+    monkeypatch.setattr(limiter, "in_use", limiter.limit)
+    monkeypatch.setattr(limiter, "queue_size", 0)
+    return limiter
+
+
+def test_saturated_class_returns_503_with_retry_after(client, saturated):
+    response = client.post("/valuate/vc_method/", json=STARTUP)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(max(1, int(saturated.timeout)))
+    assert "cola de espera" in response.json()["error"]
+    # Otras clases y las rutas exentas siguen respondiendo
+    assert client.get("/status").status_code == 200
+    assert client.get("/metrics").status_code == 200
+    assert client.post("/valuate/monte-carlo/", json={**STARTUP, "draws": 1000}).status_code == 200
+
+
+def test_rate_limit_returns_429_with_retry_after(client, monkeypatch):
+    monkeypatch.setattr(main.admission_control, "rate_limiter", admission.RateLimiter(rate=0.5, burst=2))
+    statuses = [client.post("/valuate/vc_method/", json=STARTUP).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+    response = client.post("/valuate/vc_method/", json=STARTUP)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert "límite de uso" in response.json()["error"]
+    assert client.get("/status").status_code == 200
+
+
+def test_limits_from_env(monkeypatch):
+    monkeypatch.setenv("ADMISSION_LIMITS", "valuation=2,batch=1,simulation=1")
+    monkeypatch.setenv("ADMISSION_QUEUES", "valuation=3")
+    monkeypatch.setenv("ADMISSION_QUEUE_TIMEOUT", "0.5")
+    monkeypatch.setenv("RATE_LIMIT_PER_SECOND", "4")
+    controller = admission.from_env()
+    stats = controller.stats()
+    assert stats["classes"]["valuation"] == {"limit": 2, "in_use": 0, "waiting": 0, "queue": 3}
+    assert stats["classes"]["batch"]["queue"] == 0
+    assert stats["rate_limit"] == {"rate": 4.0, "burst": 8.0, "clients": 0}
+
+
+def test_queued_request_runs_when_a_slot_is_released():
+    async def run():
+        limiter = admission.ConcurrencyLimiter("valuation", limit=2, queue_size=1, timeout=1.0)
+        assert await limiter.acquire(2) == 2
+        waiting = asyncio.create_task(limiter.acquire(1))
+        await asyncio.sleep(0)
+        # La cola (de una plaza) está ocupada: la siguiente se rechaza de inmediato
+        with pytest.raises(admission.Rejected) as rejected:
+            await limiter.acquire(1)
+        assert (rejected.value.status, rejected.value.reason) == (503, "queue_full")
+        limiter.release(2)
+        assert await waiting == 1
+        return limiter.stats()
+
+    assert asyncio.run(run()) == {"limit": 2, "in_use": 1, "waiting": 0, "queue": 1}
+
+
+def test_queue_timeout_is_rejected():
+    async def run():
+        limiter = admission.ConcurrencyLimiter("batch", limit=1, queue_size=4, timeout=0.05)
+        await limiter.acquire(1)
+        with pytest.raises(admission.Rejected) as rejected:
+            await limiter.acquire(1)
+        return rejected.value, limiter.stats()
+
+    error, stats = asyncio.run(run())
+    assert (error.status, error.reason) == (503, "queue_timeout")
+    assert stats["waiting"] == 0 and stats["in_use"] == 1
+
+
+def test_cost_estimates():
+    assert admission.valuation_cost({"include_schedule": True, "projection_years": 1000}) == 11
+    assert admission.valuation_cost({"include_schedule": "x", "projection_years": 1000}) == 1
+    assert admission.all_methods_cost({"methods": ["dcf"], "monte_carlo": {"draws": 500000}}) == 7
+    assert admission.sensitivity_cost({"x": {"steps": 200}, "y": {"values": list(range(100))}}) == 3
+    assert admission.size_cost(None) == admission.UNKNOWN_SIZE_COST
+    assert admission.size_cost(3 * admission.BATCH_BYTES_PER_UNIT) == 4
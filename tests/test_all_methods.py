@@ -0,0 +1,107 @@
+"""/valuate/all/: combinación ponderada, validación de opciones y ejecución."""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+STARTUP = {
+    "name": "Acme",
+    "revenue": 1000000,
+    "growth_rate": 0.2,
+    "investment_required": 500000,
+    "initial_cash_flow": 100000,
+}
+ENDPOINTS = {
+    "vc_method": "/valuate/vc_method/",
+    "dcf": "/valuate/dcf/",
+    "berkus": "/valuate/berkus/",
+    "first_chicago": "/valuate/first_chicago/",
+}
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def _all(client, **options):
+    return client.post("/valuate/all/", json={**STARTUP, **options}).json()
+
+
+def test_results_match_the_individual_endpoints(client):
+    response = _all(client)
+    assert list(response["results"]) == list(main.ALL_METHODS)
+    for method, path in ENDPOINTS.items():
+        assert response["results"][method] == client.post(path, json=STARTUP).json()
+
+
+def test_weighted_blend(client):
+    weights = {"vc_method": 3, "dcf": 1, "berkus": 0, "first_chicago": 0}
+    response = _all(client, weights=weights)
+    results = response["results"]
+    expected = (3 * results["vc_method"]["valuation"] + results["dcf"]["valuation"]) / 4
+    assert response["blended"] == {"valuation": round(expected, 2), "weights": {"vc_method": 0.75, "dcf": 0.25}}
+
+
+def test_blend_skips_methods_with_errors(client):
+    # Con initial_cash_flow negativo DCF devuelve un error y la combinación queda solo con Berkus
+    response = _all(client, methods=["dcf", "berkus"], initial_cash_flow=-5)
+    assert "error" in response["results"]["dcf"]
+    assert response["blended"]["weights"] == {"berkus": 1.0}
+    assert response["blended"]["valuation"] == response["results"]["berkus"]["valuation"]
+
+
+def test_all_weights_zero(client):
+    response = _all(client, methods=["vc_method"], weights={"vc_method": 0})
+    assert response["blended"]["valuation"] == 0 and "error" in response["blended"]
+
+
+@pytest.mark.parametrize("options, error", [
+    ({"methods": ["dcf", "otro"]}, "Métodos no soportados: ['otro']"),
+    ({"weights": {"otro": 1}}, "Pesos para métodos no soportados: ['otro']"),
+    ({"weights": {"dcf": -1}}, "Los pesos deben ser números no negativos"),
+    ({"weights": {"dcf": "1"}}, "Los pesos deben ser números no negativos"),
+    ({"monte_carlo": 5}, "monte_carlo debe ser un objeto"),
+])
+def test_invalid_options(client, options, error):
+    response = _all(client, **options)
+    assert error in response["error"] and "results" not in response
+
+
+@pytest.fixture
+def dispatched(monkeypatch):
+    calls = []
+    run_in_threadpool = main.run_in_threadpool
+
+    async def counting(function, *args):
+        calls.append(function)
+        return await run_in_threadpool(function, *args)
+
+    monkeypatch.setattr(main, "run_in_threadpool", counting)
+    return calls
+
+
+def test_short_requests_run_inline(client, dispatched):
+    _all(client, include_schedule=True, projection_years=main.CONCURRENT_DCF_YEARS - 1)
+    assert dispatched == []
+
+
+def test_long_schedule_runs_in_the_threadpool(client, dispatched):
+    options = {"include_schedule": True, "projection_years": main.CONCURRENT_DCF_YEARS}
+    threaded = _all(client, methods=["dcf", "berkus"], **options)
+    assert len(dispatched) == 2
+    assert len(threaded["results"]["dcf"]["schedule"]["year"]) == main.CONCURRENT_DCF_YEARS
+
+    dispatched.clear()
+    # include_schedule que no es true no pide la tabla ni sale del event loop
+    inline = _all(client, methods=["dcf", "berkus"], **{**options, "include_schedule": "x"})
+    assert dispatched == []
+    assert "schedule" not in inline["results"]["dcf"]
+    assert inline["results"]["dcf"]["valuation"] == threaded["results"]["dcf"]["valuation"]
+    assert inline["results"]["berkus"] == threaded["results"]["berkus"]
+
+
+def test_monte_carlo_runs_alongside(client, dispatched):
+    response = _all(client, methods=["vc_method"], monte_carlo={"draws": 1000, "seed": 1, "methods": ["dcf"]})
+    assert len(dispatched) == 1
+    assert response["monte_carlo"]["draws"] == 1000 and "dcf" in response["monte_carlo"]["results"]
@@ -0,0 +1,118 @@
+"""Valuación masiva en streaming: corte de líneas, límite por línea y CSV."""
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import bulk
+import main
+
+HEADER = b"name,revenue,growth_rate,investment_required,initial_cash_flow,discount_rate,projection_years\n"
+ROWS = [
+    {"name": "Acme", "revenue": "1000000", "growth_rate": "20", "investment_required": "500000"},
+    {"name": "Flujo", "initial_cash_flow": "100000", "growth_rate": "0.2", "discount_rate": "12", "projection_years": "8"},
+    {"name": "Negativa", "revenue": "-1", "growth_rate": "0.1"},
+]
+FIELDS = HEADER.decode().strip().split(",")
+
+
+def _csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, FIELDS, lineterminator="\n")
+    writer.writerows(rows)
+    return HEADER + buffer.getvalue().encode()
+
+
+def _lines(blocks, max_line_bytes=bulk.MAX_LINE_BYTES):
+    async def stream():
+        for block in blocks:
+            yield block
+
+    async def collect():
+        return [line async for line in bulk.iter_lines(stream(), max_line_bytes)]
+
+    return asyncio.run(collect())
+
+
+def _split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_lines_split_across_blocks(size):
+    data = b'{"a": 1}\r\n\n{"b": 2}\n   \n{"c": 3}'
+    assert _lines(_split(data, size)) == [b'{"a": 1}', b'{"b": 2}', b'{"c": 3}']
+
+
+@pytest.mark.parametrize("size", [3, 16, 100])
+def test_long_line_is_dropped_up_to_the_next_newline(size):
+    data = b"corta\n" + b"x" * 50 + b"\nsigue\n" + b"y" * 50
+    lines = _lines(_split(data, size), max_line_bytes=20)
+    assert lines == [b"corta", bulk.LINE_TOO_LONG, b"sigue", bulk.LINE_TOO_LONG]
+
+
+def test_line_cap_through_the_endpoint():
+    client = TestClient(main.app)
+    long_row = json.dumps({"name": "x" * (bulk.MAX_LINE_BYTES + 10), "revenue": 1}).encode()
+    body = b'{"name": "a", "revenue": 1000000, "growth_rate": 0.2}\n' + long_row + b'\n{"name": "b", "revenue": 2000000, "growth_rate": 0.2}\n'
+    response = client.post(
+        "/valuate/bulk/?methods=vc_method", content=_split(body, 4096), headers={"Content-Type": "application/x-ndjson"}
+    )
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["row"] for record in records] == [0, 1, 2]
+    assert records[1] == {"row": 1, "name": None, "vc_method": 0.0, "errors": {"vc_method": bulk.ERROR_LINE_TOO_LONG}}
+    assert [record["name"] for record in records] == ["a", None, "b"]
+    assert "errors" not in records[0] and "errors" not in records[2]
+
+
+def test_csv_stream_matches_the_endpoints():
+    client = TestClient(main.app)
+    body = _csv(ROWS * 5) + b'mala,"sin cerrar\n'
+    response = client.post(
+        "/valuate/bulk/?chunk_size=4&methods=vc_method,dcf", content=_split(body, 37), headers={"Content-Type": "text/csv"}
+    )
+    assert response.status_code == 200 and response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["row"] for record in records] == list(range(16))
+    for record, row in zip(records, ROWS * 5):
+        payload = {key: value for key, value in row.items() if value}
+        for method, path in (("vc_method", "/valuate/vc_method/"), ("dcf", "/valuate/dcf/")):
+            expected = client.post(path, json=payload).json()
+            assert record[method] == expected["valuation"]
+            assert record.get("errors", {}).get(method) == expected.get("error")
+    assert records[-1]["errors"] == {"vc_method": bulk.ERROR_INVALID_ROW, "dcf": bulk.ERROR_INVALID_ROW}
+
+
+def test_csv_output():
+    client = TestClient(main.app)
+    response = client.post(
+        "/valuate/bulk/?output_format=csv&methods=berkus", content=_csv(ROWS), headers={"Content-Type": "text/csv"}
+    )
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["row", "name", "berkus", "errors"]
+    assert [row[:2] for row in rows[1:]] == [["0", "Acme"], ["1", "Flujo"], ["2", "Negativa"]]
+    single = client.post("/valuate/berkus/", json={"name": "Acme", "revenue": 1000000, "growth_rate": 20, "investment_required": 500000})
+    assert float(rows[1][2]) == single.json()["valuation"]
+
+
+def test_csv_header_too_long():
+    client = TestClient(main.app)
+    body = b"name," + b"x" * (bulk.MAX_LINE_BYTES + 1) + b"\nAcme,1\n"
+    response = client.post("/valuate/bulk/?methods=vc_method", content=body, headers={"Content-Type": "text/csv"})
+    record = json.loads(response.text)
+    assert record["errors"] == {"vc_method": bulk.ERROR_HEADER_TOO_LONG}
+
+
+@pytest.mark.parametrize("query, headers, error", [
+    ("?methods=otro", {"Content-Type": "text/csv"}, "Métodos no soportados"),
+    ("", {"Content-Type": "application/xml"}, "Formato de entrada no soportado"),
+    ("?output_format=xml", {"Content-Type": "text/csv"}, "Formato de salida no soportado"),
+    ("?chunk_size=0", {"Content-Type": "text/csv"}, "chunk_size debe estar entre"),
+])
+def test_invalid_options(query, headers, error):
+    response = TestClient(main.app).post("/valuate/bulk/" + query, content=b"", headers=headers)
+    assert error in response.json()["error"]
@@ -0,0 +1,104 @@
+"""Caché de resultados: claves normalizadas, TTL, LRU y contadores."""
+import pytest
+from fastapi.testclient import TestClient
+
+import cache
+import main
+
+STARTUP = {"name": "Acme", "revenue": 1000000, "growth_rate": 0.2, "investment_required": 500000}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def result_cache(monkeypatch):
+    backend = cache.MemoryCache(max_size=100, ttl=60)
+    monkeypatch.setattr(main, "result_cache", backend)
+    return backend
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/valuate/vc_method/", STARTUP),
+    ("/valuate/berkus/", STARTUP),
+    ("/valuate/first_chicago/", STARTUP),
+    ("/valuate/dcf/", {"initial_cash_flow": 100000, "growth_rate": 0.2, "discount_rate": 0.15}),
+])
+def test_percent_and_fraction_share_an_entry(result_cache, path, body):
+    client = TestClient(main.app)
+    fraction = client.post(path, json=body).json()
+    percent = client.post(path, json={**body, "growth_rate": 20}).json()
+    assert percent == fraction and "error" not in fraction
+    stats = result_cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_different_inputs_do_not_collide(result_cache):
+    client = TestClient(main.app)
+    first = client.post("/valuate/vc_method/", json=STARTUP).json()
+    second = client.post("/valuate/vc_method/", json={**STARTUP, "growth_rate": 0.3}).json()
+    assert first != second
+    # vc_method y berkus no comparten claves con los mismos datos
+    client.post("/valuate/berkus/", json=STARTUP)
+    assert result_cache.stats()["size"] == 3 and result_cache.hits == 0
+
+
+def test_ttl_expiry(clock):
+    backend = cache.MemoryCache(max_size=10, ttl=60)
+    backend.set("a", {"valuation": 1})
+    clock.now += 59
+    assert backend.get("a") == {"valuation": 1}
+    clock.now += 2
+    assert backend.get("a") is None
+    stats = backend.stats()
+    assert (stats["size"], stats["expirations"], stats["hits"], stats["misses"]) == (0, 1, 1, 1)
+
+
+def test_lru_eviction(clock):
+    backend = cache.MemoryCache(max_size=2, ttl=60)
+    backend.set("a", 1)
+    backend.set("b", 2)
+    # Leer "a" la vuelve la más reciente: la próxima en salir es "b"
+    assert backend.get("a") == 1
+    backend.set("c", 3)
+    assert backend.get("b") is None
+    assert (backend.get("a"), backend.get("c")) == (1, 3)
+    assert backend.stats()["evictions"] == 1
+
+
+def test_hit_rate_counters():
+    backend = cache.MemoryCache()
+    assert backend.stats()["hit_rate"] == 0.0
+    backend.get("x")
+    backend.set("x", 1)
+    for _ in range(3):
+        backend.get("x")
+    stats = backend.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (3, 1, 0.75)
+    backend.clear()
+    assert backend.stats()["size"] == 0
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("VALUATION_CACHE_SIZE", "0")
+    assert isinstance(cache.from_env(), cache.NullCache)
+    monkeypatch.setenv("VALUATION_CACHE_SIZE", "5")
+    monkeypatch.setenv("VALUATION_CACHE_TTL", "1.5")
+    backend = cache.from_env()
+    assert (backend.max_size, backend.ttl) == (5, 1.5)
+    # Un backend "modulo:Clase" recibe los mismos max_size y ttl
+    monkeypatch.setenv("VALUATION_CACHE_BACKEND", "cache:MemoryCache")
+    backend = cache.from_env()
+    assert isinstance(backend, cache.MemoryCache) and (backend.max_size, backend.ttl) == (5, 1.5)
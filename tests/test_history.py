@@ -0,0 +1,91 @@
+"""Historial de valuaciones en SQLite: registro, consultas y agregados."""
+import time
+
+import numpy as np
+import pytest
+
+import history
+
+
+@pytest.fixture
+def backend(tmp_path):
+    store = history.SQLiteHistory(str(tmp_path / "history.db"), batch_size=50)
+    store.start()
+    yield store
+    store.close()
+
+
+def _flushed(store):
+    # close() escribe lo pendiente y detiene el hilo; las consultas siguen funcionando
+    store.close()
+    return store
+
+
+def test_record_and_query(backend):
+    backend.record("vc_method", "Acme", {"revenue": 1000000, "growth_rate": 0.2}, {"valuation": 2000000.0})
+    backend.record(
+        "first_chicago", "Acme", {"revenue": 1000000},
+        {"valuation": 9000000.0, "scenarios": {"success": {"probability": 0.2, "valuation": 1.7e7}}},
+    )
+    backend.record("vc_method", "Otra", {"revenue": 5}, {"valuation": 10.0})
+    _flushed(backend)
+
+    items = backend.query(name="Acme")
+    assert [item["method"] for item in items] == ["first_chicago", "vc_method"]
+    assert items[0]["scenarios"]["success"]["valuation"] == 1.7e7
+    assert items[1]["inputs"] == {"revenue": 1000000, "growth_rate": 0.2}
+    assert [item["name"] for item in backend.query(method="vc_method")] == ["Otra", "Acme"]
+    assert backend.query(since=time.time() + 60) == []
+    assert len(backend.query(limit=1, offset=1)) == 1
+    assert backend.stats()["written"] == 3
+
+
+def test_aggregate_matches_numpy(backend):
+    values = [float(v) for v in np.random.default_rng(0).uniform(1e5, 1e7, 101)]
+    for value in values:
+        backend.record("berkus", None, {}, {"valuation": value})
+    backend.record("dcf", None, {}, {"valuation": 42.0})
+    _flushed(backend)
+
+    stats = backend.aggregate(percentiles=(5, 25, 75, 95))
+    assert stats["dcf"]["count"] == 1 and stats["dcf"]["median"] == 42.0
+    berkus = stats["berkus"]
+    assert berkus["count"] == 101
+    assert berkus["mean"] == round(float(np.mean(values)), 2)
+    assert berkus["median"] == round(float(np.median(values)), 2)
+    for p in (5, 25, 75, 95):
+        assert berkus["percentiles"][f"p{p}"] == round(float(np.percentile(values, p)), 2)
+    assert backend.aggregate(method="dcf").keys() == {"dcf"}
+
+
+def test_non_finite_valuation_does_not_drop_the_batch(backend):
+    backend.record("first_chicago", "a", {}, {"valuation": 1.0})
+    backend.record("first_chicago", "b", {}, {"valuation": float("nan")})
+    backend.record("first_chicago", "c", {}, {"valuation": float("inf")})
+    backend.record("first_chicago", "d", {}, {"valuation": 2.0})
+    _flushed(backend)
+
+    assert sorted(item["name"] for item in backend.query()) == ["a", "d"]
+    stats = backend.stats()
+    assert (stats["written"], stats["dropped"], stats["rejected"]) == (2, 0, 2)
+
+
+def test_integrity_error_retries_row_by_row(backend):
+    # Una fila que viola NOT NULL en un lote: solo se pierde esa fila
+    now = time.time()
+    batch = [
+        (now, "a", "vc_method", 1.0, {}, None),
+        (now, "b", "vc_method", None, {}, None),
+        (now, "c", "vc_method", 3.0, {}, None),
+    ]
+    backend._flush(batch)
+    assert sorted(item["name"] for item in backend.query()) == ["a", "c"]
+    assert (backend.written, backend.dropped) == (2, 1)
+
+
+def test_null_history_is_disabled():
+    backend = history.NullHistory()
+    assert not backend.enabled
+    backend.record("dcf", None, {}, {"valuation": float("nan")})
+    assert backend.query() == [] and backend.aggregate() == {}
+    assert history.SQLiteHistory.enabled
@@ -0,0 +1,139 @@
+"""Cola de trabajos en SQLite: ejecución, cancelación, reencolado y expiración."""
+import threading
+import time
+
+import pytest
+
+import jobs
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "el trabajo no llegó al estado esperado"
+        time.sleep(0.01)
+
+
+def _status(manager, job_id):
+    view = manager.get(job_id)
+    return None if view is None else view["status"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return jobs.JobStore(str(tmp_path / "jobs.db"))
+
+
+@pytest.fixture
+def make_manager(tmp_path, monkeypatch):
+    monkeypatch.setenv("JOBS_DB", str(tmp_path / "jobs.db"))
+    monkeypatch.setenv("JOB_WORKERS", "1")
+    managers = []
+
+    def make(runners, **overrides):
+        manager = jobs.from_env(runners)
+        for key, value in {"poll_interval": 0.05, **overrides}.items():
+            setattr(manager, key, value)
+        managers.append(manager)
+        return manager
+
+    yield make
+    for manager in managers:
+        manager.stop()
+
+
+def test_submit_runs_to_completion(make_manager):
+    def double(payload, context):
+        context.progress(0.5)
+        return {"value": payload["value"] * 2}
+
+    manager = make_manager({"double": double})
+    manager.start()
+    job_id = manager.submit("double", {"value": 21})
+    _wait_for(lambda: _status(manager, job_id) == "succeeded")
+
+    job = manager.get(job_id, include_result=True)
+    assert job["result"] == {"value": 42}
+    assert job["progress"] == 1 and job["attempts"] == 1 and job["expires_at"] > job["finished_at"]
+    with pytest.raises(KeyError):
+        manager.submit("otro", {})
+
+
+def test_error_result_marks_the_job_failed(make_manager):
+    manager = make_manager({"bad": lambda payload, context: {"error": "sin datos"}})
+    manager.start()
+    job_id = manager.submit("bad", {})
+    _wait_for(lambda: _status(manager, job_id) == "failed")
+    assert manager.get(job_id)["error"] == "sin datos"
+
+
+def test_cancel_running_job(make_manager):
+    started = threading.Event()
+
+    def slow(payload, context):
+        started.set()
+        while True:
+            context.check_cancelled()
+            time.sleep(0.01)
+
+    manager = make_manager({"slow": slow})
+    manager.start()
+    job_id = manager.submit("slow", {})
+    assert started.wait(5)
+    assert manager.cancel(job_id)["status"] == "running"
+    _wait_for(lambda: _status(manager, job_id) == "cancelled")
+    assert manager.get(job_id, include_result=True)["result"] is None
+
+
+def test_cancel_queued_job_is_immediate(make_manager):
+    manager = make_manager({"noop": lambda payload, context: {}})
+    job_id = manager.submit("noop", {})
+    assert manager.cancel(job_id)["status"] == "cancelled"
+    assert manager.store.claim("w-0") is None
+
+
+def test_queue_full(make_manager):
+    manager = make_manager({"noop": lambda payload, context: {}}, max_pending=2)
+    manager.submit("noop", {})
+    manager.submit("noop", {})
+    with pytest.raises(jobs.JobQueueFull):
+        manager.submit("noop", {})
+
+
+def test_stale_heartbeat_requeues_then_fails(store):
+    store.insert("a", "double", {"value": 1})
+    assert store.claim("muerto-0")["id"] == "a"
+    # Un latido viejo: el proceso que lo corría ya no existe
+    store._conn().execute("UPDATE jobs SET heartbeat_at = ? WHERE id = 'a'", (time.time() - 120,))
+
+    store.requeue_stale(stale_seconds=60, max_attempts=2, ttl=3600)
+    row = store.get("a")
+    assert (row["status"], row["worker"], row["attempts"]) == ("queued", None, 1)
+
+    # El segundo intento también se interrumpe y agota los intentos
+    assert store.claim("muerto-0")["attempts"] == 2
+    store._conn().execute("UPDATE jobs SET heartbeat_at = ? WHERE id = 'a'", (time.time() - 120,))
+    store.requeue_stale(stale_seconds=60, max_attempts=2, ttl=3600)
+    row = store.get("a")
+    assert (row["status"], row["error"]) == ("failed", jobs.ERROR_INTERRUPTED)
+
+
+def test_fresh_heartbeat_is_not_requeued(store):
+    store.insert("a", "double", {})
+    store.claim("vivo-0")
+    store.heartbeat("vivo")
+    store.requeue_stale(stale_seconds=60, max_attempts=3, ttl=3600)
+    assert store.get("a")["status"] == "running"
+
+
+def test_expired_jobs_are_hidden_and_purged(store):
+    store.insert("viejo", "double", {})
+    store.insert("nuevo", "double", {})
+    store.claim("w-0")
+    store.finish("viejo", "w-0", "succeeded", {"value": 1}, None, ttl=0)
+    assert store.get("viejo") is None
+    assert [row["id"] for row in store.list()] == ["nuevo"]
+
+    store.purge_expired()
+    count = store._conn().execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+    assert count == 1 and store.counts()["succeeded"] == 0
@@ -0,0 +1,116 @@
+"""Log JSON de peticiones: muestreo, captura truncada del cuerpo y escritor en segundo plano."""
+import json
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import jsonlog
+
+
+@pytest.fixture
+def logged(tmp_path, monkeypatch):
+    """Crea una app con el middleware configurado por entorno; devuelve (cliente, leer registros)."""
+    path = tmp_path / "requests.log"
+    monkeypatch.setenv("LOG_FILE", str(path))
+    writers = []
+
+    def make(**env):
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+        writer = jsonlog.writer_from_env()
+        writer.start()
+        writers.append(writer)
+        app = FastAPI()
+
+        @app.post("/echo")
+        async def echo(request: Request):
+            return {"size": len(await request.body())}
+
+        @app.get("/ok")
+        def ok():
+            return {"ok": True}
+
+        app.add_middleware(jsonlog.RequestLogMiddleware, writer=writer, **jsonlog.middleware_options_from_env())
+
+        def records():
+            writer.close()
+            return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+        return TestClient(app), records
+
+    yield make
+    for writer in writers:
+        writer.close()
+
+
+def test_request_record(logged):
+    client, records = logged(LOG_SAMPLE_RATE="1")
+    client.get("/ok?x=1")
+    [record] = records()
+    assert record["message"] == "request" and record["level"] == "info"
+    assert (record["method"], record["path"], record["query"], record["status"]) == ("GET", "/ok", "x=1", 200)
+    assert record["duration_ms"] >= 0 and "body" not in record
+
+
+def test_sample_rate_zero_keeps_errors(logged):
+    client, records = logged(LOG_SAMPLE_RATE="0", LOG_ERROR_SAMPLE_RATE="1")
+    for _ in range(5):
+        client.get("/ok")
+    client.get("/no-existe")
+    assert [(r["path"], r["status"], r["level"]) for r in records()] == [("/no-existe", 404, "warning")]
+
+
+def test_partial_sample_rate(logged, monkeypatch):
+    draws = iter([0.1, 0.9, 0.2, 0.8, 0.3, 0.7])
+    monkeypatch.setattr(jsonlog.random, "random", lambda: next(draws))
+    client, records = logged(LOG_SAMPLE_RATE="0.5")
+    for i in range(6):
+        client.get(f"/ok?i={i}")
+    assert [r["query"] for r in records()] == ["i=0", "i=2", "i=4"]
+
+
+def test_body_is_truncated_at_the_cap(logged):
+    client, records = logged(LOG_SAMPLE_RATE="1", LOG_BODY_MAX_BYTES="16")
+    body = b"a" * 10 + b"b" * 90
+
+    def chunks():
+        # El cuerpo llega en varios mensajes: la captura se corta en el límite
+        for i in range(0, len(body), 7):
+            yield body[i:i + 7]
+
+    assert client.post("/echo", content=chunks()).json() == {"size": 100}
+    client.post("/echo", content=b"corto")
+    truncated, short = records()
+    assert (truncated["body"], truncated["body_bytes"], truncated["body_truncated"]) == ("a" * 10 + "b" * 6, 100, True)
+    assert (short["body"], short["body_bytes"], short["body_truncated"]) == ("corto", 5, False)
+
+
+def test_truncated_multibyte_body_is_still_text(logged):
+    # El límite corta la primera "ñ" (dos bytes) a la mitad
+    client, records = logged(LOG_SAMPLE_RATE="1", LOG_BODY_MAX_BYTES="2")
+    client.post("/echo", content="aññ".encode("utf-8"))
+    [record] = records()
+    assert record["body"] == "a\ufffd"
+    assert record["body_bytes"] == 5 and record["body_truncated"]
+
+
+def test_bodies_disabled(logged):
+    client, records = logged(LOG_SAMPLE_RATE="1", LOG_BODIES="0")
+    client.post("/echo", content=b"secreto")
+    [record] = records()
+    assert "body" not in record and record["status"] == 200
+
+
+def test_writer_drops_when_the_queue_is_full(tmp_path):
+    with open(tmp_path / "log", "w", encoding="utf-8") as stream:
+        writer = jsonlog.JsonLogWriter(stream=stream, queue_size=2)
+        # Sin start() nada consume la cola
+        for i in range(5):
+            writer.event("info", "evento", i=i)
+        assert writer.stats() == {"written": 0, "dropped": 3, "pending": 2}
+        writer.start()
+        writer.close()
+    lines = [json.loads(line) for line in (tmp_path / "log").read_text().splitlines()]
+    assert [line["i"] for line in lines] == [0, 1] and lines[0]["level"] == "info"
+    assert writer.stats()["written"] == 2
@@ -0,0 +1,151 @@
+"""Canal WebSocket de recálculo en vivo: actualizaciones parciales, configuración y errores."""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import live
+import main
+
+STARTUP = {
+    "name": "Acme",
+    "revenue": 1000000,
+    "growth_rate": 0.2,
+    "initial_cash_flow": 100000,
+    "projection_years": 5,
+}
+
+
+def _post(method, data):
+    return TestClient(main.app).post(f"/valuate/{method}/", json=data).json()
+
+
+@pytest.fixture
+def ws():
+    with TestClient(main.app).websocket_connect("/ws/valuate?methods=vc_method,dcf") as websocket:
+        ready = websocket.receive_json()
+        assert ready["type"] == "ready" and ready["methods"] == ["vc_method", "dcf"]
+        yield websocket
+
+
+def test_update_recalculates_selected_methods(ws):
+    ws.send_json({"type": "update", "seq": 1, "data": STARTUP})
+    result = ws.receive_json()
+    assert result["type"] == "result" and result["seq"] == 1
+    assert result["results"]["vc_method"] == _post("vc_method", STARTUP)
+    assert result["results"]["dcf"]["valuation"] == _post("dcf", STARTUP)["valuation"]
+    assert set(result["blended"]["weights"]) == {"vc_method", "dcf"}
+
+
+def test_partial_update_keeps_previous_fields(ws):
+    ws.send_json({"type": "update", "seq": 1, "data": STARTUP})
+    ws.receive_json()
+    ws.send_json({"type": "update", "seq": 2, "data": {"revenue": 2000000}})
+    result = ws.receive_json()
+    assert result["seq"] == 2
+    assert result["results"]["vc_method"] == _post("vc_method", {**STARTUP, "revenue": 2000000})
+
+    # null quita el campo: el resultado es el de los datos sin revenue
+    ws.send_json({"type": "update", "seq": 3, "data": {"revenue": None}})
+    without_revenue = {key: value for key, value in STARTUP.items() if key != "revenue"}
+    assert ws.receive_json()["results"]["vc_method"] == _post("vc_method", without_revenue)
+
+
+def test_invalid_field_reports_error_and_keeps_state(ws):
+    ws.send_json({"type": "update", "seq": 1, "data": STARTUP})
+    ws.receive_json()
+    ws.send_json({"type": "update", "seq": 2, "data": {"revenue": "mucho"}})
+    error = ws.receive_json()
+    assert error["type"] == "error" and error["seq"] == 2 and "revenue" in error["errors"]
+
+
+def test_configure_changes_methods_and_weights(ws):
+    ws.send_json({"type": "update", "seq": 1, "data": STARTUP})
+    ws.receive_json()
+    ws.send_json({"type": "configure", "methods": ["vc_method"], "weights": {"vc_method": 2}})
+    result = ws.receive_json()
+    assert set(result["results"]) == {"vc_method"}
+    assert result["blended"]["valuation"] == result["results"]["vc_method"]["valuation"]
+
+
+@pytest.mark.parametrize("message, error", [
+    ({"methods": 5}, "methods debe ser una lista"),
+    ({"methods": "dcf"}, "methods debe ser una lista"),
+    ({"methods": ["dcf", 3]}, "methods debe ser una lista"),
+    ({"weights": ["dcf", 1]}, "weights debe ser un objeto"),
+    ({"methods": ["nope"]}, "Métodos no soportados"),
+    ({"weights": {"dcf": -1}}, "no negativos"),
+])
+def test_bad_configure_replies_error_and_keeps_session(ws, message, error):
+    ws.send_json({"type": "configure", **message})
+    reply = ws.receive_json()
+    assert reply["type"] == "error" and error in reply["error"]
+    # La conexión sigue abierta y la configuración no cambió
+    ws.send_json({"type": "update", "seq": 7, "data": STARTUP})
+    result = ws.receive_json()
+    assert result["seq"] == 7 and set(result["results"]) == {"vc_method", "dcf"}
+
+
+def test_invalid_messages_reply_error(ws):
+    ws.send_text("no es json")
+    assert ws.receive_json()["type"] == "error"
+    ws.send_json({"type": "update", "seq": 1, "data": [1]})
+    assert ws.receive_json() == {"type": "error", "seq": 1, "error": "data debe ser un objeto"}
+    ws.send_json({"type": "otro"})
+    assert "no soportado" in ws.receive_json()["error"]
+
+
+def test_unknown_query_methods_close_the_socket():
+    from starlette.websockets import WebSocketDisconnect
+
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with TestClient(main.app).websocket_connect("/ws/valuate?methods=nope") as websocket:
+            websocket.receive_json()
+    assert exc.value.code == 1008
+
+
+class _Socket:
+    """WebSocket en memoria: entrega los mensajes de golpe y guarda lo enviado."""
+
+    def __init__(self, messages):
+        self.incoming = asyncio.Queue()
+        for message in messages:
+            self.incoming.put_nowait(message)
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+    async def receive_text(self):
+        return await self.incoming.get()
+
+
+def test_burst_of_updates_is_coalesced():
+    import json
+
+    calls = []
+
+    def compute(values, methods, weights):
+        calls.append(dict(values))
+        return {"results": {}, "values": values}
+
+    async def run():
+        messages = [json.dumps({"type": "update", "seq": i, "data": {"revenue": 1000 + i}}) for i in range(1, 6)]
+        socket = _Socket(messages)
+        session = live.LiveSession(["vc_method"], {})
+        task = asyncio.create_task(live.serve(socket, session, compute, {"vc_method": None}))
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            if any('"result"' in text for text in socket.sent):
+                break
+        task.cancel()
+        return [json.loads(text) for text in socket.sent]
+
+    sent = asyncio.run(run())
+    results = [message for message in sent if message["type"] == "result"]
+    # Las cinco actualizaciones llegaron juntas: un solo cálculo con el estado más reciente
+    assert len(calls) == 1 and calls[0] == {"revenue": 1005.0}
+    assert [message["seq"] for message in results] == [5]
@@ -0,0 +1,99 @@
+"""Métricas Prometheus: etiquetas por alias de ruta, errores de valuación y fragmentos por hilo."""
+import threading
+
+from fastapi.testclient import TestClient
+
+import main
+import metrics
+
+
+def _scrape(client):
+    """{"nombre{etiquetas}": valor} de /metrics (los contadores son globales: se comparan diferencias)."""
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+    samples = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith("#"):
+            key, _, value = line.rpartition(" ")
+            samples[key] = float(value)
+    return samples
+
+
+def _delta(before, after, key):
+    return after.get(key, 0) - before.get(key, 0)
+
+
+def test_route_aliases_and_error_counters():
+    client = TestClient(main.app)
+    before = _scrape(client)
+    client.post("/valuate/dcf/", json={"initial_cash_flow": 100000, "growth_rate": 0.1})
+    client.post("/valuate/dcf-method/", json={"initial_cash_flow": 100000, "growth_rate": 0.1})
+    # Error de valuación con status 200: lo cuenta count_errors
+    client.post("/valuate/dcf-method/", json={"initial_cash_flow": -1, "growth_rate": 0.1})
+    client.get("/no-existe")
+    after = _scrape(client)
+
+    dcf = 'method="dcf_method",route="/valuate/dcf/"'
+    alias = 'method="dcf_method",route="/valuate/dcf-method/"'
+    assert _delta(before, after, f'valuation_http_requests_total{{{dcf},status="200"}}') == 1
+    assert _delta(before, after, f'valuation_http_requests_total{{{alias},status="200"}}') == 2
+    assert _delta(before, after, f"valuation_http_errors_total{{{dcf}}}") == 0
+    assert _delta(before, after, f"valuation_http_errors_total{{{alias}}}") == 1
+    assert _delta(before, after, f"valuation_http_request_duration_seconds_count{{{alias}}}") == 2
+    assert _delta(before, after, f'valuation_http_request_duration_seconds_bucket{{{alias},le="+Inf"}}') == 2
+    unmatched = 'valuation_http_requests_total{method="none",route="unmatched",status="404"}'
+    assert _delta(before, after, unmatched) == 1
+
+
+def test_input_model_counters():
+    client = TestClient(main.app)
+    before = _scrape(client)
+    client.post("/valuate/berkus/", json={"growth_rate": 0.2})
+    after = _scrape(client)
+    model = 'method="berkus",model="DefaultStartupData"'
+    assert _delta(before, after, f"valuation_input_model_total{{{model}}}") == 1
+    assert _delta(before, after, f"valuation_fallback_defaults_total{{{model}}}") == 1
+
+
+def test_count_errors_marks_only_error_results():
+    registry = metrics.Registry()
+    state = {"status": 200, "error": False}
+    token = metrics._request_state.set(state)
+    try:
+        metrics.count_errors(lambda: {"valuation": 1})()
+        assert not state["error"]
+        metrics.count_errors(lambda: {"valuation": 0, "error": "x"})()
+        assert state["error"]
+    finally:
+        metrics._request_state.reset(token)
+    # Sin petición en curso no falla
+    metrics.count_errors(lambda: {"error": "x"})()
+    assert registry.collect() == ({}, {})
+
+
+def test_shards_from_many_threads_are_summed():
+    registry = metrics.Registry(buckets=(0.1, 1.0))
+
+    def work():
+        for _ in range(1000):
+            registry.inc("valuation_live_updates_total", ())
+        registry.observe("valuation_admission_wait_seconds", (("route_class", "batch"),), 0.5)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    text = registry.render()
+    assert "valuation_live_updates_total 8000" in text
+    assert 'valuation_admission_wait_seconds_bucket{route_class="batch",le="0.1"} 0' in text
+    assert 'valuation_admission_wait_seconds_bucket{route_class="batch",le="1.0"} 8' in text
+    assert 'valuation_admission_wait_seconds_count{route_class="batch"} 8' in text
+    assert "# TYPE valuation_admission_wait_seconds histogram" in text
+
+
+def test_label_values_are_escaped():
+    registry = metrics.Registry()
+    registry.inc("x_total", (("route", 'a"b\\c\nd'),))
+    assert 'x_total{route="a\\"b\\\\c\\nd"} 1' in registry.render()
@@ -0,0 +1,75 @@
+"""Simulación Monte Carlo: reproducibilidad con semilla y creación del pool."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+import montecarlo
+
+PARAMS = {
+    "growth_rate": {"dist": "normal", "mean": 0.2, "std": 0.05},
+    "discount_rate": {"dist": "uniform", "low": 0.1, "high": 0.2},
+    "exit_multiple": {"dist": "triangular", "low": 5, "mode": 8, "high": 12},
+    "failure_probability": {"dist": "beta", "alpha": 2, "beta": 5},
+    "revenue": 1000000,
+    "investment_required": 500000,
+    "terminal_growth_rate": 0.03,
+    "projection_years": 5,
+    "methods": ["dcf", "first_chicago"],
+}
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # Varios bloques chicos, para que el pool reciba más de uno
+    monkeypatch.setattr(montecarlo, "CHUNK_SIZE", 1000)
+    monkeypatch.setattr(montecarlo, "PARALLEL_THRESHOLD", 1)
+    yield
+    montecarlo.shutdown_pool()
+
+
+def _run(draws, seed):
+    return asyncio.run(montecarlo.run(PARAMS, draws, seed, [5, 50, 95], 10))
+
+
+def test_same_seed_same_result_in_pool_and_inline(small_chunks, monkeypatch):
+    monkeypatch.setattr(montecarlo, "WORKERS", 2)
+    pooled = _run(4500, seed=7)
+    assert montecarlo._pool is not None
+
+    monkeypatch.setattr(montecarlo, "WORKERS", 1)
+    inline = _run(4500, seed=7)
+    assert pooled == inline
+    assert _run(4500, seed=8) != inline
+
+
+def test_pool_is_created_once_across_threads(monkeypatch):
+    created = []
+
+    class SlowPool:
+        # Un constructor lento deja a todos los hilos dentro de la inicialización a la vez
+        def __init__(self, **kwargs):
+            time.sleep(0.05)
+            created.append(self)
+
+        def shutdown(self, **kwargs):
+            pass
+
+    monkeypatch.setattr(montecarlo, "ProcessPoolExecutor", SlowPool)
+    montecarlo.shutdown_pool()
+    barrier = threading.Barrier(8)
+    pools = []
+
+    def get():
+        barrier.wait()
+        pools.append(montecarlo._get_pool())
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1 and all(pool is created[0] for pool in pools)
+    montecarlo.shutdown_pool()
+    assert montecarlo._pool is None
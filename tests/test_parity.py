@@ -0,0 +1,219 @@
+"""Paridad entre los endpoints individuales y las rutas vectorizadas.
+
+Cada cuerpo de la tabla se valúa con los endpoints de ``main.py`` (que
+eligen el modelo de entrada con ``schemas.parse_input``) y con los
+kernels: ``/valuate/batch/`` en formato de filas y columnas y los bloques
+de ``/valuate/bulk/``. Valuaciones, escenarios y errores deben coincidir.
+"""
+import json
+
+import numpy as np
+import pytest
+
+import bulk
+import engine
+import kernels
+import main
+import score
+
+STARTUP = {"name": "Acme", "revenue": 1500000, "growth_rate": 0.35, "investment_required": 800000}
+
+PAYLOADS = [
+    # Modelos completos
+    STARTUP,
+    {**STARTUP, "growth_rate": 35},
+    {"initial_cash_flow": 120000, "growth_rate": 0.25, "discount_rate": 0.12, "terminal_growth_rate": 0.02, "projection_years": 8},
+    {"initial_cash_flow": 120000, "growth_rate": 25, "discount_rate": 12, "terminal_growth_rate": 2},
+    # Faltan campos: cada endpoint completa con sus propios valores por defecto
+    {"revenue": 1000000, "growth_rate": 0.2},
+    {"revenue": 500000, "growth_rate": 0.8, "investment_required": 2000000},
+    {"initial_cash_flow": 171428.57, "growth_rate": 0.2, "revenue": 50},
+    {"initial_cash_flow": 200000, "growth_rate": 0.15, "investment_required": 1000000},
+    {"name": "Solo nombre"},
+    {"revenue": 2000000},
+    {"growth_rate": 0.3},
+    {},
+    # Errores de negocio
+    {**STARTUP, "revenue": -1},
+    {"initial_cash_flow": -5, "growth_rate": 0.1},
+    {"initial_cash_flow": 0, "growth_rate": 0.1, "revenue": 1000000},
+    # Tasas límite y horizontes
+    {"initial_cash_flow": 100000, "growth_rate": 0.2, "discount_rate": 0.02, "terminal_growth_rate": 0.03},
+    {"initial_cash_flow": 100000, "growth_rate": 0.15, "discount_rate": 0.15, "projection_years": 40},
+    {"initial_cash_flow": 100000, "growth_rate": 0.2, "projection_years": 0},
+    {"initial_cash_flow": 100000, "growth_rate": 0.2, "projection_years": "12"},
+    # include_schedule es una opción de la respuesta: no cambia el modelo elegido
+    {**STARTUP, "initial_cash_flow": 100000, "include_schedule": "x"},
+    {"initial_cash_flow": 100000, "growth_rate": 0.2, "include_schedule": True},
+    # Valores que no validan: el endpoint pasa al siguiente candidato
+    {**STARTUP, "growth_rate": "alto"},
+    {**STARTUP, "revenue": None},
+    {**STARTUP, "name": 5},
+    {"revenue": 1000000, "growth_rate": 0.2, "initial_cash_flow": None},
+    {"initial_cash_flow": 100000, "growth_rate": 0.2, "projection_years": 7.5},
+    {"initial_cash_flow": 100000, "growth_rate": 0.2, "projection_years": "1e3"},
+    {"initial_cash_flow": 100000, "growth_rate": 0.2, "projection_years": "5.0"},
+    {"initial_cash_flow": 100000, "growth_rate": 0.2, "projection_years": 9.3e18},
+    {"name": "Textos", "revenue": "1500000", "growth_rate": "0.3", "investment_required": "200000"},
+    # NaN e infinito validan como float (Python acepta NaN/Infinity en JSON)
+    {**STARTUP, "growth_rate": float("nan")},
+    {**STARTUP, "revenue": "nan"},
+    {"initial_cash_flow": float("inf"), "growth_rate": 0.2},
+    {"initial_cash_flow": 100000, "growth_rate": 0.2, "revenue": 1000000, "discount_rate": float("nan")},
+]
+
+METHODS = ("vc_method", "dcf", "berkus", "first_chicago")
+ENDPOINTS = {
+    "vc_method": main.vc_method,
+    "dcf": main.dcf_method,
+    "berkus": main.berkus_method,
+    "first_chicago": main.first_chicago_method,
+}
+# Mensajes que los endpoints y los kernels comparten
+SHARED_ERRORS = (kernels.ERROR_REVENUE, kernels.ERROR_CASH_FLOW, kernels.ERROR_NOT_FINITE)
+
+
+def _expected(method, payload):
+    return ENDPOINTS[method](dict(payload))
+
+
+def _same_number(a, b):
+    return a == b or (a != a and b != b)
+
+
+def _assert_same(method, payload, expected, valuation, error, scenarios=None):
+    context = f"{method} {payload}"
+    assert _same_number(valuation, expected["valuation"]), context
+    if "error" in expected:
+        assert error is not None, context
+        if expected["error"] in SHARED_ERRORS:
+            assert error == expected["error"], context
+    else:
+        assert error is None, context
+    if scenarios is not None and "scenarios" in expected:
+        for name, values in expected["scenarios"].items():
+            for key, value in values.items():
+                assert _same_number(scenarios[name][key], value), context
+
+
+def _batch_rows(output, method, i):
+    result = output["results"][method]
+    errors = {e["index"]: e["error"] for e in result["errors"]}
+    scenarios = None
+    if "scenarios" in result:
+        scenarios = {
+            name: {"probability": values["probability"][i], "valuation": values["valuation"][i]}
+            for name, values in result["scenarios"].items()
+        }
+    return result["valuations"][i], errors.get(i), scenarios
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_batch_rows_match_endpoints(method):
+    # Todas las formas en un solo lote: cada fila elige su modelo por separado
+    output = main.batch_method(main.BatchData(methods=[method], rows=PAYLOADS))
+    assert output["count"] == len(PAYLOADS)
+    for i, payload in enumerate(PAYLOADS):
+        valuation, error, scenarios = _batch_rows(output, method, i)
+        expected = _expected(method, payload)
+        if "error" in expected:
+            scenarios = None
+        _assert_same(method, payload, expected, valuation, error, scenarios)
+
+
+@pytest.mark.parametrize("method", METHODS)
+@pytest.mark.parametrize("payload", PAYLOADS)
+def test_single_row_batch_matches_endpoint(method, payload):
+    output = main.batch_method(main.BatchData(methods=[method], rows=[payload]))
+    valuation, error, scenarios = _batch_rows(output, method, 0)
+    _assert_same(method, payload, _expected(method, payload), valuation, error, scenarios)
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_batch_columns_match_endpoints(method):
+    # En formato columnar un campo ausente se envía como null
+    numeric = [p for p in PAYLOADS if all(v is not None for v in p.values())]
+    fields = sorted({key for payload in numeric for key in payload})
+    columns = {field: [payload.get(field) for payload in numeric] for field in fields}
+    output = main.batch_method(main.BatchData(methods=[method], columns=columns))
+    for i, payload in enumerate(numeric):
+        valuation, error, _ = _batch_rows(output, method, i)
+        _assert_same(method, payload, _expected(method, payload), valuation, error)
+
+
+def test_bulk_ndjson_matches_endpoints():
+    lines = [json.dumps(payload).encode() for payload in PAYLOADS]
+    _, results = bulk.score_chunk(None, lines, "ndjson", METHODS)
+    for method in METHODS:
+        valuations, errors = results[method]
+        for i, payload in enumerate(PAYLOADS):
+            _assert_same(method, payload, _expected(method, payload), round(valuations[i], 2), errors[i])
+
+
+# (flujo inicial, crecimiento, descuento, crecimiento terminal, años)
+DCF_CASES = [
+    (100000.0, 0.2, 0.15, 0.03, 5),
+    (100000.0, 0.15, 0.15, 0.03, 40),
+    (120000.0, 0.25, 0.12, 0.02, 0),
+    (120000.0, 0.25, 0.12, 0.02, -3),
+    (1.0, 3.0, 0.1, 0.02, 5000),
+    (1e5, -0.5, -1.7, -2.0, 5),
+    (1e5, float("nan"), 0.15, 0.03, 5),
+]
+
+
+@pytest.mark.parametrize("case", DCF_CASES)
+def test_dcf_scalar_matches_array(case):
+    # La rama escalar de dcf_closed_form debe dar los mismos bits que los kernels
+    scalar = engine.dcf_closed_form(*case)
+    array = engine.dcf_closed_form(*(np.array([v], dtype=float) for v in case))[0]
+    assert scalar == array or (scalar != scalar and array != array)
+
+
+def _cli_payloads():
+    # Los cuerpos que se pueden escribir como columnas .npy (números y un nombre
+    # de texto); en un .npy un NaN es un valor ausente
+    payloads = []
+    for payload in PAYLOADS:
+        try:
+            numbers = [float(v) for k, v in payload.items() if k != "name"]
+        except (TypeError, ValueError):
+            continue
+        # Un texto se escribe como su float: "1e3" no valida como entero pero 1000.0 sí
+        years = payload.get("projection_years")
+        if isinstance(years, str) and not kernels._is_int(years):
+            continue
+        if isinstance(payload.get("name", ""), str) and not any(v != v for v in numbers):
+            payloads.append(payload)
+    return payloads
+
+
+def test_score_cli_matches_endpoints(tmp_path):
+    payloads = _cli_payloads()
+    portfolio = tmp_path / "cartera"
+    portfolio.mkdir()
+    for field in kernels.FIELDS:
+        if field == "name":
+            column = np.array([p.get("name", "") for p in payloads])
+        else:
+            column = np.array([float(p.get(field, "nan")) for p in payloads])
+        np.save(portfolio / f"{field}.npy", column)
+
+    output = tmp_path / "resultados"
+    # Bloques chicos para que la cartera se reparta en varios
+    score.run(str(portfolio), str(output), workers=1, chunk_size=4, scenarios=True)
+    for method in METHODS:
+        valuations = np.load(output / f"{method}.npy")
+        codes = np.load(output / f"{method}.error.npy")
+        for i, payload in enumerate(payloads):
+            scenarios = None
+            if method == "first_chicago":
+                scenarios = {
+                    name: {
+                        "probability": float(np.load(output / f"{method}.{name}_probability.npy")[i]),
+                        "valuation": float(np.load(output / f"{method}.{name}_valuation.npy")[i]),
+                    }
+                    for name in ("success", "base", "failure")
+                }
+            expected = _expected(method, payload)
+            _assert_same(method, payload, expected, float(valuations[i]), engine.ERROR_MESSAGES[codes[i]], scenarios)
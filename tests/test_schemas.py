@@ -0,0 +1,122 @@
+"""Selección del modelo de entrada: cada cadena de candidatos y el caché por petición."""
+import pytest
+from pydantic import ValidationError
+
+import main
+import schemas
+from schemas import DCFData, DefaultDCFData, DefaultStartupData, StartupData, VCData
+
+STARTUP = {"name": "Acme", "revenue": 1000000, "growth_rate": 0.2, "investment_required": 500000}
+CASH_FLOW = {"initial_cash_flow": 100000, "growth_rate": 0.2}
+
+
+# (método, cuerpo, modelo elegido)
+CHAINS = [
+    ("vc_method", STARTUP, StartupData),
+    ("vc_method", CASH_FLOW, DCFData),
+    ("vc_method", {"revenue": 1000000, "growth_rate": 0.2}, VCData),
+    # StartupData no valida (name no es texto): se pasa al siguiente candidato
+    ("vc_method", {**STARTUP, **CASH_FLOW, "name": 5}, DCFData),
+    ("dcf", {**STARTUP, **CASH_FLOW}, DCFData),
+    ("dcf", STARTUP, StartupData),
+    ("dcf", {**STARTUP, "initial_cash_flow": "x"}, StartupData),
+    ("dcf", {"revenue": 5}, DefaultDCFData),
+    ("berkus", STARTUP, StartupData),
+    ("berkus", CASH_FLOW, DCFData),
+    ("berkus", {"revenue": 5}, DefaultStartupData),
+    ("first_chicago", {"growth_rate": 0.5}, DefaultStartupData),
+]
+
+
+@pytest.mark.parametrize("method, data, model", CHAINS)
+def test_chain_picks_the_first_valid_candidate(method, data, model):
+    parsed = schemas.parse_input(method, data)
+    assert type(parsed) is model
+    assert schemas.select_candidate(method, frozenset(data), _invalid(data)) == (model, True)
+
+
+def _invalid(data):
+    invalid = set()
+    for name, value in data.items():
+        try:
+            schemas.FIELD_ADAPTERS[name].validate_python(value)
+        except ValidationError:
+            invalid.add(name)
+    return frozenset(invalid)
+
+
+def test_berkus_falls_back_to_defaults_without_the_body():
+    # initial_cash_flow inválido y sin growth_rate: solo queda el respaldo que ignora los datos
+    data = {"initial_cash_flow": "x", "revenue": "y"}
+    parsed = schemas.parse_input("berkus", data)
+    assert parsed == DefaultStartupData()
+    assert schemas.select_candidate("berkus", frozenset(data), frozenset(data)) == (DefaultStartupData, False)
+
+
+@pytest.mark.parametrize("method, data, model", [
+    ("vc_method", {}, VCData),
+    ("vc_method", {"revenue": "x", "growth_rate": 0.2}, VCData),
+    ("dcf", {"growth_rate": "alto"}, DefaultDCFData),
+    ("dcf", {"initial_cash_flow": "x", "growth_rate": 0.2}, DefaultDCFData),
+])
+def test_last_candidate_error_is_raised(method, data, model):
+    with pytest.raises(ValidationError) as exc:
+        schemas.parse_input(method, data)
+    assert exc.value.title == model.model_config.get("title", model.__name__)
+    assert schemas.select_candidate(method, frozenset(data), _invalid(data)) is None
+
+
+def test_models_pass_through():
+    model = DCFData(**CASH_FLOW)
+    assert schemas.parse_input("dcf", model) is model
+
+
+def test_shared_validates_each_model_once():
+    shared = {}
+    data = {**STARTUP, "initial_cash_flow": 100000}
+    vc = schemas.parse_input("vc_method", data, shared)
+    berkus = schemas.parse_input("berkus", data, shared)
+    dcf = schemas.parse_input("dcf", data, shared)
+    assert vc is berkus and type(vc) is StartupData
+    assert type(dcf) is DCFData
+    assert set(shared) == {(StartupData, True), (DCFData, True)}
+
+
+def test_shared_caches_validation_errors():
+    shared = {}
+    data = {**STARTUP, "growth_rate": "alto"}
+    with pytest.raises(ValidationError):
+        schemas.parse_input("vc_method", data, shared)
+    assert isinstance(shared[(StartupData, True)], ValidationError)
+    assert isinstance(shared[(VCData, True)], ValidationError)
+    with pytest.raises(ValidationError):
+        schemas.parse_input("vc_method", data, shared)
+
+
+def test_construct_input_matches_parse_input():
+    for method, data, model in CHAINS:
+        if _invalid(data):
+            continue  # construct_input recibe campos ya validados
+        constructed = schemas.construct_input(method, data)
+        assert type(constructed) is model and constructed == schemas.parse_input(method, data)
+
+
+def test_startup_inputs_are_reused_only_for_the_same_model():
+    shared = {}
+    data = schemas.parse_input("berkus", {**STARTUP, "growth_rate": 20}, shared)
+    assert main._startup_inputs(data, shared) == (1000000, 0.2, 500000)
+    assert shared["startup_inputs"][StartupData][0] is data
+
+    # Otro objeto del mismo modelo (como los que crea construct_input) no usa el valor guardado
+    other = StartupData(**{**STARTUP, "revenue": 5})
+    assert main._startup_inputs(other, shared) == (5, 0.2, 500000)
+    assert main._startup_inputs(DCFData(**CASH_FLOW), shared) == (100000, 0.2, 500000)
+    assert set(shared["startup_inputs"]) == {StartupData, DCFData}
+
+
+def test_live_compute_with_distinct_models_per_method():
+    # construct_input crea un modelo nuevo por método: cada uno usa sus propios datos
+    values = {"revenue": 1000000, "growth_rate": 0.3, "investment_required": 100000}
+    output = main._live_compute(values, ["vc_method", "berkus", "first_chicago"], {})
+    for method, path in (("vc_method", main._vc_method), ("berkus", main._berkus_method), ("first_chicago", main._first_chicago_method)):
+        assert output["results"][method] == path(dict(values))
@@ -0,0 +1,95 @@
+"""Análisis de sensibilidad: la grilla repite celda a celda las reglas del endpoint."""
+import pytest
+from fastapi.testclient import TestClient
+
+import engine
+import main
+
+BASE = {"initial_cash_flow": 100000, "growth_rate": 20, "terminal_growth_rate": 3}
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def _grid(client, method="dcf", base=BASE, **axes):
+    return client.post("/valuate/sensitivity/", json={"method": method, "base": base, **axes}).json()
+
+
+def test_cells_match_the_endpoint(client):
+    grid = _grid(
+        client,
+        x={"param": "discount_rate", "start": 1, "stop": 20, "steps": 8},
+        y={"param": "growth_rate", "values": [0.1, 15, 40]},
+    )
+    assert len(grid["valuations"]) == 8 and all(len(row) == 3 for row in grid["valuations"])
+    for i, x in enumerate(grid["x"]["values"]):
+        for j, y in enumerate(grid["y"]["values"]):
+            single = client.post("/valuate/dcf/", json={**BASE, "discount_rate": x, "growth_rate": y}).json()
+            assert grid["valuations"][i][j] == single["valuation"]
+
+
+def test_percent_and_fraction_give_the_same_cells(client):
+    # 20 y 0.2 son la misma tasa; 1 ya es una fracción (100%)
+    grid = _grid(
+        client,
+        x={"param": "growth_rate", "values": [20, 0.2, 1]},
+        y={"param": "discount_rate", "values": [15, 0.15]},
+    )
+    valuations = grid["valuations"]
+    assert valuations[0] == valuations[1]
+    assert valuations[0][0] == valuations[0][1]
+    expected = engine.dcf_valuation(100000, *engine.dcf_rates(0.2, 0.15, 0.03), 5)
+    assert valuations[0][0] == round(expected, 2)
+    assert valuations[2][0] == round(engine.dcf_valuation(100000, 1.0, 0.15, 0.03, 5), 2)
+    # Los valores de los ejes se devuelven como llegaron
+    assert grid["x"]["values"] == [20, 0.2, 1]
+
+
+def test_discount_not_above_terminal_growth_is_raised(client):
+    # Con descuento <= crecimiento terminal se usa terminal + 1 punto, como en /valuate/dcf/
+    grid = _grid(
+        client,
+        x={"param": "discount_rate", "values": [0.01, 0.03, 0.04]},
+        y={"param": "terminal_growth_rate", "values": [0.03]},
+    )
+    guarded = round(engine.dcf_valuation(100000, 0.2, 0.04, 0.03, 5), 2)
+    assert [row[0] for row in grid["valuations"]] == [guarded, guarded, guarded]
+    assert grid["errors"] == []
+
+
+def test_errors_are_reported_per_cell(client):
+    grid = _grid(
+        client, method="vc_method", base={"revenue": 1e6},
+        x={"param": "revenue", "values": [-1, 1e6]},
+        y={"param": "growth_rate", "values": [0.1, 30]},
+    )
+    assert grid["valuations"][0] == [0.0, 0.0]
+    assert grid["valuations"][1] == [
+        client.post("/valuate/vc_method/", json={"revenue": 1e6, "growth_rate": g}).json()["valuation"] for g in (0.1, 30)
+    ]
+    assert grid["errors"] == [
+        {"x_index": 0, "y_index": j, "error": engine.ERROR_REVENUE} for j in (0, 1)
+    ]
+
+
+def test_projection_years_are_truncated(client):
+    grid = _grid(
+        client,
+        x={"param": "projection_years", "values": [5.9, 10]},
+        y={"param": "growth_rate", "values": [0.2]},
+    )
+    assert grid["x"]["values"] == [5.0, 10.0]
+    single = client.post("/valuate/dcf/", json={**BASE, "projection_years": 5}).json()
+    assert grid["valuations"][0][0] == single["valuation"]
+
+
+@pytest.mark.parametrize("axes, error", [
+    ({"x": {"param": "investment_required", "values": [1]}, "y": {"param": "growth_rate", "values": [1]}}, "Parámetro no soportado"),
+    ({"x": {"param": "growth_rate", "values": [1]}, "y": {"param": "growth_rate", "values": [2]}}, "ejes deben variar parámetros distintos"),
+    ({"x": {"param": "growth_rate"}, "y": {"param": "discount_rate", "values": [1]}}, "indicar values o start/stop"),
+    ({"x": {"param": "growth_rate", "start": 0, "stop": 1, "steps": 1000}, "y": {"param": "discount_rate", "start": 0, "stop": 1, "steps": 1000}}, "excede el máximo"),
+])
+def test_invalid_grids(client, axes, error):
+    assert error in _grid(client, **axes)["error"]
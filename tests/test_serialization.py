@@ -0,0 +1,48 @@
+"""Codecs de respuesta: los dos codecs JSON rechazan igual los floats no finitos."""
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import engine
+import main
+import serialization
+
+JSON_CODECS = [serialization.JsonCodec()]
+if serialization.orjson is not None:
+    JSON_CODECS.append(serialization.OrjsonCodec())
+
+NON_FINITE = [
+    {"valuation": float("nan")},
+    {"valuations": [1.0, float("inf")]},
+    {"results": {"dcf": {"valuations": np.array([1.0, -np.inf])}}},
+    {"valuation": np.float64("nan")},
+]
+
+
+@pytest.mark.parametrize("codec", JSON_CODECS, ids=lambda c: type(c).__name__)
+@pytest.mark.parametrize("content", NON_FINITE)
+def test_json_codecs_reject_non_finite(codec, content):
+    with pytest.raises(ValueError, match=serialization.NON_FINITE_ERROR):
+        codec.dumps(content)
+
+
+@pytest.mark.parametrize("codec", JSON_CODECS, ids=lambda c: type(c).__name__)
+def test_json_codecs_write_the_same_document(codec):
+    content = {"valuation": 1.5, "error": None, "values": np.array([1.0, 2.5]), "name": "null", "n": np.int64(3)}
+    assert json.loads(codec.dumps(content)) == {"valuation": 1.5, "error": None, "values": [1.0, 2.5], "name": "null", "n": 3}
+    assert codec.loads(codec.dumps({"a": [1, 2]})) == {"a": [1, 2]}
+
+
+def test_non_finite_result_is_an_error_not_null():
+    # NaN es válido en el cuerpo (float de Pydantic) pero el resultado no se puede escribir en JSON
+    client = TestClient(main.app)
+    body = '{"name": "Acme", "revenue": 1000000, "growth_rate": NaN, "investment_required": 500000}'
+    response = client.post("/valuate/first_chicago/", content=body, headers={"Content-Type": "application/json"})
+    assert response.status_code == 200
+    assert response.json() == {"valuation": 0, "error": engine.ERROR_NOT_FINITE}
+
+    response = client.post("/valuate/vc_method/", content='{"revenue": Infinity, "growth_rate": 0.2}',
+                           headers={"Content-Type": "application/json"})
+    assert response.json() == {"valuation": 0, "error": engine.ERROR_NOT_FINITE}
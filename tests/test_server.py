@@ -0,0 +1,82 @@
+"""Servidor con varios workers: arranque con fork, peticiones y apagado con SIGTERM."""
+import json
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(url, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                return json.loads(response.read())
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def _post(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.loads(response.read())
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="server.py crea los workers con fork")
+def test_two_workers_serve_and_stop_on_sigterm(tmp_path):
+    port = _free_port()
+    env = {
+        **os.environ,
+        "HOST": "127.0.0.1",
+        "PORT": str(port),
+        "WEB_CONCURRENCY": "2",
+        "GRACEFUL_TIMEOUT": "5",
+        "JOBS_DB": str(tmp_path / "jobs.db"),
+        "VALUATION_HISTORY_DB": str(tmp_path / "history.db"),
+        "LOG_FILE": str(tmp_path / "requests.log"),
+        "LOG_SAMPLE_RATE": "1",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "server.py"], cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        _get(base + "/status")
+        body = {"name": "Acme", "revenue": 1000000, "growth_rate": 0.2, "investment_required": 500000}
+        for _ in range(20):
+            assert _post(base + "/valuate/vc_method/", body)["valuation"] > 0
+    finally:
+        process.send_signal(signal.SIGTERM)
+        output, _ = process.communicate(timeout=30)
+
+    assert process.returncode == 0, output
+    assert "2 workers" in output and "Servidor detenido" in output
+    # Los hilos de escritura corren en cada worker: el historial y el log recibieron las peticiones
+    with sqlite3.connect(tmp_path / "history.db") as conn:
+        assert conn.execute("SELECT COUNT(*) FROM valuations").fetchone()[0] == 20
+    lines = [json.loads(line) for line in (tmp_path / "requests.log").read_text().splitlines()]
+    assert sum(1 for line in lines if line.get("path") == "/valuate/vc_method/") == 20
+
+
+def test_importing_the_app_starts_no_threads(tmp_path):
+    # server.py hace fork después de importar main: el proceso principal no debe tener hilos
+    env = {**os.environ, "JOBS_DB": str(tmp_path / "jobs.db"), "VALUATION_HISTORY_DB": str(tmp_path / "history.db")}
+    code = "import threading, main; print(threading.active_count())"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "1"
@@ -0,0 +1,108 @@
+"""Valuación inversa: convergencia, objetivos inalcanzables y mesetas."""
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import engine
+import kernels
+import main
+import solver
+
+STARTUP = {"name": "Acme", "revenue": 1000000, "growth_rate": 0.2, "investment_required": 500000}
+DCF = {"initial_cash_flow": 100000, "growth_rate": 0.1, "discount_rate": 0.15}
+
+
+def _solve(method, base, param, targets, **options):
+    targets = np.atleast_1d(np.asarray(targets, dtype=np.float64))
+    columns = kernels.build_columns(kernels.payload_to_columns(base), len(targets))
+    return solver.solve(method, columns, param, targets, **options)
+
+
+# (método, datos fijos, parámetro, objetivo, valuación con el valor despejado según engine)
+CONVERGING = [
+    ("vc_method", STARTUP, "growth_rate", 3e6, lambda v: engine.vc_valuation(1e6, v)),
+    ("vc_method", STARTUP, "revenue", 5e6, lambda v: engine.vc_valuation(v, 0.2)),
+    ("dcf", DCF, "growth_rate", 2e6, lambda v: engine.dcf_valuation(1e5, *engine.dcf_rates(v, 0.15, 0.03), 5)),
+    ("dcf", DCF, "discount_rate", 2e6, lambda v: engine.dcf_valuation(1e5, *engine.dcf_rates(0.1, v, 0.03), 5)),
+    ("dcf", DCF, "initial_cash_flow", 3e6, lambda v: engine.dcf_valuation(v, *engine.dcf_rates(0.1, 0.15, 0.03), 5)),
+    ("dcf", STARTUP, "growth_rate", 5e6, lambda v: engine.dcf_startup_valuation(1e6, v)),
+    ("berkus", STARTUP, "growth_rate", 2.5e6, lambda v: engine.berkus_valuation(1e6, v, 5e5)),
+    ("first_chicago", STARTUP, "revenue", 6e6, lambda v: engine.first_chicago_valuation(v, 0.2, 5e5)[0]),
+]
+
+
+@pytest.mark.parametrize("method, base, param, target, valuation", CONVERGING, ids=lambda v: v if isinstance(v, str) else None)
+def test_converges_to_target(method, base, param, target, valuation):
+    result = _solve(method, base, param, target)
+    assert result["converged"][0] and result["error"][0] is None
+    value = result["value"][0]
+    lo, hi = solver.DEFAULT_BOUNDS[param]
+    assert lo <= value <= hi
+    assert valuation(value) == pytest.approx(target, rel=1e-6)
+
+
+def test_vector_of_targets():
+    targets = np.linspace(8e5, 5e6, 200)
+    result = _solve("dcf", DCF, "growth_rate", targets)
+    assert result["converged"].all()
+    solved = [engine.dcf_valuation(1e5, *engine.dcf_rates(g, 0.15, 0.03), 5) for g in result["value"]]
+    np.testing.assert_allclose(solved, targets, rtol=1e-6)
+    # A mayor objetivo, mayor crecimiento
+    assert (np.diff(result["value"]) > 0).all()
+
+
+def test_target_outside_the_bracket():
+    result = _solve("berkus", STARTUP, "growth_rate", 3.2e6)
+    assert not result["converged"][0] and result["iterations"][0] == 0
+    error = result["error"][0]
+    assert error.startswith("El objetivo está fuera del rango alcanzable") and "growth_rate entre -0.99 y 1" in error
+    assert "constante" not in error
+
+
+def test_target_beyond_a_plateau():
+    # Berkus deja de crecer con revenue >= 2e6: el error indica dónde empieza la meseta
+    result = _solve("berkus", STARTUP, "revenue", 5e6)
+    assert not result["converged"][0]
+    error = result["error"][0]
+    assert "fuera del rango alcanzable" in error
+    assert error.endswith(solver.ERROR_PLATEAU.format(param="revenue", op=">=", edge=2e6))
+
+
+def test_flat_valuation():
+    # Con DCFData la valuación usa initial_cash_flow: revenue no la cambia
+    result = _solve("dcf", DCF, "revenue", 5e6)
+    assert not result["converged"][0]
+    assert result["error"][0] == solver.ERROR_FLAT.format(param="revenue")
+
+
+def test_multiple_solutions_warn():
+    result = _solve("dcf", DCF, "terminal_growth_rate", 1.2e6)
+    assert result["converged"][0] and result["warning"][0] == solver.WARNING_MULTIPLE
+    value = result["value"][0]
+    assert engine.dcf_valuation(1e5, *engine.dcf_rates(0.1, 0.15, value), 5) == pytest.approx(1.2e6, rel=1e-6)
+
+
+@pytest.mark.parametrize("param, bounds", [
+    ("growth_rate", (0, 50)),
+    ("growth_rate", (0.5, 0.1)),
+    ("revenue", (0, 1e6)),
+])
+def test_invalid_bounds(param, bounds):
+    with pytest.raises(ValueError):
+        solver.validate_bounds(param, bounds)
+
+
+def test_endpoint():
+    client = TestClient(main.app)
+    body = {"method": "vc_method", "solve_for": "growth_rate", "base": STARTUP, "target": 3e6}
+    response = client.post("/valuate/solve/", json=body).json()
+    assert response["converged"] and response["valuation"] == 3e6
+    assert client.post("/valuate/vc_method/", json={**STARTUP, "growth_rate": response["value"]}).json()["valuation"] == 3e6
+
+    rows = [{"revenue": 1e6}, {"revenue": 2e6}]
+    response = client.post("/valuate/solve/", json={**body, "rows": rows, "target": [3e6, 6e6]}).json()
+    assert response["count"] == 2 and all(row["converged"] for row in response["results"])
+
+    response = client.post("/valuate/solve/", json={**body, "solve_for": "discount_rate"}).json()
+    assert response["available_params"] == list(solver.PARAMS["vc_method"])
+    assert "error" in client.post("/valuate/solve/", json={**body, "bounds": [0, 50]}).json()
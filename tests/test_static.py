@@ -0,0 +1,127 @@
+"""Respuestas estáticas: ETag y 304, variantes comprimidas y recarga del archivo."""
+import gzip
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+import main
+import static
+
+CONTENT = ("<html>" + "valuación " * 200 + "</html>").encode("utf-8")
+
+
+def _request(**headers):
+    raw = [(key.replace("_", "-").encode(), value.encode()) for key, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+class FakeBrotli:
+    @staticmethod
+    def compress(content, quality=11):
+        return b"br:" + content
+
+
+@pytest.fixture
+def with_brotli(monkeypatch):
+    monkeypatch.setattr(static, "brotli", FakeBrotli)
+
+
+def test_etag_and_not_modified():
+    body = static.StaticBody(CONTENT, "text/html")
+    response = body.response(_request())
+    assert response.status_code == 200 and response.body == CONTENT
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "no-cache" and response.headers["vary"] == "Accept-Encoding"
+
+    for if_none_match in (etag, f"W/{etag}", f'"otro", {etag}', "*"):
+        cached = body.response(_request(if_none_match=if_none_match))
+        assert cached.status_code == 304 and cached.body == b""
+        assert cached.headers["etag"] == etag
+    assert body.response(_request(if_none_match='"otro"')).status_code == 200
+
+
+def test_gzip_variant_has_its_own_etag():
+    body = static.StaticBody(CONTENT, "text/html")
+    identity = body.response(_request())
+    compressed = body.response(_request(accept_encoding="gzip, deflate"))
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(compressed.body) == CONTENT
+    assert compressed.headers["etag"] != identity.headers["etag"]
+    # El ETag de la variante gzip no valida la variante sin comprimir
+    assert body.response(_request(if_none_match=compressed.headers["etag"])).status_code == 200
+    assert body.response(_request(accept_encoding="gzip", if_none_match=compressed.headers["etag"])).status_code == 304
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, br", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("gzip;q=0", "identity"),
+    ("*", "br"),
+    ("*, br;q=0", "gzip"),
+    ("identity", "identity"),
+    ("", "identity"),
+    ("gzip;q=abc", "identity"),
+])
+def test_encoding_negotiation(with_brotli, accept_encoding, expected):
+    body = static.StaticBody(CONTENT, "text/html")
+    response = body.response(_request(accept_encoding=accept_encoding))
+    assert response.headers.get("content-encoding", "identity") == expected
+    if expected == "br":
+        assert response.body == b"br:" + CONTENT
+
+
+def test_small_bodies_are_not_compressed(with_brotli):
+    body = static.StaticBody(b'{"status":"ok"}', "application/json")
+    response = body.response(_request(accept_encoding="br, gzip"))
+    assert "content-encoding" not in response.headers and response.body == b'{"status":"ok"}'
+
+
+def test_file_reloads_when_mtime_changes(tmp_path):
+    path = tmp_path / "cliente.html"
+    path.write_bytes(CONTENT)
+    page = static.StaticFile(str(path), "text/html", check_interval=0)
+    first = page.response(_request())
+    assert first.body == CONTENT
+
+    path.write_bytes(CONTENT + b"<!-- v2 -->")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    second = page.response(_request())
+    assert second.body == CONTENT + b"<!-- v2 -->"
+    assert second.headers["etag"] != first.headers["etag"]
+    # El ETag anterior ya no coincide
+    assert page.response(_request(if_none_match=first.headers["etag"])).status_code == 200
+
+
+def test_file_is_checked_at_most_once_per_interval(tmp_path, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(static.time, "monotonic", lambda: now[0])
+    path = tmp_path / "cliente.html"
+    path.write_bytes(b"v1")
+    page = static.StaticFile(str(path), "text/html", check_interval=1.0)
+    assert page.response(_request()).body == b"v1"
+
+    path.write_bytes(b"v2 con otro largo")
+    now[0] += 0.5
+    assert page.response(_request()).body == b"v1"
+    now[0] += 0.6
+    assert page.response(_request()).body == b"v2 con otro largo"
+
+
+def test_missing_file_fails_on_request_not_on_creation(tmp_path):
+    page = static.StaticFile(str(tmp_path / "no-existe.html"), "text/html")
+    with pytest.raises(FileNotFoundError):
+        page.response(_request())
+
+
+def test_app_routes_use_static_bodies():
+    client = TestClient(main.app)
+    response = client.get("/test", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200 and response.headers["content-encoding"] == "gzip"
+    assert client.get("/test", headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]}).status_code == 304
+
+    status = client.get("/status")
+    assert status.status_code == 200
+    assert client.get("/status", headers={"If-None-Match": status.headers["etag"]}).status_code == 304